@@ -0,0 +1,53 @@
+# alembic/env.py
+"""
+بيئة Alembic - الترحيلات مكتوبة بـ SQL مباشر (لا توجد نماذج ORM)
+"""
+from logging.config import fileConfig
+from urllib.parse import quote_plus
+from alembic import context
+from sqlalchemy import engine_from_config, pool
+from app.config import settings
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+config.set_main_option(
+    "sqlalchemy.url",
+    (
+        f"mysql+mysqlconnector://{quote_plus(settings.DB_USER or '')}:{quote_plus(settings.DB_PASS or '')}"
+        f"@{settings.DB_HOST}/{settings.DB_NAME}?charset={settings.DB_CHARSET}"
+    ).replace("%", "%%"),
+)
+
+target_metadata = None
+
+
+def run_migrations_offline():
+    """توليد SQL بدون اتصال (alembic upgrade --sql)"""
+    context.configure(
+        url=config.get_main_option("sqlalchemy.url"),
+        target_metadata=target_metadata,
+        literal_binds=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    """تنفيذ الترحيلات على قاعدة البيانات"""
+    connectable = engine_from_config(
+        config.get_section(config.config_ini_section, {}),
+        prefix="sqlalchemy.",
+        poolclass=pool.NullPool,
+    )
+    with connectable.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
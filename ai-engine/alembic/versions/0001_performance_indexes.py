@@ -0,0 +1,47 @@
+"""فهارس الاستعلامات الساخنة (performance indexes)
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+from app.db.migration_utils import create_index_if_missing, drop_index_if_exists
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# (الجدول، اسم الفهرس، الأعمدة) - كل فهرس يخدم استعلاماً في المستودعات أو الـ endpoints
+INDEXES = [
+    # رسائل المحادثة بالترتيب الزمني: get_thread_messages / get_recent_messages / get_thread
+    ("ai_messages", "idx_messages_thread_created", ["thread_id", "created_at"]),
+    # قطع المستند بالترتيب: get_by_document
+    ("ai_document_chunks", "idx_chunks_document_index", ["document_id", "chunk_index"]),
+    # أحدث القطع: get_all / questions
+    ("ai_document_chunks", "idx_chunks_created", ["created_at"]),
+    # قائمة المحادثات: list_threads
+    ("ai_threads", "idx_threads_updated", ["updated_at"]),
+    # تقييمات رسالة + أحدث التقييمات
+    ("ai_feedback", "idx_feedback_message_created", ["message_id", "created_at"]),
+    ("ai_feedback", "idx_feedback_created", ["created_at"]),
+    # استخدام محادثة
+    ("ai_usage_logs", "idx_usage_thread_created", ["thread_id", "created_at"]),
+    # ذاكرة المحادثة
+    ("ai_thread_memory", "idx_thread_memory_thread", ["thread_id"]),
+    # قائمة الملفات + تحليل صورة بملف
+    ("ai_files", "idx_files_created", ["created_at"]),
+    ("ai_vision_analyses", "idx_vision_file_created", ["file_id", "created_at"]),
+    # مستندات قاعدة معرفة + قائمة القواعد
+    ("ai_documents", "idx_documents_kb_created", ["knowledge_base_id", "created_at"]),
+    ("ai_knowledge_bases", "idx_kb_created", ["created_at"]),
+]
+
+
+def upgrade():
+    for table, name, columns in INDEXES:
+        create_index_if_missing(table, name, columns)
+
+
+def downgrade():
+    for table, name, _ in reversed(INDEXES):
+        drop_index_if_exists(table, name)
@@ -0,0 +1,47 @@
+"""عدادات الإحصائيات (ai_stat_counters) بدلاً من COUNT/AVG/SUM على الجداول الكاملة
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # كل عداد مقسّم على عدة خانات (slot) حتى لا تتنافس المعاملات المتزامنة على صف واحد
+    op.execute(
+        """CREATE TABLE IF NOT EXISTS ai_stat_counters (
+               name VARCHAR(64) NOT NULL,
+               slot TINYINT UNSIGNED NOT NULL DEFAULT 0,
+               count BIGINT NOT NULL DEFAULT 0,
+               total DECIMAL(24, 6) NOT NULL DEFAULT 0,
+               updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                   ON UPDATE CURRENT_TIMESTAMP,
+               PRIMARY KEY (name, slot)
+           ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci"""
+    )
+    # القيم الابتدائية من الجداول الحالية (مرة واحدة)
+    op.execute("DELETE FROM ai_stat_counters")
+    op.execute(
+        """INSERT INTO ai_stat_counters (name, slot, count, total)
+           SELECT 'threads', 0, COUNT(*), 0 FROM ai_threads
+           UNION ALL
+           SELECT 'chunks', 0, COUNT(*), 0 FROM ai_document_chunks
+           UNION ALL
+           SELECT 'feedback.rating', 0, COUNT(rating), COALESCE(SUM(rating), 0) FROM ai_feedback
+           UNION ALL
+           SELECT 'usage.tokens_input', 0, COUNT(*), COALESCE(SUM(tokens_input), 0) FROM ai_usage_logs
+           UNION ALL
+           SELECT 'usage.tokens_output', 0, COUNT(*), COALESCE(SUM(tokens_output), 0) FROM ai_usage_logs
+           UNION ALL
+           SELECT 'usage.cost_usd', 0, COUNT(*), COALESCE(SUM(cost_usd), 0) FROM ai_usage_logs"""
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS ai_stat_counters")
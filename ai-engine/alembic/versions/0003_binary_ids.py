@@ -0,0 +1,123 @@
+"""معرفات BINARY(16) بدلاً من CHAR(36) للجداول كثيفة الكتابة
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+
+المعرفات النصية الحالية (uuid4) تتحول لنفس القيمة بـ 16 بايت، فتبقى
+المعرفات التي بحوزة العملاء صالحة (app.db.ids.db_id يقبل الصيغة النصية).
+بعد الترقية: DB_BINARY_IDS=true ثم إعادة تشغيل التطبيق.
+"""
+from alembic import op
+from sqlalchemy import text
+from app.db.migration_utils import table_exists
+from app.db.ids import BINARY_ID_COLUMNS
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+# الجدول -> أعمدة المعرفات (مشتركة مع app.db.ids.decode_row)
+ID_COLUMNS = BINARY_ID_COLUMNS
+
+UUID_PATTERN = "^[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}$"
+
+# BINARY(16) -> نص UUID بشرطات (BIN_TO_UUID غير متاح قبل MySQL 8)
+HEX_TO_UUID = (
+    "LOWER(INSERT(INSERT(INSERT(INSERT(HEX({col}), 9, 0, '-'), 14, 0, '-'), 19, 0, '-'), 24, 0, '-'))"
+)
+
+
+def _columns():
+    """الأعمدة الموجودة فعلاً -> [(table, column, nullable)]"""
+    bind = op.get_bind()
+    found = []
+    for table, columns in ID_COLUMNS.items():
+        if not table_exists(table):
+            continue
+        for column in columns:
+            row = bind.execute(
+                text(
+                    "SELECT IS_NULLABLE FROM information_schema.columns "
+                    "WHERE table_schema = DATABASE() AND table_name = :t AND column_name = :c"
+                ),
+                {"t": table, "c": column},
+            ).first()
+            if row is not None:
+                found.append((table, column, row[0] == "YES"))
+    return found
+
+
+def _foreign_keys(columns):
+    """المفاتيح الأجنبية التي تمس أعمدة الترحيل (تُحذف ثم يُعاد إنشاؤها)"""
+    targets = {(t, c) for t, c, _ in columns}
+    rows = op.get_bind().execute(
+        text(
+            """SELECT k.TABLE_NAME, k.CONSTRAINT_NAME, k.COLUMN_NAME,
+                      k.REFERENCED_TABLE_NAME, k.REFERENCED_COLUMN_NAME,
+                      r.UPDATE_RULE, r.DELETE_RULE
+               FROM information_schema.key_column_usage k
+               JOIN information_schema.referential_constraints r
+                 ON r.CONSTRAINT_SCHEMA = k.CONSTRAINT_SCHEMA
+                AND r.CONSTRAINT_NAME = k.CONSTRAINT_NAME
+               WHERE k.TABLE_SCHEMA = DATABASE() AND k.REFERENCED_TABLE_NAME IS NOT NULL"""
+        )
+    ).fetchall()
+    return [
+        row for row in rows
+        if (row[0], row[2]) in targets or (row[3], row[4]) in targets
+    ]
+
+
+def _convert(columns, to_binary: bool):
+    fks = _foreign_keys(columns)
+    for table, name, *_ in fks:
+        op.execute(f"ALTER TABLE `{table}` DROP FOREIGN KEY `{name}`")
+
+    for table, column, nullable in columns:
+        null_sql = "NULL" if nullable else "NOT NULL"
+        # VARBINARY وسيط: يحافظ على الفهارس والمفتاح الأساسي أثناء تغيير القيم
+        op.execute(f"ALTER TABLE `{table}` MODIFY `{column}` VARBINARY(36) {null_sql}")
+        if to_binary:
+            op.execute(
+                f"UPDATE `{table}` SET `{column}` = UNHEX(REPLACE(`{column}`, '-', '')) "
+                f"WHERE `{column}` IS NOT NULL"
+            )
+            op.execute(f"ALTER TABLE `{table}` MODIFY `{column}` BINARY(16) {null_sql}")
+        else:
+            op.execute(
+                f"UPDATE `{table}` SET `{column}` = {HEX_TO_UUID.format(col=f'`{column}`')} "
+                f"WHERE `{column}` IS NOT NULL"
+            )
+            op.execute(
+                f"ALTER TABLE `{table}` MODIFY `{column}` CHAR(36) "
+                f"CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci {null_sql}"
+            )
+
+    for table, name, column, ref_table, ref_column, on_update, on_delete in fks:
+        op.execute(
+            f"ALTER TABLE `{table}` ADD CONSTRAINT `{name}` FOREIGN KEY (`{column}`) "
+            f"REFERENCES `{ref_table}` (`{ref_column}`) ON UPDATE {on_update} ON DELETE {on_delete}"
+        )
+
+
+def upgrade():
+    columns = _columns()
+    bind = op.get_bind()
+    # التحقق قبل أي تعديل: كل القيم يجب أن تكون UUID صالحاً
+    for table, column, _ in columns:
+        bad = bind.execute(
+            text(
+                f"SELECT COUNT(*) FROM `{table}` "
+                f"WHERE `{column}` IS NOT NULL AND `{column}` NOT REGEXP :p"
+            ),
+            {"p": UUID_PATTERN},
+        ).scalar()
+        if bad:
+            raise RuntimeError(f"{table}.{column}: {bad} قيمة ليست UUID - أصلحها قبل الترحيل")
+    _convert(columns, to_binary=True)
+
+
+def downgrade():
+    _convert(_columns(), to_binary=False)
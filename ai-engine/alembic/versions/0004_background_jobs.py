@@ -0,0 +1,40 @@
+"""طابور المهام الخلفية (ai_jobs)
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        """CREATE TABLE IF NOT EXISTS ai_jobs (
+               id CHAR(36) NOT NULL PRIMARY KEY,
+               queue VARCHAR(32) NOT NULL,
+               task VARCHAR(64) NOT NULL,
+               payload JSON,
+               status ENUM('queued', 'running', 'done', 'dead') NOT NULL DEFAULT 'queued',
+               attempts SMALLINT UNSIGNED NOT NULL DEFAULT 0,
+               max_attempts SMALLINT UNSIGNED NOT NULL DEFAULT 5,
+               run_after DATETIME(3) NOT NULL,
+               locked_by VARCHAR(64),
+               locked_at DATETIME(3),
+               last_error TEXT,
+               result JSON,
+               created_at DATETIME(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3),
+               finished_at DATETIME(3),
+               -- حجز المهام: WHERE queue = ? AND status = 'queued' AND run_after <= ? ORDER BY run_after
+               INDEX idx_jobs_claim (queue, status, run_after),
+               INDEX idx_jobs_status (status, finished_at)
+           ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci"""
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS ai_jobs")
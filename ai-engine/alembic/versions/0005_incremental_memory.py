@@ -0,0 +1,48 @@
+"""ذاكرة تراكمية: حالة الطي في ai_thread_memory
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+
+last_message_at / last_message_id: آخر رسالة طُويت في الذاكرة (علامة الماء العالية)
+message_count / topics: الملخص كحالة تراكمية بدلاً من إعادة حسابه من كل الرسائل.
+الصفوف الحالية (last_message_at = NULL) يُعاد بناؤها عند أول تحديث.
+"""
+from alembic import op
+from sqlalchemy import text
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def _message_id_type() -> str:
+    """نفس نوع ai_messages.id (CHAR(36) أو BINARY(16) بعد 0003)"""
+    row = op.get_bind().execute(
+        text(
+            "SELECT COLUMN_TYPE FROM information_schema.columns "
+            "WHERE table_schema = DATABASE() AND table_name = 'ai_messages' AND column_name = 'id'"
+        )
+    ).first()
+    return row[0] if row else "char(36)"
+
+
+def upgrade():
+    op.execute(
+        f"""ALTER TABLE ai_thread_memory
+                ADD COLUMN topics JSON NULL AFTER key_facts,
+                ADD COLUMN message_count INT UNSIGNED NOT NULL DEFAULT 0 AFTER topics,
+                ADD COLUMN last_message_at DATETIME(3) NULL AFTER message_count,
+                ADD COLUMN last_message_id {_message_id_type()} NULL AFTER last_message_at"""
+    )
+
+
+def downgrade():
+    op.execute(
+        """ALTER TABLE ai_thread_memory
+               DROP COLUMN last_message_id,
+               DROP COLUMN last_message_at,
+               DROP COLUMN message_count,
+               DROP COLUMN topics"""
+    )
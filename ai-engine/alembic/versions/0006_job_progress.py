@@ -0,0 +1,23 @@
+"""تقدم المهام الخلفية (ai_jobs.progress)
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+
+progress: حالة المراحل لمهام متعددة المراحل (مسار الإدخال extract -> chunk -> insert -> index)
+تُحدَّث أثناء التنفيذ، وتسمح باستئناف المهمة من آخر مرحلة مكتملة بعد إعادة المحاولة.
+"""
+from alembic import op
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("ALTER TABLE ai_jobs ADD COLUMN progress JSON NULL AFTER result")
+
+
+def downgrade():
+    op.execute("ALTER TABLE ai_jobs DROP COLUMN progress")
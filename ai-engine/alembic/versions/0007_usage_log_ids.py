@@ -0,0 +1,63 @@
+"""معرف من العميل لـ ai_usage_logs بدلاً من AUTO_INCREMENT
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+
+سجلات الاستخدام تُكتب عبر الكتابة المؤجلة (مرة واحدة على الأقل): مع مفتاح
+AUTO_INCREMENT كل إعادة من السجل تُدرج صفاً جديداً وتزيد العدادات مرة أخرى.
+المعرف الآن UUIDv7 يولّده التطبيق (new_id())، فإعادة عنصر كُتب سابقاً تصطدم
+بالمفتاح الأساسي ويُلغى العنصر كاملاً (الصف مع عداده).
+الصفوف الحالية تأخذ معرفاً من UUID().
+"""
+from alembic import op
+from sqlalchemy import text
+from app.db.migration_utils import table_exists
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def _id_type() -> str:
+    """نفس نوع معرفات الجداول الأخرى (CHAR(36) أو BINARY(16) بعد 0003)"""
+    row = op.get_bind().execute(
+        text(
+            "SELECT COLUMN_TYPE FROM information_schema.columns "
+            "WHERE table_schema = DATABASE() AND table_name = 'ai_threads' AND column_name = 'id'"
+        )
+    ).first()
+    return row[0] if row else "char(36)"
+
+
+def upgrade():
+    if not table_exists("ai_usage_logs"):
+        return
+    id_type = _id_type()
+    value = "UNHEX(REPLACE(UUID(), '-', ''))" if "binary" in id_type.lower() else "UUID()"
+    op.execute(
+        """ALTER TABLE ai_usage_logs
+               MODIFY id BIGINT UNSIGNED NOT NULL,
+               DROP PRIMARY KEY,
+               CHANGE id legacy_id BIGINT UNSIGNED NULL"""
+    )
+    op.execute(f"ALTER TABLE ai_usage_logs ADD COLUMN id {id_type} NULL FIRST")
+    op.execute(f"UPDATE ai_usage_logs SET id = {value}")
+    op.execute(
+        f"""ALTER TABLE ai_usage_logs
+                MODIFY id {id_type} NOT NULL,
+                ADD PRIMARY KEY (id),
+                DROP COLUMN legacy_id"""
+    )
+
+
+def downgrade():
+    if not table_exists("ai_usage_logs"):
+        return
+    op.execute(
+        """ALTER TABLE ai_usage_logs
+               DROP PRIMARY KEY,
+               DROP COLUMN id,
+               ADD COLUMN id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY FIRST"""
+    )
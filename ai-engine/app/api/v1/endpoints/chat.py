@@ -5,19 +5,41 @@
 """
 import re
 import os
-import uuid
 import time
-import json
+import asyncio
 from collections import Counter
 from fastapi import APIRouter, HTTPException, Form, UploadFile, File
+from mysql.connector import Error
+from fastapi.responses import StreamingResponse
 from typing import Optional
 from app.db.mysql_conn import execute_query
-from app.utils.file_processor import extract_text_from_file, summarize_extracted_text
+from app.db.ids import new_id, db_id
+from app.repositories.thread_repo import ThreadRepository
+from app.repositories.message_repo import MessageRepository
+from app.repositories.chunk_repo import ChunkRepository
+from app.repositories.file_repo import FileRepository
+from app.db.unit_of_work import UnitOfWork
+from app.db.write_behind import deferred
+from app.services.chat_service import chat_service
+from app.utils.streaming import event_encoder, split_text, STREAM_MEDIA_TYPES, STREAM_HEADERS
+from app.utils.single_flight import SingleFlight
+from app.utils.timing import stage, log_timings
+from app.utils.uploads import safe_upload_path, save_upload
+from app.config import settings
+from app.core.logging_config import logger
+from app.utils.extraction_pool import extraction_pool
 
 router = APIRouter()
 
 UPLOAD_DIR = os.environ.get("UPLOAD_DIR", "uploads")
 
+# الأسئلة المتطابقة المتزامنة تشترك في بحث وإجابة واحدة
+answers_in_flight = SingleFlight()
+
+# المرشحون للتقييم لكل سؤال، وعدد القطع بعد الترتيب (نفس القاعدة في /chat/batch)
+CANDIDATE_LIMIT = 50
+TOP_CHUNKS = 10
+
 # ===== كلمات التوقف العربية (موسّعة) =====
 STOP_WORDS = {
     "في", "من", "على", "إلى", "الى", "عن", "مع", "هذا", "هذه", "ذلك", "تلك",
@@ -140,80 +162,107 @@ def fuzzy_match(word1, word2):
     return min(jaccard + prefix_bonus, 1.0)
 
 
+SCORE_QA_PATTERNS = [
+    r'سؤال\s*[:：؟?]\s*(.*?)(?:جواب|اجابه|الاجابه|الجواب)\s*[:：]\s*(.*?)(?=سؤال|$)',
+    r'س\s*[:：]\s*(.*?)(?:ج|جواب)\s*[:：]\s*(.*?)(?=س\s*[:：]|$)',
+]
+
+
+def analyze_query(query):
+    """خصائص السؤال اللازمة للتقييم (تُحسب مرة لكل سؤال)"""
+    query_norm = normalize_arabic(query.lower())
+    q_clean = re.sub(r'[^\w\s]', ' ', query_norm)
+    return {
+        "norm": query_norm,
+        "words": [w for w in q_clean.split() if w not in STOP_WORDS and len(w) > 1],
+        "topics": {g for g, synonyms in QUESTION_SYNONYMS.items() if any(s in query_norm for s in synonyms)},
+    }
+
+
+def analyze_chunk(content):
+    """خصائص القطعة اللازمة للتقييم (تُحسب مرة لكل قطعة)"""
+    content_norm = normalize_arabic(content.lower())
+    c_clean = re.sub(r'[^\w\s]', ' ', content_norm)
+    c_words = [w for w in c_clean.split() if len(w) > 1]
+
+    # كلمات أسئلة أزواج "سؤال: ... جواب: ..." داخل القطعة
+    qa_questions = []
+    for pattern in SCORE_QA_PATTERNS:
+        for q_text, a_text in re.findall(pattern, content, re.DOTALL):
+            q_norm_inner = normalize_arabic(q_text.lower().strip())
+            q_inner_words = [w for w in re.sub(r'[^\w\s]', ' ', q_norm_inner).split()
+                            if w not in STOP_WORDS and len(w) > 1]
+            if q_inner_words:
+                qa_questions.append(q_inner_words)
+
+    return {
+        "norm": content_norm,
+        "clean": c_clean,
+        "words": c_words,
+        "set": set(c_words),
+        "tf": Counter(c_words),
+        "qa": qa_questions,
+        "topics": {g for g, synonyms in QUESTION_SYNONYMS.items() if any(s in content_norm for s in synonyms)},
+    }
+
+
 def score_chunk(query, content):
     """حساب صلة القطعة بالسؤال"""
     if not content or not query:
         return 0.0
+    return score_analyzed(analyze_query(query), analyze_chunk(content))
 
-    query_norm = normalize_arabic(query.lower())
-    content_norm = normalize_arabic(content.lower())
 
-    q_clean = re.sub(r'[^\w\s]', ' ', query_norm)
-    c_clean = re.sub(r'[^\w\s]', ' ', content_norm)
-    q_words = [w for w in q_clean.split() if w not in STOP_WORDS and len(w) > 1]
-    c_words = [w for w in c_clean.split() if len(w) > 1]
-    c_set = set(c_words)
+def score_analyzed(q, c, fuzzy=fuzzy_match):
+    """
+    حساب الصلة من خصائص محسوبة مسبقاً (analyze_query / analyze_chunk)
 
+    fuzzy: دالة المطابقة الضبابية (الدفعات تمرر نسخة مع ذاكرة نتائج)
+    """
+    q_words = q["words"]
     if not q_words:
         return 0.0
+    c_words = c["words"]
 
     exact_matches = 0
     fuzzy_matches = 0
     for qw in q_words:
-        if qw in c_set:
+        if qw in c["set"]:
             exact_matches += 1
         else:
-            best_fuzzy = max((fuzzy_match(qw, cw) for cw in c_words), default=0)
+            best_fuzzy = max((fuzzy(qw, cw) for cw in c_words), default=0)
             if best_fuzzy > 0.6:
                 fuzzy_matches += best_fuzzy
 
     keyword_score = (exact_matches + fuzzy_matches * 0.7) / len(q_words)
 
     phrase_score = 0.0
-    if query_norm in content_norm:
+    if q["norm"] in c["norm"]:
         phrase_score = 1.0
     else:
         for i in range(len(q_words) - 2):
             trigram = ' '.join(q_words[i:i+3])
-            if trigram in c_clean:
+            if trigram in c["clean"]:
                 phrase_score = 0.6
                 break
 
     qa_score = 0.0
-    qa_patterns = [
-        r'سؤال\s*[:：؟?]\s*(.*?)(?:جواب|اجابه|الاجابه|الجواب)\s*[:：]\s*(.*?)(?=سؤال|$)',
-        r'س\s*[:：]\s*(.*?)(?:ج|جواب)\s*[:：]\s*(.*?)(?=س\s*[:：]|$)',
-    ]
-    for pattern in qa_patterns:
-        for q_text, a_text in re.findall(pattern, content, re.DOTALL):
-            q_norm_inner = normalize_arabic(q_text.lower().strip())
-            q_inner_words = [w for w in re.sub(r'[^\w\s]', ' ', q_norm_inner).split()
-                            if w not in STOP_WORDS and len(w) > 1]
-            if not q_inner_words:
-                continue
-
-            match_count = 0
-            for qw in q_words:
-                for qiw in q_inner_words:
-                    if fuzzy_match(qw, qiw) > 0.55:
-                        match_count += 1
-                        break
-            
-            ratio = match_count / max(len(q_words), 1)
-            if ratio > qa_score:
-                qa_score = ratio * 1.5
+    for q_inner_words in c["qa"]:
+        match_count = 0
+        for qw in q_words:
+            for qiw in q_inner_words:
+                if fuzzy(qw, qiw) > 0.55:
+                    match_count += 1
+                    break
+
+        ratio = match_count / max(len(q_words), 1)
+        if ratio > qa_score:
+            qa_score = ratio * 1.5
 
-    tf_counter = Counter(c_words)
     total_words = max(len(c_words), 1)
-    tf_score = sum(tf_counter.get(kw, 0) for kw in q_words) / total_words
-
-    topic_bonus = 0.0
-    for group, synonyms in QUESTION_SYNONYMS.items():
-        q_has = any(s in query_norm for s in synonyms)
-        c_has = any(s in content_norm for s in synonyms)
-        if q_has and c_has:
-            topic_bonus = 0.1
-            break
+    tf_score = sum(c["tf"].get(kw, 0) for kw in q_words) / total_words
+
+    topic_bonus = 0.1 if q["topics"] & c["topics"] else 0.0
 
     final = (
         keyword_score * 0.25 +
@@ -322,19 +371,37 @@ def build_smart_answer(question, top_chunks, file_context=None):
 
 
 @router.post("/chat")
-def chat(question: str = Form(...), thread_id: Optional[str] = Form(None)):
-    """دردشة نصية فقط"""
+def chat(question: str = Form(...), thread_id: Optional[str] = Form(None),
+         stream: bool = Form(False), fmt: str = Form("sse", alias="format")):
+    """دردشة نصية فقط (stream=true: أحداث SSE / NDJSON)"""
     # ... (نفس المنطق السابق، لكن تم نقله لدالة مشتركة للاختصار) ...
+    if stream:
+        return stream_chat_request(question, thread_id, None, fmt)
     return process_chat_request(question, thread_id, None)
 
 
 @router.post("/chat/json")
-def chat_json(request: dict):
+async def chat_json(request: dict):
+    """
+    دردشة JSON عبر ChatService.chat_async: المحادثة والذاكرة والبحث بالتوازي
+    ضمن مهلة الطلب (CHAT_DEADLINE_MS)؛ المحادثة
+    الجديدة ورسالة المستخدم في وحدة عمل واحدة، ورسالة المساعد والاستخدام عبر
+    الكتابة المؤجلة (stream=true: نفس بث /chat)
+    """
     question = request.get("question", "").strip()
     thread_id = request.get("thread_id")
     if not question:
         raise HTTPException(status_code=400, detail="السؤال مطلوب")
-    return process_chat_request(question, thread_id, None)
+    if request.get("stream"):
+        return stream_chat_request(question, thread_id, None, request.get("format", "sse"))
+    try:
+        return {"status": "ok", **await chat_service.chat_async(question, thread_id=thread_id)}
+    except Error as e:
+        logger.error(f"❌ فشل حفظ دورة الدردشة: {e}")
+        raise HTTPException(
+            status_code=503, detail="قاعدة البيانات غير متاحة، حاول مرة أخرى",
+            headers={"Retry-After": "1"},
+        )
 
 
 @router.post("/chat/with-image")
@@ -342,32 +409,35 @@ async def chat_with_image(
     question: str = Form(...),
     thread_id: Optional[str] = Form(None),
     image: UploadFile = File(None),  # قد يكون ملف أو صورة
+    stream: bool = Form(False),
+    fmt: str = Form("sse", alias="format"),
 ):
     """دردشة مع ملف (صورة، PDF، مستند)"""
     file_info = None
+    timings = {}
     if image:
         try:
-            content = await image.read()
-            
-            # معالجة الملف واستخراج النص
-            file_result = extract_text_from_file(None, "", content)
+            # حفظ الملف على القرص بأجزاء (الحجم يُفحص أثناء الكتابة)
+            file_path = safe_upload_path(UPLOAD_DIR, image.filename, keep_name=True)
+            with stage(timings, "file_write"):
+                saved = await save_upload(image, file_path)
             
-            # حفظ الملف
-            os.makedirs(UPLOAD_DIR, exist_ok=True)
-            safe_name = f"{uuid.uuid4()}_{image.filename}"
-            file_path = os.path.join(UPLOAD_DIR, safe_name)
-            with open(file_path, "wb") as f:
-                f.write(content)
+            # معالجة الملف واستخراج النص (من المسار: الامتداد يحدد المعالج)
+            with stage(timings, "file_extraction"):
+                file_result = await extraction_pool.aextract(file_path, image.content_type)
                 
-            # حفظ في DB
-            file_id = str(uuid.uuid4())
+            # حفظ في DB (خارج حلقة الأحداث)
+            file_id = new_id()
             try:
-                execute_query(
-                    "INSERT INTO ai_files (id, filename, mime_type, file_size, file_path, extracted_text) VALUES (%s, %s, %s, %s, %s, %s)",
-                    (file_id, image.filename, image.content_type, len(content), file_path, file_result.get("text", "")[:5000])
-                )
-            except:
-                pass
+                with stage(timings, "db_file_insert"):
+                    await asyncio.to_thread(
+                        execute_query,
+                        "INSERT INTO ai_files (id, filename, mime_type, file_size, file_path, extracted_text) VALUES (%s, %s, %s, %s, %s, %s)",
+                        (db_id(file_id), image.filename, image.content_type, saved["size"], file_path, file_result.get("text", "")[:5000])
+                    )
+            except Exception as e:
+                # الدردشة تستمر بنص الملف؛ فقط الربط بالرسالة سيفشل لاحقاً
+                logger.error(f"⚠️ فشل حفظ سجل الملف {image.filename}: {e}")
             
             file_info = {
                 "file_id": file_id,
@@ -376,88 +446,239 @@ async def chat_with_image(
                 "type": file_result.get("metadata", {}).get("type", "unknown")
             }
             
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"❌ فشل معالجة الملف المرفق {image.filename}: {e}")
+
+    # الدورة متزامنة (DB + انتظار SingleFlight): خارج حلقة الأحداث حتى لا تجمّد العامل.
+    # مولّد البث متزامن أيضاً و StreamingResponse يمرّ عليه في threadpool
+    if stream:
+        return stream_chat_request(question, thread_id, file_info, fmt, timings=timings)
+    return await asyncio.to_thread(process_chat_request, question, thread_id, file_info,
+                                   timings=timings)
+
+
+def candidate_chunks(keywords: list) -> list:
+    """القطع المرشحة لكلمات سؤال: حتى CANDIDATE_LIMIT لكل الكلمات معاً"""
+    if not keywords:
+        return []
+    # LIKE على MySQL، فهرس FTS5 على SQLite
+    return ChunkRepository.fulltext_search(keywords, limit=CANDIDATE_LIMIT)
+
+
+def retrieve_chunks(question: str, timings: dict = None) -> list:
+    """البحث وترتيب القطع -> أفضل TOP_CHUNKS (مع _score)"""
+    with stage(timings, "keywords"):
+        keywords = extract_keywords(question)
+
+    with stage(timings, "candidates"):
+        raw_chunks = candidate_chunks(keywords)
+
+    with stage(timings, "scoring"):
+        for chunk in raw_chunks:
+            chunk["_score"] = score_chunk(question, chunk.get("content", ""))
+
+        raw_chunks.sort(key=lambda x: x.get("_score", 0), reverse=True)
+    return raw_chunks[:TOP_CHUNKS]
+
+
+def answer_question(question: str, file_context: Optional[dict], timings: dict = None) -> tuple:
+    """
+    البحث + تكوين الإجابة -> (أفضل القطع، الإجابة، هل شوركت مع طلب متزامن)
+
+    الطلبات المتزامنة بنفس السؤال المطبَّع ونفس النطاق تنتظر حساباً واحداً؛
+    الأسئلة مع ملف مرفق لا تُدمج (الإجابة تعتمد على الملف).
+    الطلب المدموج لا يملك أزمنة البحث؛ زمن انتظاره في timings["coalesced_wait"]
+    """
+    def compute():
+        top_chunks = retrieve_chunks(question, timings)
+        with stage(timings, "answer"):
+            answer = build_smart_answer(question, top_chunks, file_context)
+        return top_chunks, answer
+
+    if file_context or not settings.CHAT_SINGLE_FLIGHT:
+        return compute() + (False,)
+
+    # النطاق: قاعدة المعرفة كاملة (البحث الحالي غير مقيد بقاعدة معرفة)
+    key = ("kb:*", " ".join(normalize_arabic(question.lower()).split()))
+    started = time.perf_counter()
+    (top_chunks, answer), shared = answers_in_flight.do(key, compute)
+    if shared:
+        if timings is not None:
+            timings["coalesced_wait"] = round((time.perf_counter() - started) * 1000, 2)
+        top_chunks = [dict(c) for c in top_chunks]
+    return top_chunks, answer, shared
+
+
+def format_sources(top_chunks: list) -> list:
+    return [{"chunk_id": c["id"], "content": c["content"][:100], "score": c["_score"]} for c in top_chunks[:3] if c["_score"] > 0]
+
+
+def save_turn(thread_id: str, question: str, answer: str, latency_ms: int,
+              file_context: Optional[dict], create_thread: bool = False,
+              asst_msg_id: str = None, timings: dict = None) -> str:
+    """
+    حفظ دورة الدردشة: (المحادثة الجديدة +) رسالة المستخدم في معاملة واحدة،
+    ربط الملف، ثم رسالة المساعد عبر الكتابة المؤجلة
+
+    أزمنة الكتابات في timings: db_user_turn / db_file_link / db_assistant_enqueue
+
+    Returns:
+        معرف رسالة المساعد
+    """
+    content_to_save = question
+    if file_context:
+        content_to_save += f"\n[مرفق: {file_context['filename']}]"
+
+    user_msg_id = new_id()
+    with stage(timings, "db_user_turn"):
+        with UnitOfWork() as uow:
+            if create_thread:
+                ThreadRepository.create(title=question[:80], thread_id=thread_id, uow=uow)
+            MessageRepository.create(
+                thread_id, 'user', content_to_save, tokens=len(question.split()),
+                language='ar', message_id=user_msg_id, uow=uow
+            )
+
+    # Link file if exists (سجل الملف قد يكون فشل حفظه عند الرفع)
+    if file_context:
+        try:
+            with stage(timings, "db_file_link"):
+                FileRepository.link_to_message(user_msg_id, file_context['file_id'])
         except Exception as e:
-            print(f"File process error: {e}")
+            logger.error(f"⚠️ فشل ربط الملف بالرسالة {user_msg_id}: {e}")
+
+    # Assistant message (write-behind: الرد لا ينتظر الكتابة)
+    with stage(timings, "db_assistant_enqueue"):
+        return MessageRepository.create(
+            thread_id, 'assistant', answer, model='local-rag-v1',
+            tokens=len(answer.split()), latency_ms=latency_ms, language='ar',
+            message_id=asst_msg_id, uow=deferred()
+        )
 
-    return process_chat_request(question, thread_id, file_info)
 
+def process_chat_request(question: str, thread_id: Optional[str], file_context: Optional[dict],
+                         timings: dict = None):
+    """
+    منطق الدردشة المشترك
 
-def process_chat_request(question: str, thread_id: Optional[str], file_context: Optional[dict]):
-    """منطق الدردشة المشترك"""
+    timings: أزمنة مراحل سابقة للطلب (رفع الملف)؛ تُكمَّل هنا وتُعاد في metadata.timings
+    """
     start_time = time.time()
+    timings = {} if timings is None else timings
     question = question.strip() if question else ""
     if not question and not file_context:
         raise HTTPException(status_code=400, detail="السؤال أو الملف مطلوب")
 
-    # 1. Thread Management
-    is_new_thread = False
+    # 1. Thread Management (بدون سجل المحادثة لا تُحفظ الرسائل: لا معرف مُختلق)
     if not thread_id:
-        thread_id = str(uuid.uuid4())
         try:
-            execute_query("INSERT INTO ai_threads (id, title, metadata) VALUES (%s, %s, %s)", (thread_id, question[:80], '{}'))
-            is_new_thread = True
-        except: pass
-    
-    # 2. Search
-    keywords = extract_keywords(question)
-    raw_chunks = []
-    
-    # Search logic (same as before)
-    if keywords:
-        conditions = " OR ".join(["content LIKE %s" for _ in keywords])
-        params = tuple(f"%{kw}%" for kw in keywords)
-        results = execute_query(f"SELECT id, content FROM ai_document_chunks WHERE {conditions} LIMIT 50", params) or []
-        raw_chunks.extend(results)
-        
-    for chunk in raw_chunks:
-        chunk["_score"] = score_chunk(question, chunk.get("content", ""))
-    
-    raw_chunks.sort(key=lambda x: x.get("_score", 0), reverse=True)
-    top_chunks = raw_chunks[:10]
-
-    # 3. Build Answer (with file context)
-    answer = build_smart_answer(question, top_chunks, file_context)
+            with stage(timings, "thread"):
+                thread_id = ThreadRepository.create(title=question[:80])
+        except Error as e:
+            logger.error(f"❌ فشل إنشاء المحادثة: {e}")
+            raise HTTPException(
+                status_code=503, detail="قاعدة البيانات غير متاحة، حاول مرة أخرى",
+                headers={"Retry-After": "1"},
+            )
+
+    # 2-3. Search + Build Answer (with file context) - مشترك مع الأسئلة المتطابقة المتزامنة
+    top_chunks, answer, coalesced = answer_question(question, file_context, timings)
 
     # 4. Save & Return
     latency_ms = int((time.time() - start_time) * 1000)
-    
-    # Save messages...
+
+    asst_msg_id = None
     try:
-        user_msg_id = str(uuid.uuid4())
-        asst_msg_id = str(uuid.uuid4())
-        
-        # User message
-        content_to_save = question
-        if file_context:
-            content_to_save += f"\n[مرفق: {file_context['filename']}]"
-            
-        execute_query(
-            "INSERT INTO ai_messages (id, thread_id, role, content, language, tokens) VALUES (%s, %s, %s, %s, %s, %s)",
-            (user_msg_id, thread_id, 'user', content_to_save, 'ar', len(question.split()))
-        )
-        
-        # Assistant message
-        execute_query(
-            "INSERT INTO ai_messages (id, thread_id, role, content, model, tokens, latency_ms, language) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
-            (asst_msg_id, thread_id, 'assistant', answer, 'local-rag-v1', len(answer.split()), latency_ms, 'ar')
-        )
-        
-        # Link file if exists
-        if file_context:
-             execute_query("INSERT INTO ai_message_files (message_id, file_id) VALUES (%s, %s)", (user_msg_id, file_context['file_id']))
-             
+        asst_msg_id = save_turn(thread_id, question, answer, latency_ms, file_context,
+                                timings=timings)
     except Exception as e:
-        print(f"Save error: {e}")
+        logger.error(f"❌ فشل حفظ دورة الدردشة ({thread_id}): {e}")
+
+    timings["total"] = round((time.time() - start_time) * 1000, 2)
+    log_timings("chat", timings, thread_id=thread_id, coalesced=coalesced,
+                has_file=bool(file_context), chunks=len(top_chunks))
 
     return {
         "status": "ok",
         "thread_id": thread_id,
         "message_id": asst_msg_id,
         "answer": answer,
-        "sources": [{"chunk_id": c["id"], "content": c["content"][:100], "score": c["_score"]} for c in top_chunks[:3] if c["_score"] > 0],
+        "sources": format_sources(top_chunks),
         "metadata": {
             "latency_ms": latency_ms,
             "has_file": bool(file_context),
-            "file_info": file_context['filename'] if file_context else None
+            "file_info": file_context['filename'] if file_context else None,
+            "coalesced": coalesced,
+            "timings": timings,
         }
     }
+
+
+def stream_chat_request(question: str, thread_id: Optional[str], file_context: Optional[dict],
+                        fmt: str = "sse", timings: dict = None) -> StreamingResponse:
+    """
+    نسخة متدفقة من process_chat_request
+
+    الأحداث بالترتيب: thread -> sources -> delta (أجزاء الإجابة) -> done
+    الحفظ (المحادثة الجديدة والرسائل) بعد إرسال آخر حدث، لذلك أزمنة
+    الكتابة تظهر في سطر السجل فقط وليس في metadata.timings لحدث done
+    """
+    start_time = time.time()
+    timings = {} if timings is None else timings
+    question = question.strip() if question else ""
+    if not question and not file_context:
+        raise HTTPException(status_code=400, detail="السؤال أو الملف مطلوب")
+    if fmt not in STREAM_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"صيغة البث غير مدعومة: {fmt} (sse / ndjson)")
+
+    is_new_thread = not thread_id
+    thread_id = thread_id or new_id()
+    asst_msg_id = new_id()
+    encode = event_encoder(fmt)
+    turn = {}
+
+    def events():
+        try:
+            yield encode("thread", {"thread_id": thread_id, "is_new_thread": is_new_thread})
+
+            top_chunks, answer, coalesced = answer_question(question, file_context, timings)
+            turn["coalesced"] = coalesced
+            turn["chunks"] = len(top_chunks)
+            yield encode("sources", {"sources": format_sources(top_chunks)})
+
+            turn["answer"] = answer
+            turn["latency_ms"] = int((time.time() - start_time) * 1000)
+            for piece in split_text(answer):
+                yield encode("delta", {"text": piece})
+
+            yield encode("done", {
+                "message_id": asst_msg_id,
+                "metadata": {
+                    "latency_ms": turn["latency_ms"],
+                    "has_file": bool(file_context),
+                    "file_info": file_context['filename'] if file_context else None,
+                    "is_new_thread": is_new_thread,
+                    "coalesced": coalesced,
+                    "timings": dict(timings),
+                },
+            })
+        except Exception as e:
+            logger.error(f"❌ خطأ أثناء بث الإجابة ({thread_id}): {e}")
+            yield encode("error", {"detail": str(e)})
+        finally:
+            # يعمل أيضاً إذا قطع العميل الاتصال بعد تكوين الإجابة
+            if "answer" in turn:
+                try:
+                    save_turn(thread_id, question, turn["answer"], turn["latency_ms"],
+                              file_context, create_thread=is_new_thread, asst_msg_id=asst_msg_id,
+                              timings=timings)
+                except Exception as e:
+                    logger.error(f"❌ فشل حفظ دورة الدردشة المتدفقة ({thread_id}): {e}")
+                timings["total"] = round((time.time() - start_time) * 1000, 2)
+                log_timings("chat_stream", timings, thread_id=thread_id,
+                            coalesced=turn.get("coalesced"), has_file=bool(file_context),
+                            chunks=turn.get("chunks"))
+
+    return StreamingResponse(events(), media_type=STREAM_MEDIA_TYPES[fmt], headers=STREAM_HEADERS)
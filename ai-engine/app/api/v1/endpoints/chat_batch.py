@@ -0,0 +1,256 @@
+# app/api/v1/endpoints/chat_batch.py
+"""
+📦 دردشة الدفعات - عدة أسئلة في طلب واحد (اختبارات الأسئلة الشائعة / الإجابة الجماعية)
+
+العمل المشترك بين الأسئلة بدلاً من تكراره لكل طلب:
+1. تحليل كل الأسئلة معاً (الأسئلة المكررة تُحلل وتُجاب مرة واحدة)
+2. بحث واحد لكل مجموعة كلمات مفتاحية فريدة في الدفعة (بالتوازي حسب concurrency)،
+   بنفس قاعدة المرشحين في /chat (candidate_chunks) فتتطابق الإجابات
+3. خصائص كل قطعة تُحسب مرة، وتقييم كل الأزواج (سؤال، قطعة) بذاكرة مطابقة مشتركة
+4. الحفظ بالجملة: محادثة واحدة للدفعة ورسائلها في وحدات عمل كل CHAT_BATCH_WRITE_SIZE إجابة
+
+الرد NDJSON: batch -> answer / answer_failed (لكل سؤال، بترتيب الانتهاء مع index)
+-> save_failed (إن فشلت كتابة دفعة) -> done
+"""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from app.api.v1.endpoints.chat import (
+    extract_keywords, fuzzy_match, analyze_query, analyze_chunk, score_analyzed,
+    build_smart_answer, format_sources, candidate_chunks, TOP_CHUNKS,
+)
+from app.repositories.thread_repo import ThreadRepository
+from app.repositories.message_repo import MessageRepository
+from app.db.unit_of_work import UnitOfWork
+from app.db.ids import new_id
+from app.config import settings
+from app.utils.streaming import ndjson_event, STREAM_MEDIA_TYPES, STREAM_HEADERS
+from app.core.logging_config import logger
+
+router = APIRouter()
+
+
+def _parse_items(request: dict) -> list:
+    """الأسئلة كنص أو {"question", "thread_id"} -> [{"index", "question", "thread_id"}]"""
+    questions = request.get("questions")
+    if not isinstance(questions, list) or not questions:
+        raise HTTPException(status_code=400, detail="questions مطلوبة (قائمة أسئلة)")
+    if len(questions) > settings.CHAT_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"الحد الأقصى {settings.CHAT_BATCH_MAX_QUESTIONS} سؤال لكل دفعة"
+        )
+    items = []
+    for index, entry in enumerate(questions):
+        if isinstance(entry, dict):
+            question, thread_id = str(entry.get("question") or "").strip(), entry.get("thread_id")
+        else:
+            question, thread_id = str(entry or "").strip(), None
+        if not question:
+            raise HTTPException(status_code=400, detail=f"السؤال رقم {index} فارغ")
+        items.append({"index": index, "question": question, "thread_id": thread_id})
+    return items
+
+
+class BatchRetriever:
+    """بحث وتقييم مشترك لكل أسئلة الدفعة"""
+
+    def __init__(self, questions: list, concurrency: int):
+        self.concurrency = concurrency
+        self.keywords = {q: tuple(extract_keywords(q)) for q in questions}
+        self.candidates = {}  # كلمات السؤال -> [معرفات القطع]
+        self.chunks = {}      # معرف -> صف القطعة
+        self._features = {}
+        # المطابقة الضبابية تتكرر كثيراً بين أسئلة الدفعة لنفس الكلمات
+        self._fuzzy = lru_cache(maxsize=1 << 16)(fuzzy_match)
+        self._lock = threading.Lock()
+        self.pairs_scored = 0
+
+    def load_candidates(self):
+        """بحث واحد لكل مجموعة كلمات فريدة (أسئلة بنفس الكلمات تتشارك المرشحين)"""
+        unique = list(dict.fromkeys(self.keywords.values()))
+
+        def lookup(keywords):
+            return keywords, candidate_chunks(list(keywords))
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for keywords, rows in pool.map(lookup, unique):
+                self.candidates[keywords] = [row["id"] for row in rows]
+                for row in rows:
+                    self.chunks.setdefault(row["id"], row)
+        return len(unique)
+
+    def _chunk_features(self, chunk_id):
+        features = self._features.get(chunk_id)
+        if features is None:
+            features = self._features[chunk_id] = analyze_chunk(self.chunks[chunk_id].get("content") or "")
+        return features
+
+    def top_chunks(self, question: str) -> list:
+        """
+        أفضل TOP_CHUNKS قطعة للسؤال (نفس المرشحين والتقييم والترتيب في retrieve_chunks)
+        """
+        candidates = self.candidates.get(self.keywords[question], ())
+        query_features = analyze_query(question)
+        scored = []
+        for chunk_id in candidates:
+            chunk = dict(self.chunks[chunk_id])
+            chunk["_score"] = (
+                round(min(score_analyzed(query_features, self._chunk_features(chunk_id), self._fuzzy), 1.0), 4)
+                if chunk.get("content") else 0.0
+            )
+            scored.append(chunk)
+        with self._lock:
+            self.pairs_scored += len(scored)
+        scored.sort(key=lambda x: x.get("_score", 0), reverse=True)
+        return scored[:TOP_CHUNKS]
+
+
+def _save_turns(turns: list, batch_thread: dict):
+    """كتابة دفعة من الدورات في وحدة عمل واحدة (INSERT متعدد الصفوف)"""
+    create_thread = batch_thread["create"] and any(
+        t["thread_id"] == batch_thread["id"] for t in turns
+    )
+    with UnitOfWork() as uow:
+        if create_thread:
+            ThreadRepository.create(
+                title=batch_thread["title"], thread_id=batch_thread["id"], uow=uow
+            )
+        # نفس نص INSERT لكل الرسائل: تُدمج في عبارة واحدة متعددة الصفوف
+        for turn in turns:
+            MessageRepository.create(
+                turn["thread_id"], 'user', turn["question"], tokens=len(turn["question"].split()),
+                language='ar', message_id=turn["user_message_id"], uow=uow
+            )
+            MessageRepository.create(
+                turn["thread_id"], 'assistant', turn["answer"], model='local-rag-v1',
+                tokens=len(turn["answer"].split()), latency_ms=turn["latency_ms"],
+                language='ar', message_id=turn["message_id"], uow=uow
+            )
+    if create_thread:
+        batch_thread["create"] = False
+
+
+@router.post("/chat/batch")
+def chat_batch(request: dict):
+    """
+    إجابة عدة أسئلة في طلب واحد
+
+    الطلب:
+        questions: ["سؤال", {"question": "...", "thread_id": "..."}, ...]
+        concurrency: عدد العمّال للبحث والإجابة (1..CHAT_BATCH_MAX_CONCURRENCY)
+        thread_id: محادثة الدفعة (وإلا تُنشأ محادثة واحدة لكل الدفعة)
+        save: حفظ الرسائل (افتراضياً true؛ false لاختبارات الانحدار)
+    """
+    items = _parse_items(request)
+    try:
+        concurrency = int(request.get("concurrency") or 4)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="concurrency يجب أن يكون رقماً")
+    concurrency = max(1, min(concurrency, settings.CHAT_BATCH_MAX_CONCURRENCY))
+    save = request.get("save", True) is not False
+    batch_thread = {
+        "id": request.get("thread_id") or new_id(),
+        "create": not request.get("thread_id"),
+        "title": f"دفعة أسئلة ({len(items)})",
+    }
+
+    def events():
+        started = time.time()
+        unique = list(dict.fromkeys(item["question"] for item in items))
+        retriever = BatchRetriever(unique, concurrency)
+        stats = {"answered": 0, "failed": 0, "saved": 0, "save_failed": 0}
+        try:
+            lookups = retriever.load_candidates()
+            yield ndjson_event("batch", {
+                "total": len(items),
+                "unique_questions": len(unique),
+                "candidate_lookups": lookups,
+                "candidate_chunks": len(retriever.chunks),
+                "thread_id": batch_thread["id"] if save else None,
+            })
+
+            def answer(question):
+                q_started = time.time()
+                try:
+                    top = retriever.top_chunks(question)
+                    text = build_smart_answer(question, top)
+                except Exception as e:
+                    logger.error(f"❌ فشل سؤال في الدفعة: {e}")
+                    return question, None, str(e), 0
+                return question, top, text, int((time.time() - q_started) * 1000)
+
+            by_question = {}
+            for item in items:
+                by_question.setdefault(item["question"], []).append(item)
+
+            pending = []
+
+            def flush():
+                turns, pending[:] = list(pending), []
+                try:
+                    _save_turns(turns, batch_thread)
+                    stats["saved"] += len(turns)
+                    return None
+                except Exception as e:
+                    logger.error(f"❌ فشل حفظ دفعة ({len(turns)} إجابة): {e}")
+                    stats["save_failed"] += len(turns)
+                    return ndjson_event("save_failed", {
+                        "indexes": [t["index"] for t in turns], "detail": str(e)
+                    })
+
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                futures = [pool.submit(answer, q) for q in unique]
+                for future in as_completed(futures):
+                    question, top, text, latency_ms = future.result()
+                    if top is None:
+                        stats["failed"] += len(by_question[question])
+                        for item in by_question[question]:
+                            yield ndjson_event("answer_failed", {"index": item["index"], "detail": text})
+                        continue
+                    for item in by_question[question]:
+                        # معرف رسالة المستخدم أولاً: UUIDv7 يحفظ ترتيب الدورة
+                        user_message_id = new_id() if save else None
+                        message_id = new_id() if save else None
+                        stats["answered"] += 1
+                        yield ndjson_event("answer", {
+                            "index": item["index"],
+                            "question": question,
+                            "answer": text,
+                            "sources": format_sources(top),
+                            "message_id": message_id,
+                            "latency_ms": latency_ms,
+                        })
+                        if save:
+                            pending.append({
+                                "index": item["index"],
+                                "thread_id": item["thread_id"] or batch_thread["id"],
+                                "question": question,
+                                "answer": text,
+                                "latency_ms": latency_ms,
+                                "user_message_id": user_message_id,
+                                "message_id": message_id,
+                            })
+                    if len(pending) >= settings.CHAT_BATCH_WRITE_SIZE:
+                        failed = flush()
+                        if failed:
+                            yield failed
+            if pending:
+                failed = flush()
+                if failed:
+                    yield failed
+
+            yield ndjson_event("done", {
+                **stats,
+                "candidate_lookups": lookups,
+                "pairs_scored": retriever.pairs_scored,
+                "elapsed_ms": int((time.time() - started) * 1000),
+            })
+        except Exception as e:
+            logger.error(f"❌ خطأ في دفعة الأسئلة: {e}")
+            yield ndjson_event("error", {"detail": str(e), **stats})
+
+    return StreamingResponse(events(), media_type=STREAM_MEDIA_TYPES["ndjson"], headers=STREAM_HEADERS)
@@ -2,9 +2,14 @@
 """
 نقاط نهاية التقييمات - تعمل مع mysql_conn.py مباشرة
 """
-import uuid
+from typing import Optional
 from fastapi import APIRouter, HTTPException
 from app.db.mysql_conn import execute_query
+from app.repositories.feedback_repo import FeedbackRepository
+from app.db.write_behind import deferred
+from app.utils.pagination import (
+    clamp_limit, keyset_condition, build_page, approximate_total
+)
 
 router = APIRouter()
 
@@ -20,11 +25,8 @@ def submit_feedback(data: dict):
         if not message_id or not rating:
             raise HTTPException(status_code=400, detail="message_id و rating مطلوبان")
 
-        feedback_id = str(uuid.uuid4())
-        execute_query(
-            "INSERT INTO ai_feedback (id, message_id, rating, comment) VALUES (%s, %s, %s, %s)",
-            (feedback_id, message_id, rating, comment)
-        )
+        # مؤجل: التقييم وعداده عنصر واحد يُكتب في معاملة واحدة (ولا يتكرر عند الإعادة)
+        feedback_id = FeedbackRepository.create(message_id, rating, comment, uow=deferred())
         return {"status": "ok", "feedback_id": feedback_id, "message": "شكراً لتقييمك!"}
     except HTTPException:
         raise
@@ -33,21 +35,39 @@ def submit_feedback(data: dict):
 
 
 @router.get("/feedback")
-def list_feedback(limit: int = 50):
-    """قائمة التقييمات"""
+def list_feedback(limit: int = 50, cursor: Optional[str] = None, include_total: bool = False):
+    """قائمة التقييمات (ترقيم بالمؤشر على created_at, id)"""
     try:
+        limit = clamp_limit(limit, default=50)
+        condition, params = keyset_condition("created_at", cursor)
         feedbacks = execute_query(
-            "SELECT id, message_id, rating, comment, created_at FROM ai_feedback ORDER BY created_at DESC LIMIT %s",
-            (limit,)
+            f"""SELECT id, message_id, rating, comment, created_at
+               FROM ai_feedback
+               {"WHERE " + condition if condition else ""}
+               ORDER BY created_at DESC, id DESC
+               LIMIT %s""",
+            params + (limit + 1,)
         ) or []
+        feedbacks, next_cursor = build_page(feedbacks, limit, "created_at")
 
         for fb in feedbacks:
             if fb.get("created_at"):
                 fb["created_at"] = str(fb["created_at"])
 
-        avg_result = execute_query("SELECT AVG(rating) as avg_rating FROM ai_feedback")
-        avg = round(avg_result[0]["avg_rating"] or 0, 2) if avg_result else 0
+        avg = round(FeedbackRepository.get_average_rating(), 2)
 
-        return {"status": "ok", "feedbacks": feedbacks, "average_rating": avg}
+        response = {
+            "status": "ok",
+            "feedbacks": feedbacks,
+            "average_rating": avg,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None,
+        }
+        if include_total:
+            response["total"] = approximate_total("ai_feedback", execute_query)
+            response["total_is_approximate"] = True
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
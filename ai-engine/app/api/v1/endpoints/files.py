@@ -3,80 +3,140 @@
 نقاط نهاية الملفات - محسّنة مع استخراج النص
 """
 import os
-import uuid
+import asyncio
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
 from typing import Optional
 from app.db.mysql_conn import execute_query
-from app.utils.file_processor import extract_text_from_file
+from app.db.unit_of_work import UnitOfWork
+from app.background.runner import enqueue
+from app.repositories.file_repo import FileRepository
+from app.config import settings
+from app.services.ingest_service import ingest_service
+from app.utils.uploads import safe_upload_path, save_upload
+from app.utils.pagination import (
+    clamp_limit, keyset_condition, build_page, approximate_total
+)
 
 router = APIRouter()
 
 UPLOAD_DIR = os.environ.get("UPLOAD_DIR", "uploads")
 
 
+def _knowledge_base_exists(knowledge_base_id: str) -> bool:
+    return bool(execute_query(
+        "SELECT id FROM ai_knowledge_bases WHERE id = %s", (knowledge_base_id,)
+    ))
+
+
+def _register_upload(record: dict, knowledge_base_id: Optional[str]) -> tuple:
+    """
+    سجل الملف + مسار الإدخال (متزامن: يُستدعى خارج حلقة الأحداث)
+
+    Returns:
+        (file_id, ingest, extracted_text)
+    """
+    if settings.JOBS_ENABLED:
+        # سجل الملف ومهمة الإدخال في معاملة واحدة
+        with UnitOfWork() as uow:
+            file_id = FileRepository.create(**record, uow=uow)
+            job_id = enqueue(
+                "ingest.file", uow=uow, file_id=file_id,
+                knowledge_base_id=knowledge_base_id, title=record["filename"]
+            )
+        return file_id, {
+            "status": "queued",
+            "job_id": job_id,
+            "status_url": f"/api/v1/ingest-jobs/{job_id}",
+        }, ""
+
+    file_id = FileRepository.create(**record)
+    result = ingest_service.run(file_id, knowledge_base_id, record["filename"])
+    extracted_text = (FileRepository.get_by_id(file_id) or {}).get("extracted_text") or ""
+    return file_id, {"status": "done", **result}, extracted_text
+
+
 @router.post("/files/upload")
 async def upload_file(
     file: UploadFile = File(...),
     knowledge_base_id: Optional[str] = Form(None),
+    sha256: Optional[str] = Form(None),
 ):
-    """رفع ملف واستخراج نصه تلقائياً"""
+    """
+    رفع ملف واستخراج نصه تلقائياً
+
+    الملف يُكتب على القرص بأجزاء (بدون تحميله كاملاً في الذاكرة) مع فحص
+    MAX_FILE_SIZE وحساب SHA-256 أثناء الكتابة؛ sha256 اختياري للتحقق من السلامة.
+
+    مع JOBS_ENABLED: مسار الإدخال (extract -> chunk -> insert -> index) مهمة
+    ingest.file في الخلفية، والرد يعيد معرف المهمة فوراً (الحالة: GET /ingest-jobs/{id}).
+    بدون knowledge_base_id يتوقف المسار بعد استخراج النص
+    """
     try:
-        content = await file.read()
-        os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-        file_ext = os.path.splitext(file.filename)[1].lower() or ".bin"
-        safe_name = f"{uuid.uuid4()}{file_ext}"
-        file_path = os.path.join(UPLOAD_DIR, safe_name)
-
-        with open(file_path, "wb") as f:
-            f.write(content)
-
-        file_id = str(uuid.uuid4())
-        
-        # استخراج النص باستخدام المعالج الجديد
-        processed = extract_text_from_file(file_path, file.content_type, content)
-        extracted_text = processed.get("text", "")
-        
-        # حفظ في قاعدة البيانات
-        execute_query(
-            """INSERT INTO ai_files (id, filename, mime_type, file_size, file_path, extracted_text)
-               VALUES (%s, %s, %s, %s, %s, %s)""",
-            (file_id, file.filename, file.content_type, len(content), file_path, extracted_text)
+        # الاستعلامات والإدخال متزامنة: في threadpool حتى لا تحجز حلقة الأحداث
+        if knowledge_base_id and not await asyncio.to_thread(_knowledge_base_exists, knowledge_base_id):
+            raise HTTPException(status_code=404, detail="قاعدة المعرفة غير موجودة")
+
+        file_path = safe_upload_path(UPLOAD_DIR, file.filename)
+        saved = await save_upload(file, file_path, expected_sha256=sha256)
+        file_size = saved["size"]
+
+        record = dict(
+            filename=file.filename,
+            mime_type=file.content_type,
+            file_size=file_size,
+            file_path=file_path,
+        )
+        file_id, ingest, extracted_text = await asyncio.to_thread(
+            _register_upload, record, knowledge_base_id
         )
-        
-        # إذا تم تحديد قاعدة معرفة، قم بإضافة الملف إليها كمستند
-        if knowledge_base_id:
-             doc_id = str(uuid.uuid4())
-             execute_query(
-                 "INSERT INTO ai_documents (id, knowledge_base_id, file_id, title, language) VALUES (%s, %s, %s, %s, %s)",
-                 (doc_id, knowledge_base_id, file_id, file.filename, "ar")
-             )
-             # يمكن هنا إضافة تقطيع تلقائي أيضاً
 
         return {
             "status": "ok",
             "file_id": file_id,
             "filename": file.filename,
-            "file_size": len(content),
+            "file_size": file_size,
+            "sha256": saved["sha256"],
             "mime_type": file.content_type,
             "text_extracted": bool(extracted_text),
-            "preview": extracted_text[:100] if extracted_text else ""
+            "preview": extracted_text[:100] if extracted_text else "",
+            "ingest": ingest,
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/files")
-def list_files(limit: int = 20):
-    """قائمة الملفات"""
+def list_files(limit: int = 20, cursor: Optional[str] = None, include_total: bool = False):
+    """قائمة الملفات (ترقيم بالمؤشر على created_at, id)"""
     try:
+        limit = clamp_limit(limit)
+        condition, params = keyset_condition("created_at", cursor)
         files = execute_query(
-            "SELECT id, filename, mime_type, file_size, created_at FROM ai_files ORDER BY created_at DESC LIMIT %s",
-            (limit,)
+            f"""SELECT id, filename, mime_type, file_size, created_at
+               FROM ai_files
+               {"WHERE " + condition if condition else ""}
+               ORDER BY created_at DESC, id DESC
+               LIMIT %s""",
+            params + (limit + 1,)
         ) or []
+        files, next_cursor = build_page(files, limit, "created_at")
         for f in files:
             if f.get("created_at"):
                 f["created_at"] = str(f["created_at"])
-        return {"status": "ok", "files": files}
+
+        response = {
+            "status": "ok",
+            "files": files,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None,
+        }
+        if include_total:
+            response["total"] = approximate_total("ai_files", execute_query)
+            response["total_is_approximate"] = True
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
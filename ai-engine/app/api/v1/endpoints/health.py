@@ -1,6 +1,15 @@
 # app/api/v1/endpoints/health.py
 from fastapi import APIRouter
 from app.db.mysql_conn import execute_query
+from app.db.base import replica_status, pool_stats
+from app.db.instrumentation import query_stats
+from app.db.write_behind import write_behind
+from app.db.cache import cache_status
+from app.api.v1.endpoints.chat import answers_in_flight
+from app.background.runner import job_runner
+from app.core.admission import admission
+from app.utils.extraction_pool import extraction_pool
+from app.config import settings
 
 router = APIRouter()
 
@@ -34,15 +43,70 @@ def health():
             for row in results
         ]
     
+    # حالة النسخ المتماثلة: المتأخرة أكثر من الحد تُستبعد من القراءة
+    replicas = replica_status(refresh=True)
+    lagging = [r["host"] for r in replicas if not r["healthy"]]
+
     return {
-        "status": "ok",
+        "status": "ok" if not lagging else "degraded",
         "message": "API متصل بقاعدة البيانات بنجاح",
         "database_connection": True if results is not None else False,
+        "replicas": replicas,
+        "replica_max_lag_seconds": settings.DB_REPLICA_MAX_LAG,
         "total_chunks_found": len(sample_questions),
         "sample_chunks": sample_questions
     }
 
 
+@router.get("/health/pool")
+def pool_health():
+    """عدادات تجمع الاتصالات (in_use / idle / overflow / timeouts ...)"""
+    return {"status": "ok", "pools": pool_stats()}
+
+
+@router.get("/health/write-behind")
+def write_behind_health():
+    """حالة طابور الكتابة المؤجلة (العمق، الدفعات، السجل على القرص)"""
+    status = write_behind.status()
+    healthy = status["journal_bytes"] == 0 and status["dead"] == 0
+    return {"status": "ok" if healthy else "degraded", "write_behind": status}
+
+
+@router.get("/health/cache")
+def cache_health():
+    """الذاكرة المؤقتة داخل العامل (الحجم، نسبة الإصابة، الإخراج) + الأسئلة المدموجة"""
+    return {"status": "ok", "cache": cache_status(), "single_flight": answers_in_flight.status()}
+
+
+@router.get("/health/jobs")
+def jobs_health():
+    """حالة المهام الخلفية (العمّال لكل طابور، عدد المهام حسب الحالة، المتوقفة dead) + تجمع الاستخراج"""
+    status = job_runner.status()
+    dead = sum(
+        counts.get("dead", 0) for counts in status["jobs"].values() if isinstance(counts, dict)
+    )
+    healthy = (status["running"] or not settings.JOBS_ENABLED) and dead == 0
+    return {
+        "status": "ok" if healthy else "degraded",
+        "jobs": status,
+        "extraction": extraction_pool.status(),
+    }
+
+
+@router.get("/health/admission")
+def admission_health():
+    """التحكم في القبول لكل فئة (النشط، عمق الطابور، المرفوض 429/503)"""
+    status = admission.status()
+    saturated = any(g["queued"] >= g["queue_size"] for g in status["gates"].values())
+    return {"status": "degraded" if saturated else "ok", "admission": status}
+
+
+@router.get("/health/queries")
+def queries_health(limit: int = 50, order_by: str = "total_ms"):
+    """إحصائيات الاستعلامات حسب البصمة (عدد، متوسط، أقصى، صفوف، توزيع الأزمنة)"""
+    return {"status": "ok", "queries": query_stats(limit, order_by)}
+
+
 @router.get("/test-db")
 def test_database():
     """
@@ -0,0 +1,47 @@
+# app/api/v1/endpoints/ingest.py
+"""
+نقاط نهاية مهام الإدخال - حالة مسار extract -> chunk -> insert -> index
+"""
+from fastapi import APIRouter, HTTPException
+from app.repositories.job_repo import JobRepository
+from app.services.ingest_service import STAGES, throughput
+
+router = APIRouter()
+
+
+@router.get("/ingest-jobs/{job_id}")
+def get_ingest_job(job_id: str):
+    """حالة مهمة إدخال: الحالة، المرحلة الحالية، تقدم كل مرحلة، ومعدلات المعالجة"""
+    try:
+        job = JobRepository.get_by_id(job_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not job or not str(job.get("task", "")).startswith("ingest."):
+        raise HTTPException(status_code=404, detail="مهمة الإدخال غير موجودة")
+
+    progress = job.get("progress") if isinstance(job.get("progress"), dict) else {}
+    stages = progress.get("stages", {})
+    stage = progress.get("stage") or ("pending" if job["status"] == JobRepository.QUEUED else None)
+    if job["status"] == JobRepository.DONE:
+        stage = "done"
+
+    return {
+        "status": "ok",
+        "job": {
+            "id": job["id"],
+            "state": job["status"],
+            "stage": stage,
+            "stages": [
+                {"name": name, "done": name in stages, **stages.get(name, {})}
+                for name in STAGES
+            ],
+            "document_id": progress.get("document_id"),
+            "attempts": job.get("attempts"),
+            "max_attempts": job.get("max_attempts"),
+            "error": job.get("last_error") if job["status"] != JobRepository.DONE else None,
+            "result": job.get("result"),
+            "throughput": throughput(progress),
+            "created_at": str(job["created_at"]) if job.get("created_at") else None,
+            "finished_at": str(job["finished_at"]) if job.get("finished_at") else None,
+        },
+    }
@@ -2,10 +2,15 @@
 """
 نقاط نهاية قواعد المعرفة - تعمل مع mysql_conn.py مباشرة
 """
-import uuid
 import re
+import time
 from fastapi import APIRouter, HTTPException
 from app.db.mysql_conn import execute_query
+from app.db.ids import new_id
+from app.db.unit_of_work import UnitOfWork
+from app.repositories.document_repo import DocumentRepository
+from app.repositories.chunk_repo import ChunkRepository
+from app.config import settings
 
 router = APIRouter()
 
@@ -29,7 +34,7 @@ def list_knowledge_bases():
 def create_knowledge_base(data: dict):
     """إنشاء قاعدة معرفة"""
     try:
-        kb_id = str(uuid.uuid4())
+        kb_id = new_id()
         name = data.get("name", "بدون اسم")
         description = data.get("description", "")
         is_public = data.get("is_public", False)
@@ -45,7 +50,12 @@ def create_knowledge_base(data: dict):
 
 @router.post("/knowledge-bases/{kb_id}/documents")
 def add_document(kb_id: str, data: dict):
-    """إضافة مستند وتقطيعه"""
+    """
+    إضافة مستند وتقطيعه
+
+    المستند وكل قطعه في معاملة واحدة (كل شيء أو لا شيء)، والقطع تُدرج
+    بعبارات INSERT متعددة الصفوف بحجم DB_CHUNK_BATCH_SIZE (أو batch_size في الطلب)
+    """
     try:
         # تحقق من وجود قاعدة المعرفة
         existing = execute_query("SELECT id FROM ai_knowledge_bases WHERE id = %s", (kb_id,))
@@ -59,32 +69,37 @@ def add_document(kb_id: str, data: dict):
         if not content.strip():
             raise HTTPException(status_code=400, detail="المحتوى مطلوب")
 
-        # إنشاء المستند
-        doc_id = str(uuid.uuid4())
-        execute_query(
-            "INSERT INTO ai_documents (id, knowledge_base_id, title, language) VALUES (%s, %s, %s, %s)",
-            (doc_id, kb_id, title, language)
-        )
+        batch_size = parse_batch_size(data.get("batch_size"))
 
         # تقطيع النص
         chunks = simple_chunk_text(content, chunk_size=500, overlap=50)
-        created = 0
-
-        for idx, chunk_text in enumerate(chunks):
-            chunk_id = str(uuid.uuid4())
-            token_count = len(chunk_text.split())
-            execute_query(
-                """INSERT INTO ai_document_chunks
-                   (id, document_id, chunk_index, content, language, token_count)
-                   VALUES (%s, %s, %s, %s, %s, %s)""",
-                (chunk_id, doc_id, idx + 1, chunk_text, language, token_count)
+
+        started = time.perf_counter()
+        with UnitOfWork(batch_size=batch_size) as uow:
+            doc_id = DocumentRepository.create(kb_id, title=title, language=language, uow=uow)
+            created = ChunkRepository.bulk_create(
+                [
+                    {
+                        "document_id": doc_id,
+                        "chunk_index": idx + 1,
+                        "content": chunk_text,
+                        "language": language,
+                        "token_count": len(chunk_text.split()),
+                    }
+                    for idx, chunk_text in enumerate(chunks)
+                ],
+                uow=uow
             )
-            created += 1
+        elapsed = time.perf_counter() - started
 
         return {
             "status": "ok",
             "document_id": doc_id,
             "chunks_created": created,
+            "batch_size": batch_size,
+            "db_round_trips": uow.round_trips,
+            "insert_ms": round(elapsed * 1000, 2),
+            "chunks_per_second": round(created / elapsed, 1) if elapsed > 0 else None,
             "message": f"تم إضافة المستند وإنشاء {created} قطعة",
         }
     except HTTPException:
@@ -93,6 +108,24 @@ def add_document(kb_id: str, data: dict):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def parse_batch_size(value) -> int:
+    """
+    batch_size من الطلب: غير موجود -> DB_CHUNK_BATCH_SIZE، غير صالح أو < 1 -> 400،
+    أكبر من DB_CHUNK_BATCH_MAX -> يُقص إلى الحد
+    """
+    if value is None or value == "":
+        return settings.DB_CHUNK_BATCH_SIZE
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise HTTPException(status_code=400, detail="batch_size يجب أن يكون عدداً صحيحاً")
+    try:
+        batch_size = int(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="batch_size يجب أن يكون عدداً صحيحاً")
+    if batch_size < 1:
+        raise HTTPException(status_code=400, detail="batch_size يجب أن يكون أكبر من صفر")
+    return min(batch_size, settings.DB_CHUNK_BATCH_MAX)
+
+
 def simple_chunk_text(text, chunk_size=500, overlap=50):
     """تقطيع النص البسيط"""
     if not text:
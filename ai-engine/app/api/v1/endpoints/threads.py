@@ -2,23 +2,37 @@
 """
 نقاط نهاية المحادثات - تعمل مباشرة مع mysql_conn.py
 """
+from typing import Optional
 from fastapi import APIRouter, HTTPException
 from app.db.mysql_conn import execute_query
+from app.db.ids import db_id
+from app.db.unit_of_work import UnitOfWork
+from app.repositories.thread_repo import ThreadRepository
+from app.utils.pagination import clamp_limit, keyset_condition, build_page
 
 router = APIRouter()
 
 
 @router.get("/threads")
-def list_threads(limit: int = 20, offset: int = 0):
-    """قائمة المحادثات"""
+def list_threads(limit: int = 20, cursor: Optional[str] = None, include_total: bool = False):
+    """
+    قائمة المحادثات (ترقيم بالمؤشر على updated_at, id)
+
+    - cursor: قيمة next_cursor من الصفحة السابقة
+    - include_total: إضافة عدد المحادثات (من جدول العدادات)
+    """
     try:
+        limit = clamp_limit(limit)
+        condition, params = keyset_condition("updated_at", cursor)
         threads = execute_query(
-            """SELECT id, title, created_at, updated_at
+            f"""SELECT id, title, created_at, updated_at
                FROM ai_threads
-               ORDER BY updated_at DESC
-               LIMIT %s OFFSET %s""",
-            (limit, offset)
+               {"WHERE " + condition if condition else ""}
+               ORDER BY updated_at DESC, id DESC
+               LIMIT %s""",
+            params + (limit + 1,)
         ) or []
+        threads, next_cursor = build_page(threads, limit, "updated_at")
 
         # تحويل datetime إلى string
         for t in threads:
@@ -26,10 +40,17 @@ def list_threads(limit: int = 20, offset: int = 0):
                 if t.get(key):
                     t[key] = str(t[key])
 
-        count_result = execute_query("SELECT COUNT(*) as total FROM ai_threads")
-        total = count_result[0]["total"] if count_result else 0
-
-        return {"status": "ok", "threads": threads, "total": total}
+        response = {
+            "status": "ok",
+            "threads": threads,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None,
+        }
+        if include_total:
+            response["total"] = ThreadRepository.count()
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -40,7 +61,7 @@ def get_thread(thread_id: str):
     try:
         thread_rows = execute_query(
             "SELECT id, title, created_at, updated_at FROM ai_threads WHERE id = %s",
-            (thread_id,)
+            (db_id(thread_id),)
         )
         if not thread_rows:
             raise HTTPException(status_code=404, detail="المحادثة غير موجودة")
@@ -55,7 +76,7 @@ def get_thread(thread_id: str):
                FROM ai_messages
                WHERE thread_id = %s
                ORDER BY created_at ASC""",
-            (thread_id,)
+            (db_id(thread_id),)
         ) or []
 
         for msg in messages:
@@ -79,14 +100,16 @@ def delete_thread(thread_id: str):
     """حذف محادثة"""
     try:
         existing = execute_query(
-            "SELECT id FROM ai_threads WHERE id = %s", (thread_id,)
+            "SELECT id FROM ai_threads WHERE id = %s", (db_id(thread_id),)
         )
         if not existing:
             raise HTTPException(status_code=404, detail="المحادثة غير موجودة")
 
-        execute_query("DELETE FROM ai_messages WHERE thread_id = %s", (thread_id,))
-        execute_query("DELETE FROM ai_thread_memory WHERE thread_id = %s", (thread_id,))
-        execute_query("DELETE FROM ai_threads WHERE id = %s", (thread_id,))
+        # الحذف + عداد المحادثات في معاملة واحدة
+        with UnitOfWork() as uow:
+            uow.add("DELETE FROM ai_messages WHERE thread_id = %s", (db_id(thread_id),))
+            uow.add("DELETE FROM ai_thread_memory WHERE thread_id = %s", (db_id(thread_id),))
+            ThreadRepository.delete(thread_id, uow=uow)
 
         return {"status": "ok", "message": "تم حذف المحادثة"}
     except HTTPException:
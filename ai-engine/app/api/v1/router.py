@@ -3,8 +3,8 @@
 الموجه الرئيسي لإصدار API v1 - يسجل كل الـ endpoints
 """
 from fastapi import APIRouter
-from app.api.v1.endpoints import health, chat, threads, files, knowledge, feedback
-from app.api.v1.endpoints import questions
+from app.api.v1.endpoints import health, chat, chat_batch, threads, files, knowledge, feedback
+from app.api.v1.endpoints import questions, ingest
 
 # الموجه الرئيسي
 api_v1_router = APIRouter()
@@ -12,8 +12,10 @@ api_v1_router = APIRouter()
 # تسجيل كل الـ routers
 api_v1_router.include_router(health.router, tags=["health"])
 api_v1_router.include_router(chat.router, tags=["chat"])
+api_v1_router.include_router(chat_batch.router, tags=["chat"])
 api_v1_router.include_router(threads.router, tags=["threads"])
 api_v1_router.include_router(files.router, tags=["files"])
 api_v1_router.include_router(knowledge.router, tags=["knowledge"])
 api_v1_router.include_router(feedback.router, tags=["feedback"])
 api_v1_router.include_router(questions.router, tags=["questions"])
+api_v1_router.include_router(ingest.router, tags=["ingest"])
@@ -1,4 +1,7 @@
 # app/background/__init__.py
 """
-المهام الخلفية - يمكن إضافة مهام async لاحقاً
+المهام الخلفية - طابور دائم (ai_jobs) وعمّال داخل العملية
 """
+from app.background.runner import job_runner, enqueue, task
+
+__all__ = ["job_runner", "enqueue", "task"]
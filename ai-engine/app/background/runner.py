@@ -0,0 +1,311 @@
+# app/background/runner.py
+"""
+منفّذ المهام الخلفية - عمّال داخل العملية فوق طابور دائم (ai_jobs)
+
+- كل طابور له عدد عمّال محدد (JOB_QUEUES) فلا تزاحم مهام OCR الثقيلة تحديث الذاكرة
+- المهمة تُحفظ في قاعدة البيانات قبل التنفيذ: لا تضيع عند إعادة التشغيل
+- الفشل يُعاد بتأخير متضاعف حتى max_attempts ثم dead
+- نبض دوري (JOB_HEARTBEAT_SECONDS) للمهام الجارية: المهمة الطويلة لا تُحجز مرتين،
+  والمهمة التي توقف عاملها تُعاد بعد JOB_STALE_SECONDS ضمن نفس حد المحاولات
+- الحجز بـ FOR UPDATE SKIP LOCKED: عدة عمليات (Passenger) تتقاسم نفس الطابور
+
+الاستخدام:
+    @task("memory.update", queue="memory")
+    def update_memory(thread_id): ...
+
+    enqueue("memory.update", uow=uow, thread_id=thread_id)
+"""
+import os
+import time
+import socket
+import atexit
+import threading
+import traceback
+from app.repositories.job_repo import JobRepository
+from app.db.routing import begin_request, end_request
+from app.config import settings
+from app.core.logging_config import logger
+
+# اسم المهمة -> (الدالة، الطابور)
+TASKS = {}
+
+# فاصل صيانة الطابور (إعادة المهام المعلّقة + حذف المنتهية)
+MAINTENANCE_INTERVAL = 60
+
+# المهمة الجارية في خيط العامل الحالي (للمهام التي تسجل تقدمها)
+_current = threading.local()
+
+
+def task(name: str, queue: str = "default"):
+    """تسجيل دالة كمهمة خلفية (المعاملات من payload كـ kwargs)"""
+    def decorator(func):
+        TASKS[name] = (func, queue)
+        return func
+    return decorator
+
+
+def _load_tasks():
+    """استيراد وحدة المهام لتسجيلها (مؤجل لتجنب الاستيراد الدائري)"""
+    import app.background.tasks  # noqa: F401
+
+
+def current_job():
+    """المهمة التي ينفذها هذا الخيط (None خارج العمّال / التنفيذ المباشر)"""
+    return getattr(_current, "job", None)
+
+
+def report_progress(progress: dict, uow=None):
+    """
+    حفظ تقدم المهمة الجارية في ai_jobs.progress (لا شيء خارج العمّال)
+
+    المحاولة التالية بعد فشل تجده في current_job()["progress"]
+    """
+    job = current_job()
+    if job is None:
+        return
+    job["progress"] = progress
+    JobRepository.update_progress(job["id"], progress, uow=uow)
+
+
+def parse_queues(spec: str) -> dict:
+    """"default:2,ocr:1" -> {"default": 2, "ocr": 1}"""
+    queues = {}
+    for entry in spec.split(","):
+        name, _, workers = entry.strip().partition(":")
+        if name:
+            queues[name] = max(int(workers or 1), 1)
+    return queues
+
+
+class JobRunner:
+    """عمّال الطوابير (خيوط daemon) مع إيقاظ فوري عند الإضافة"""
+
+    def __init__(self, queues: dict = None, poll_interval: float = None):
+        self.queues = queues or parse_queues(settings.JOB_QUEUES)
+        self.poll_interval = poll_interval or settings.JOB_POLL_INTERVAL
+        self._running = False
+        self._threads = []
+        self._lock = threading.Lock()
+        self._wake = {name: threading.Event() for name in self.queues}
+        self._active = set()  # معرفات المهام الجارية في هذه العملية (للنبض)
+        self._stop = threading.Event()
+        self._identity = f"{socket.gethostname()}:{os.getpid()}"
+        self._stats = {
+            "processed": 0,
+            "failed": 0,
+            "retried": 0,
+            "dead": 0,
+            "requeued_stale": 0,
+            "purged": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    # ------------------------------------------------------------------
+    # دورة الحياة
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """تشغيل العمّال (وإعادة مهام عمليات توقفت أثناء التنفيذ)"""
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._stop.clear()
+        _load_tasks()
+        idle = {queue for _, queue in TASKS.values()} - set(self.queues)
+        if idle:
+            logger.warning(f"⚠️ طوابير بدون عمّال في JOB_QUEUES: {', '.join(sorted(idle))}")
+        self._maintain()
+
+        for queue, workers in self.queues.items():
+            for i in range(workers):
+                thread = threading.Thread(
+                    target=self._work, args=(queue, f"{self._identity}:{queue}-{i}"),
+                    name=f"job-{queue}-{i}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+        for target, name in ((self._maintenance_loop, "job-maintenance"),
+                             (self._heartbeat_loop, "job-heartbeat")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        atexit.register(self.stop)
+        logger.info(
+            "⚙️ المهام الخلفية تعمل: "
+            + ", ".join(f"{q}×{n}" for q, n in self.queues.items())
+        )
+
+    def stop(self, timeout: float = 10.0):
+        """إيقاف العمّال بعد إنهاء المهام الجارية (ما لم يبدأ يبقى في الطابور)"""
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            self._stop.set()
+            for event in self._wake.values():
+                event.set()
+            threads, self._threads = self._threads, []
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+        logger.info("🛑 تم إيقاف المهام الخلفية")
+
+    def notify(self, queue: str):
+        """إيقاظ عمّال الطابور (مهمة جديدة جاهزة)"""
+        event = self._wake.get(queue)
+        if event is not None:
+            event.set()
+
+    # ------------------------------------------------------------------
+    # التنفيذ
+    # ------------------------------------------------------------------
+
+    def _work(self, queue: str, worker: str):
+        wake = self._wake[queue]
+        while not self._stop.is_set():
+            try:
+                jobs = JobRepository.claim(queue, worker)
+            except Exception as e:
+                logger.error(f"❌ فشل حجز مهام {queue}: {e}")
+                jobs = []
+            if not jobs:
+                wake.wait(self.poll_interval)
+                wake.clear()
+                continue
+            for job in jobs:
+                self._execute(job)
+
+    def _execute(self, job: dict):
+        name = job["task"]
+        entry = TASKS.get(name)
+        if entry is None:
+            self._fail(job, f"مهمة غير معروفة: {name}", retry=False)
+            return
+
+        started = time.perf_counter()
+        _current.job = job
+        with self._lock:
+            self._active.add(job["id"])
+        # كل مهمة نطاق توجيه مستقل: قراءاتها بعد كتاباتها تذهب للرئيسي، ثم يُعاد الضبط
+        route_token = begin_request()
+        try:
+            result = entry[0](**job["payload"])
+        except Exception as e:
+            logger.error(f"❌ فشلت المهمة {name} ({job['id']}): {e}")
+            self._fail(job, f"{e}\n{traceback.format_exc(limit=5)}")
+            return
+        finally:
+            end_request(route_token)
+            _current.job = None
+            with self._lock:
+                self._active.discard(job["id"])
+
+        try:
+            JobRepository.complete(job["id"], result)
+        except Exception as e:
+            # المهمة نُفّذت؛ تبقى running وتُعاد بعد JOB_STALE_SECONDS (المهام قابلة للتكرار)
+            logger.error(f"❌ فشل تسجيل انتهاء المهمة {job['id']}: {e}")
+            return
+        with self._lock:
+            self._stats["processed"] += 1
+        logger.debug(f"✅ {name} ({job['id']}) {(time.perf_counter() - started) * 1000:.0f}ms")
+
+    def _fail(self, job: dict, error: str, retry: bool = True):
+        attempts = job.get("attempts") or 1
+        retry = retry and attempts < (job.get("max_attempts") or settings.JOB_MAX_ATTEMPTS)
+        retry_in = settings.JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1) if retry else None
+        try:
+            JobRepository.fail(job["id"], error, retry_in)
+        except Exception as e:
+            logger.error(f"❌ فشل تسجيل فشل المهمة {job['id']}: {e}")
+        with self._lock:
+            self._stats["failed"] += 1
+            self._stats["retried" if retry else "dead"] += 1
+        if not retry:
+            logger.error(f"💀 المهمة {job['task']} ({job['id']}) توقفت بعد {attempts} محاولة")
+
+    # ------------------------------------------------------------------
+    # الصيانة
+    # ------------------------------------------------------------------
+
+    def _maintenance_loop(self):
+        while not self._stop.wait(MAINTENANCE_INTERVAL):
+            self._maintain()
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(settings.JOB_HEARTBEAT_SECONDS):
+            self._heartbeat()
+
+    def _heartbeat(self):
+        with self._lock:
+            active = list(self._active)
+        try:
+            JobRepository.heartbeat(active)
+        except Exception as e:
+            logger.error(f"❌ فشل نبض المهام الجارية: {e}")
+
+    def _maintain(self):
+        try:
+            requeued, dead = JobRepository.requeue_stale(settings.JOB_STALE_SECONDS)
+            purged = JobRepository.purge_finished(settings.JOB_RETENTION_HOURS)
+        except Exception as e:
+            logger.error(f"❌ فشل صيانة طابور المهام: {e}")
+            return
+        with self._lock:
+            self._stats["requeued_stale"] += requeued
+            self._stats["dead"] += dead
+            self._stats["purged"] += purged
+        if requeued:
+            logger.warning(f"♻️ أُعيدت {requeued} مهمة معلّقة إلى الطابور")
+        if dead:
+            logger.error(f"💀 {dead} مهمة معلّقة استنفدت المحاولات - dead")
+
+    def status(self) -> dict:
+        """حالة العمّال وعدد المهام لكل طابور/حالة (لنقطة الصحة)"""
+        try:
+            counts = {}
+            for row in JobRepository.counts():
+                counts.setdefault(row["queue"], {})[row["status"]] = int(row["total"])
+        except Exception as e:
+            counts = {"error": str(e)}
+        with self._lock:
+            return {
+                "running": self._running,
+                "workers": dict(self.queues),
+                "poll_interval": self.poll_interval,
+                "jobs": counts,
+                **self._stats,
+            }
+
+
+job_runner = JobRunner()
+
+
+def enqueue(task_name: str, uow=None, delay: float = 0, max_attempts: int = None,
+            **payload) -> str:
+    """
+    إضافة مهمة للطابور -> معرف المهمة
+
+    مع uow: تُحفظ مع كتابات وحدة العمل (وتُنفَّذ بعد commit فقط)
+    delay: ثوانٍ قبل أن تصبح المهمة جاهزة
+    """
+    _load_tasks()
+    if task_name not in TASKS:
+        raise KeyError(f"مهمة غير مسجلة: {task_name}")
+    queue = TASKS[task_name][1]
+    job_id = JobRepository.create(
+        queue, task_name, payload,
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+        delay=delay,
+        uow=uow,
+    )
+    if not job_runner.running:
+        # التشغيل عند أول استخدام: Passenger لا يمر دائماً بحدث startup
+        job_runner.start()
+    elif not delay:
+        job_runner.notify(queue)
+    return job_id
@@ -0,0 +1,44 @@
+# app/background/tasks.py
+"""
+المهام الخلفية المسجلة
+
+- memory.update (memory): إعادة تلخيص ذاكرة المحادثة بعد كل دورة
+- file.extract (ocr): استخراج نص الملف المرفوع (OCR للصور / PDF / DOCX ...)
+- ingest.file (ingest): مسار الإدخال extract -> chunk -> insert -> index مع تتبع التقدم
+"""
+from app.background.runner import task
+from app.repositories.file_repo import FileRepository
+from app.services.memory_service import memory_service
+from app.services.ingest_service import ingest_service
+from app.utils.extraction_pool import extraction_pool, RETRYABLE_METHODS
+from app.core.logging_config import logger
+
+
+@task("memory.update", queue="memory")
+def update_memory(thread_id: str):
+    """تحديث ذاكرة المحادثة (يقرأ الرسائل بعد تأكيد كتابتها)"""
+    memory_service.update_memory(thread_id)
+
+
+@task("file.extract", queue="ocr")
+def extract_file_text(file_id: str) -> dict:
+    """استخراج النص من ملف محفوظ وتخزينه في ai_files.extracted_text"""
+    file = FileRepository.get_by_id(file_id)
+    if not file:
+        logger.warning(f"⚠️ الملف {file_id} لم يعد موجوداً - تم تجاهل الاستخراج")
+        return {"skipped": True}
+
+    processed = extraction_pool.extract(file.get("file_path"), file.get("mime_type") or "")
+    if processed.get("method") in RETRYABLE_METHODS:
+        # خطأ عابر محتمل (ملف قيد الكتابة / مكتبة OCR): إعادة المحاولة لاحقاً
+        raise RuntimeError(processed.get("text") or "فشل استخراج النص")
+
+    text = processed.get("text", "")
+    FileRepository.update_extracted_text(file_id, text)
+    return {"method": processed.get("method"), "chars": len(text)}
+
+
+@task("ingest.file", queue="ingest")
+def ingest_file(file_id: str, knowledge_base_id: str = None, title: str = None) -> dict:
+    """إدخال ملف مرفوع إلى قاعدة المعرفة (يستأنف من آخر مرحلة مكتملة)"""
+    return ingest_service.run(file_id, knowledge_base_id, title)
@@ -12,12 +12,64 @@ class Settings:
     """إعدادات التطبيق"""
 
     # قاعدة البيانات
+    DB_BACKEND: str = os.getenv("DB_BACKEND", "mysql").lower()  # mysql | sqlite
     DB_HOST: str = os.getenv("DB_HOST", "localhost")
     DB_NAME: str = os.getenv("DB_NAME", "")
     DB_USER: str = os.getenv("DB_USER", "")
     DB_PASS: str = os.getenv("DB_PASS", "")
     DB_CHARSET: str = os.getenv("DB_CHARSET", "utf8mb4")
     DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_POOL_MAX_OVERFLOW: int = int(os.getenv("DB_POOL_MAX_OVERFLOW", "5"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "5"))  # ثوانٍ انتظار اتصال حر
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # أقصى عمر للاتصال
+    DB_POOL_PRE_PING_AFTER: int = int(os.getenv("DB_POOL_PRE_PING_AFTER", "30"))  # ping بعد خمول
+    DB_BATCH_SIZE: int = int(os.getenv("DB_BATCH_SIZE", "500"))  # صفوف لكل INSERT متعدد
+    DB_PREPARED_STATEMENTS: bool = os.getenv("DB_PREPARED_STATEMENTS", "false").lower() == "true"
+    DB_PREPARED_CACHE_SIZE: int = int(os.getenv("DB_PREPARED_CACHE_SIZE", "32"))  # لكل اتصال
+    DB_STREAM_BATCH_SIZE: int = int(os.getenv("DB_STREAM_BATCH_SIZE", "1000"))  # fetchmany
+    DB_CHUNK_BATCH_SIZE: int = int(os.getenv("DB_CHUNK_BATCH_SIZE", "200"))  # قطع لكل INSERT عند إضافة مستند
+    DB_CHUNK_BATCH_MAX: int = int(os.getenv("DB_CHUNK_BATCH_MAX", "1000"))  # حد batch_size في الطلب (max_allowed_packet)
+    DB_BINARY_IDS: bool = os.getenv("DB_BINARY_IDS", "false").lower() == "true"  # بعد ترحيل 0003
+    DB_COUNTER_SLOTS: int = int(os.getenv("DB_COUNTER_SLOTS", "8"))  # خانات كل عداد إحصائي
+
+    # SQLite المدمجة (DB_BACKEND=sqlite)
+    SQLITE_PATH: str = os.getenv("SQLITE_PATH", "data/ai_engine.db")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # NORMAL آمن مع WAL
+    SQLITE_CACHE_MB: int = int(os.getenv("SQLITE_CACHE_MB", "64"))  # لكل اتصال
+
+    # النسخ المتماثلة للقراءة (host[:port] مفصولة بفواصل)
+    DB_REPLICA_HOSTS: str = os.getenv("DB_REPLICA_HOSTS", "")
+    DB_REPLICA_POOL_SIZE: int = int(os.getenv("DB_REPLICA_POOL_SIZE", "5"))
+    DB_REPLICA_MAX_LAG: int = int(os.getenv("DB_REPLICA_MAX_LAG", "5"))  # ثوانٍ
+    DB_REPLICA_LAG_CHECK_INTERVAL: int = int(os.getenv("DB_REPLICA_LAG_CHECK_INTERVAL", "10"))
+
+    # قياس الاستعلامات
+    DB_SLOW_QUERY_MS: float = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+    DB_N_PLUS_ONE_THRESHOLD: int = int(os.getenv("DB_N_PLUS_ONE_THRESHOLD", "3"))
+
+    # الكتابة المؤجلة (الاستخدام / التقييمات / رسائل المساعد)
+    WRITE_BEHIND_ENABLED: bool = os.getenv("WRITE_BEHIND_ENABLED", "true").lower() == "true"
+    WRITE_BEHIND_MAX_ITEMS: int = int(os.getenv("WRITE_BEHIND_MAX_ITEMS", "10000"))  # ثم السجل على القرص
+    WRITE_BEHIND_BATCH_SIZE: int = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "200"))
+    WRITE_BEHIND_FLUSH_INTERVAL: float = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "1.0"))  # ثوانٍ
+    WRITE_BEHIND_JOURNAL_DIR: str = os.getenv("WRITE_BEHIND_JOURNAL_DIR", "data/write_behind")
+    WRITE_BEHIND_REPLAY_INTERVAL: int = int(os.getenv("WRITE_BEHIND_REPLAY_INTERVAL", "30"))
+    WRITE_BEHIND_MAX_ATTEMPTS: int = int(os.getenv("WRITE_BEHIND_MAX_ATTEMPTS", "5"))  # ثم dead-*.jsonl
+
+    # المهام الخلفية (ai_jobs)
+    JOBS_ENABLED: bool = os.getenv("JOBS_ENABLED", "true").lower() == "true"
+    JOB_QUEUES: str = os.getenv("JOB_QUEUES", "default:2,memory:1,ocr:1,ingest:1")  # طابور:عدد العمّال
+    JOB_POLL_INTERVAL: float = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))  # ثوانٍ
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))  # ثم dead
+    JOB_RETRY_BASE_SECONDS: float = float(os.getenv("JOB_RETRY_BASE_SECONDS", "5"))  # يتضاعف مع كل محاولة
+    JOB_STALE_SECONDS: int = int(os.getenv("JOB_STALE_SECONDS", "600"))  # running بلا نبض أقدم من هذا = عامل توقف
+    JOB_HEARTBEAT_SECONDS: int = int(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))  # تمديد locked_at للمهام الجارية (أقل من JOB_STALE_SECONDS)
+    JOB_RETENTION_HOURS: int = int(os.getenv("JOB_RETENTION_HOURS", "24"))  # حذف المهام المنتهية بعدها
+
+    # التحكم في القبول (حد تزامن + طابور محدود لكل فئة نقاط نهاية)
+    ADMISSION_ENABLED: bool = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    ADMISSION_LIMITS: str = os.getenv("ADMISSION_LIMITS", "chat:16:32,upload:4:8,admin:2:4")  # فئة:متزامن:طابور
+    ADMISSION_QUEUE_TIMEOUT: float = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))  # ثوانٍ ثم 503
 
     # التطبيق
     DEBUG: bool = os.getenv("DEBUG", "false").lower() == "true"
@@ -31,6 +83,12 @@ class Settings:
     # الملفات
     UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "uploads")
     MAX_FILE_SIZE: int = int(os.getenv("MAX_FILE_SIZE", str(50 * 1024 * 1024)))  # 50MB
+    EXTRACT_POOL_WORKERS: int = int(os.getenv("EXTRACT_POOL_WORKERS", "2"))  # عمليات الاستخراج (0 = في الخيط)
+    EXTRACT_TIMEOUT_SECONDS: float = float(os.getenv("EXTRACT_TIMEOUT_SECONDS", "60"))  # لكل ملف
+    EXTRACT_MAX_MEMORY_MB: int = int(os.getenv("EXTRACT_MAX_MEMORY_MB", "1024"))  # لكل عملية (0 = بلا حد)
+    EXTRACT_RECYCLE_AFTER: int = int(os.getenv("EXTRACT_RECYCLE_AFTER", "50"))  # مهام قبل تدوير العمليات
+    EXTRACT_START_METHOD: str = os.getenv("EXTRACT_START_METHOD", "spawn")  # spawn / forkserver / fork
+    UPLOAD_CHUNK_SIZE: int = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))  # جزء الكتابة على القرص
     ALLOWED_IMAGE_TYPES: list = ["image/jpeg", "image/png", "image/gif", "image/webp"]
     ALLOWED_DOC_TYPES: list = ["application/pdf", "text/plain",
                                 "application/vnd.openxmlformats-officedocument.wordprocessingml.document"]
@@ -41,6 +99,19 @@ class Settings:
     TOP_K_RESULTS: int = int(os.getenv("TOP_K_RESULTS", "5"))
     MIN_RELEVANCE_SCORE: float = float(os.getenv("MIN_RELEVANCE_SCORE", "0.1"))
 
+    # الدردشة
+    CHAT_DEADLINE_MS: int = int(os.getenv("CHAT_DEADLINE_MS", "8000"))  # مهلة المراحل المتوازية
+    CHAT_SINGLE_FLIGHT: bool = os.getenv("CHAT_SINGLE_FLIGHT", "true").lower() == "true"  # دمج الأسئلة المتطابقة المتزامنة
+    CHAT_BATCH_MAX_QUESTIONS: int = int(os.getenv("CHAT_BATCH_MAX_QUESTIONS", "1000"))
+    CHAT_BATCH_MAX_CONCURRENCY: int = int(os.getenv("CHAT_BATCH_MAX_CONCURRENCY", "8"))
+    CHAT_BATCH_WRITE_SIZE: int = int(os.getenv("CHAT_BATCH_WRITE_SIZE", "100"))  # إجابات لكل وحدة عمل
+
+    # الذاكرة المؤقتة داخل العامل (المحادثات / الذاكرة / آخر الرسائل)
+    CACHE_ENABLED: bool = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+    CACHE_MAX_THREADS: int = int(os.getenv("CACHE_MAX_THREADS", "1000"))  # محادثات لكل نوع
+    CACHE_TTL_SECONDS: float = float(os.getenv("CACHE_TTL_SECONDS", "60"))  # حد القِدم بين العمّال
+    CACHE_RECENT_MESSAGES: int = int(os.getenv("CACHE_RECENT_MESSAGES", "20"))  # حجم الحلقة
+
     # الذاكرة
     MAX_MEMORY_MESSAGES: int = int(os.getenv("MAX_MEMORY_MESSAGES", "20"))
     MEMORY_SUMMARY_THRESHOLD: int = int(os.getenv("MEMORY_SUMMARY_THRESHOLD", "10"))
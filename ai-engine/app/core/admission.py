@@ -0,0 +1,229 @@
+# app/core/admission.py
+"""
+التحكم في القبول (Admission Control) - حد تزامن لكل فئة من نقاط النهاية
+
+كل فئة (chat / upload / admin) لها عدد طلبات متزامنة وطابور انتظار محدود:
+- مكان شاغر: يُنفَّذ الطلب فوراً
+- الطابور ممتلئ: 429 فوراً مع Retry-After
+- انتظر في الطابور أكثر من ADMISSION_QUEUE_TIMEOUT: 503 مع Retry-After
+
+الهدف أن يتراجع الأداء تحت الضغط بشكل متوقع بدلاً من تكدس خيوط AnyIO
+وامتلاء تجمع الاتصالات
+"""
+import re
+import math
+import time
+import asyncio
+from collections import deque
+from fastapi.responses import JSONResponse
+from app.config import settings
+from app.core.logging_config import logger
+
+# (الفئة، طرق HTTP، نمط نهاية المسار) - أول تطابق يفوز؛ غير المطابق لا يُحد
+# /health و /health/admission خارج الحد حتى تبقى مرئية تحت الضغط
+ENDPOINT_CLASSES = [
+    ("upload", {"POST"}, re.compile(r"/chat/with-image$")),
+    ("upload", {"POST"}, re.compile(r"/files/upload$")),
+    ("upload", {"POST"}, re.compile(r"/knowledge-bases/[^/]+/documents$")),
+    ("chat", {"POST"}, re.compile(r"/chat(/json|/batch)?$")),
+    ("admin", {"GET"}, re.compile(r"/health/(?!admission$)[^/]+$|/test-db$")),
+    ("admin", {"POST"}, re.compile(r"/knowledge-bases$")),
+    ("admin", {"DELETE"}, re.compile(r"/threads/[^/]+$")),
+]
+
+
+class AdmissionRejected(Exception):
+    """رفض الطلب: 429 (الطابور ممتلئ) أو 503 (انتهت مهلة الانتظار)"""
+
+    def __init__(self, gate: str, status_code: int, retry_after: int, detail: str):
+        super().__init__(detail)
+        self.gate = gate
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.detail = detail
+
+
+def parse_limits(spec: str) -> dict:
+    """
+    "chat:16:32,upload:4:8" -> {"chat": (16, 32), "upload": (4, 8)}
+
+    مدخل غير صالح يُسجَّل ويُتجاهل (فئته بلا حد) بدلاً من إيقاف التطبيق عند الاستيراد
+    """
+    limits = {}
+    for entry in (spec or "").split(","):
+        name, _, rest = entry.strip().partition(":")
+        if not name:
+            continue
+        concurrency, _, queue = rest.partition(":")
+        try:
+            limits[name] = (max(int(concurrency or 1), 1), max(int(queue or 0), 0))
+        except ValueError:
+            logger.error(f"❌ ADMISSION_LIMITS: مدخل غير صالح '{entry.strip()}' - الفئة {name} بلا حد")
+    return limits
+
+
+class AdmissionGate:
+    """
+    حد تزامن + طابور انتظار FIFO لفئة واحدة
+
+    يعمل داخل حلقة الأحداث (middleware غير متزامن) فلا يحتاج أقفالاً؛
+    عند التحرير يُسلَّم المكان مباشرة لأقدم منتظر
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int, timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self._waiters = deque()
+        self._avg_service = None  # متوسط متحرك لزمن الخدمة (ثوانٍ)
+        self._stats = {"admitted": 0, "waited": 0, "rejected_full": 0, "rejected_timeout": 0}
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """تقدير الثواني حتى يتوفر مكان: (المنتظرون + 1) / الحد × متوسط زمن الخدمة"""
+        service = self._avg_service or 1.0
+        estimate = math.ceil(service * (len(self._waiters) + 1) / self.limit)
+        return min(max(estimate, 1), 60)
+
+    async def acquire(self):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self._stats["admitted"] += 1
+            return
+
+        if len(self._waiters) >= self.queue_size:
+            self._stats["rejected_full"] += 1
+            raise AdmissionRejected(
+                self.name, 429, self.retry_after(), "طلبات كثيرة، حاول مرة أخرى لاحقاً"
+            )
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._stats["waited"] += 1
+        try:
+            await asyncio.wait_for(waiter, self.timeout)
+        except asyncio.TimeoutError:
+            self._discard(waiter)
+            self._stats["rejected_timeout"] += 1
+            raise AdmissionRejected(
+                self.name, 503, self.retry_after(), "الخادم مشغول، حاول مرة أخرى"
+            )
+        except asyncio.CancelledError:
+            # العميل قطع الاتصال: إن كان المكان قد سُلِّم له نعيده
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self._discard(waiter)
+            raise
+        self._stats["admitted"] += 1
+
+    def release(self, service_seconds: float = None):
+        if service_seconds is not None:
+            if self._avg_service is None:
+                self._avg_service = service_seconds
+            else:
+                self._avg_service = 0.8 * self._avg_service + 0.2 * service_seconds
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # تسليم المكان مباشرة (active لا يتغير)
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def _discard(self, waiter):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def status(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": self.queued,
+            "queue_size": self.queue_size,
+            "avg_service_ms": round(self._avg_service * 1000, 1) if self._avg_service else None,
+            **self._stats,
+        }
+
+
+class AdmissionController:
+    """بوابات القبول لكل الفئات + تصنيف الطلبات"""
+
+    def __init__(self, limits: dict = None, timeout: float = None):
+        limits = limits if limits is not None else parse_limits(settings.ADMISSION_LIMITS)
+        timeout = timeout if timeout is not None else settings.ADMISSION_QUEUE_TIMEOUT
+        self.gates = {
+            name: AdmissionGate(name, limit, queue_size, timeout)
+            for name, (limit, queue_size) in limits.items()
+        }
+
+    def gate_for(self, method: str, path: str):
+        """البوابة المناسبة للطلب أو None (غير محدود)"""
+        for name, methods, pattern in ENDPOINT_CLASSES:
+            if method in methods and pattern.search(path):
+                return self.gates.get(name)
+        return None
+
+    def status(self) -> dict:
+        return {
+            "enabled": settings.ADMISSION_ENABLED,
+            "gates": {name: gate.status() for name, gate in self.gates.items()},
+        }
+
+
+# Singleton instance
+admission = AdmissionController()
+
+
+class AdmissionMiddleware:
+    """
+    middleware القبول (ASGI مباشر): app.add_middleware(AdmissionMiddleware)
+
+    المكان يُحرَّر في finally حول تنفيذ التطبيق كاملاً - بعد آخر جزء من الجسم
+    (الردود المتدفقة تشغل المكان حتى آخر حدث)، وأيضاً عند خطأ أو قطع العميل
+    للاتصال قبل بدء الإرسال
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        gate = None
+        if scope["type"] == "http" and settings.ADMISSION_ENABLED:
+            gate = admission.gate_for(scope["method"], scope["path"])
+        if gate is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await gate.acquire()
+        except AdmissionRejected as e:
+            logger.warning(
+                f"🚦 رفض طلب {scope['method']} {scope['path']} ({e.gate}): {e.status_code} "
+                f"- نشط {gate.active}/{gate.limit}، منتظر {gate.queued}/{gate.queue_size}"
+            )
+            response = JSONResponse(
+                status_code=e.status_code,
+                content={
+                    "status": "error",
+                    "detail": e.detail,
+                    "gate": e.gate,
+                    "queue": {"active": gate.active, "queued": gate.queued},
+                },
+                headers={"Retry-After": str(e.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release(time.monotonic() - started)
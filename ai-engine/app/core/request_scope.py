@@ -0,0 +1,46 @@
+# app/core/request_scope.py
+"""
+نطاق قاعدة البيانات لكل طلب - توجيه القراءة/الكتابة (read-your-writes) + عدّاد الاستعلامات (N+1)
+
+middleware ASGI مباشر وليس BaseHTTPMiddleware: هناك يُغلق العدّاد عند عودة call_next،
+أي قبل تشغيل جسم StreamingResponse، فلا تُحسب استعلامات /chat/stream و /chat/batch
+"""
+from starlette.datastructures import MutableHeaders
+from app.db.routing import begin_request, end_request
+from app.db import instrumentation
+
+
+class DBRequestScopeMiddleware:
+    """
+    middleware نطاق الطلب: app.add_middleware(DBRequestScopeMiddleware)
+
+    - X-DB-Queries / X-DB-Time-Ms: ما نُفِّذ حتى إرسال الترويسات. للرد العادي هذا كل
+      الطلب؛ للردود المتدفقة تُرسل الترويسات قبل الجسم فلا تشمل استعلامات ما بعدها
+    - النطاق يُغلق بعد آخر جزء من الجسم: كشف N+1 يرى كل استعلامات الطلب بما فيها المتدفقة
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = begin_request()
+        counter_token = instrumentation.begin_request()
+
+        async def send_with_counts(message):
+            if message["type"] == "http.response.start":
+                summary = instrumentation.current_request()
+                if summary:
+                    headers = MutableHeaders(scope=message)
+                    headers["X-DB-Queries"] = str(summary["queries"])
+                    headers["X-DB-Time-Ms"] = str(summary["db_ms"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_counts)
+        finally:
+            instrumentation.end_request(counter_token, scope["path"])
+            end_request(token)
@@ -1,3 +1,6 @@
 # app/db/__init__.py
-from app.db.base import init_pool, get_pool_connection, close_pool
-from app.db.session import get_db, execute_query, execute_many
+from app.db.base import init_pool, get_pool_connection, close_pool, pool_stats
+from app.db.pool import ConnectionPool, PoolTimeoutError
+from app.db.session import get_db, execute_query, execute_many, stream_query
+from app.db.unit_of_work import UnitOfWork
+from app.db.write_behind import write_behind, deferred
@@ -1,66 +1,272 @@
 # app/db/base.py
 """
 قاعدة البيانات - إدارة تجمع الاتصالات (Connection Pool)
+تجمع للكتابة (الرئيسي) + تجمعات للقراءة (النسخ المتماثلة)
 """
-import mysql.connector
-from mysql.connector import pooling, Error
+import time
+import threading
+from mysql.connector import Error
 from app.config import settings
+from app.db.pool import ConnectionPool, PoolTimeoutError
+from mysql.connector.errors import PoolError
+from app.db.sqlite_backend import SQLitePool, is_sqlite
+from app.db.routing import use_primary
 from app.core.logging_config import logger
 
 _pool = None
 
+# النسخ المتماثلة: [{"host", "port", "pool", "lag", "healthy", "checked_at", "checking"}]
+_replicas = []
+_replicas_ready = False
+_replica_lock = threading.Lock()
+_rr_counter = 0
+
+
+def _parse_host(entry: str) -> tuple:
+    """host[:port] -> (host, port)"""
+    host, _, port = entry.strip().partition(":")
+    return host, int(port) if port else 3306
+
+
+def _make_pool(name: str, size: int, host: str, port: int = 3306):
+    if is_sqlite():
+        return SQLitePool(
+            name=name,
+            size=size,
+            path=settings.SQLITE_PATH,
+            max_overflow=settings.DB_POOL_MAX_OVERFLOW,
+            timeout=settings.DB_POOL_TIMEOUT,
+            recycle=settings.DB_POOL_RECYCLE,
+            ping_after=settings.DB_POOL_PRE_PING_AFTER,
+        )
+    return ConnectionPool(
+        name=name,
+        size=size,
+        max_overflow=settings.DB_POOL_MAX_OVERFLOW,
+        timeout=settings.DB_POOL_TIMEOUT,
+        recycle=settings.DB_POOL_RECYCLE,
+        ping_after=settings.DB_POOL_PRE_PING_AFTER,
+        # إعادة ضبط الجلسة تحذف العبارات المحضّرة على الخادم
+        reset_session=not settings.DB_PREPARED_STATEMENTS,
+        host=host,
+        port=port,
+        user=settings.DB_USER,
+        password=settings.DB_PASS,
+        database=settings.DB_NAME,
+        charset=settings.DB_CHARSET,
+        collation="utf8mb4_unicode_ci",
+        autocommit=False,
+    )
+
 
 def init_pool():
-    """إنشاء تجمع اتصالات"""
+    """إنشاء تجمع اتصالات (MySQL أو SQLite حسب DB_BACKEND)"""
     global _pool
+    _pool = _make_pool("ai_engine_pool", settings.DB_POOL_SIZE, settings.DB_HOST)
+    init_read_pools()
     try:
-        _pool = pooling.MySQLConnectionPool(
-            pool_name="ai_engine_pool",
-            pool_size=settings.DB_POOL_SIZE,
-            pool_reset_session=True,
-            host=settings.DB_HOST,
-            user=settings.DB_USER,
-            password=settings.DB_PASS,
-            database=settings.DB_NAME,
-            charset=settings.DB_CHARSET,
-            collation="utf8mb4_unicode_ci",
-            autocommit=False,
+        # التحقق من الاتصال مبكراً (التجمع ينشئ اتصالاته عند الطلب)
+        _pool.get_connection().close()
+        logger.info(
+            f"✅ تم إنشاء تجمع الاتصالات بنجاح ({settings.DB_POOL_SIZE} اتصالات "
+            f"+ {settings.DB_POOL_MAX_OVERFLOW} إضافية)"
         )
-        logger.info(f"✅ تم إنشاء تجمع الاتصالات بنجاح ({settings.DB_POOL_SIZE} اتصالات)")
         return True
     except Error as e:
         logger.error(f"❌ فشل إنشاء تجمع الاتصالات: {e}")
         return False
 
 
+def init_read_pools():
+    """إنشاء تجمعات القراءة للنسخ المتماثلة (DB_REPLICA_HOSTS)"""
+    global _replicas, _replicas_ready
+    _replicas_ready = True
+    if is_sqlite():
+        # ملف محلي واحد: لا نسخ متماثلة
+        return False
+    replicas = []
+    for idx, entry in enumerate(h for h in settings.DB_REPLICA_HOSTS.split(",") if h.strip()):
+        host, port = _parse_host(entry)
+        try:
+            pool = _make_pool(f"ai_engine_read_{idx}", settings.DB_REPLICA_POOL_SIZE, host, port)
+            replicas.append({
+                "host": host, "port": port, "pool": pool,
+                "lag": None, "healthy": True, "checked_at": 0.0, "checking": False,
+            })
+            logger.info(f"✅ تجمع قراءة: {host}:{port} ({settings.DB_REPLICA_POOL_SIZE} اتصالات)")
+        except Error as e:
+            logger.error(f"❌ فشل إنشاء تجمع القراءة {host}:{port}: {e}")
+    _replicas = replicas
+    return bool(replicas)
+
+
 def get_pool_connection():
-    """الحصول على اتصال من التجمع"""
-    global _pool
+    """
+    الحصول على اتصال من التجمع
+
+    عند امتلاء التجمع (size + overflow) ينتظر حتى DB_POOL_TIMEOUT
+    ثم يرفع PoolTimeoutError بدلاً من فتح اتصالات مباشرة إضافية
+    """
     if _pool is None:
         init_pool()
     try:
-        conn = _pool.get_connection()
-        return conn
+        return _pool.get_connection()
+    except PoolTimeoutError:
+        logger.error("❌ التجمع ممتلئ - انتهت مهلة الانتظار")
+        raise
     except Error as e:
         logger.error(f"❌ فشل الحصول على اتصال من التجمع: {e}")
-        # fallback إلى اتصال مباشر
+        return None
+
+
+def _measure_lag(conn):
+    """تأخر النسخة المتماثلة بالثواني (None = غير معروف / التكرار متوقف)"""
+    cursor = conn.cursor(dictionary=True)
+    try:
         try:
-            conn = mysql.connector.connect(
-                host=settings.DB_HOST,
-                user=settings.DB_USER,
-                password=settings.DB_PASS,
-                database=settings.DB_NAME,
-                charset=settings.DB_CHARSET,
-            )
-            return conn
-        except Error as e2:
-            logger.error(f"❌ فشل الاتصال المباشر أيضاً: {e2}")
-            return None
+            cursor.execute("SHOW REPLICA STATUS")
+        except Error:
+            # MySQL < 8.0.22
+            cursor.execute("SHOW SLAVE STATUS")
+        row = cursor.fetchone()
+        cursor.fetchall()
+    finally:
+        cursor.close()
+    if not row:
+        return None
+    lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+    return int(lag) if lag is not None else None
+
+
+def _check_replica(replica: dict):
+    """
+    تحديث حالة نسخة متماثلة (التأخر + الاتصال)
+
+    تجمع القراءة الممتلئ يعني نسخة مشغولة لا معطلة: الحالة السابقة تبقى كما هي
+    """
+    replica["checked_at"] = time.time()
+    try:
+        conn = replica["pool"].get_connection()
+    except PoolError as e:
+        logger.debug(f"⏳ تجمع القراءة {replica['host']} مشغول - تأجيل فحص التأخر: {e}")
+        return
+    except Error as e:
+        replica["healthy"] = False
+        replica["error"] = str(e)
+        return
+    try:
+        lag = _measure_lag(conn)
+        replica["lag"] = lag
+        replica["healthy"] = lag is not None and lag <= settings.DB_REPLICA_MAX_LAG
+        replica.pop("error", None)
+    except Error as e:
+        replica["healthy"] = False
+        replica["error"] = str(e)
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def _refresh_replica(replica: dict, force: bool = False):
+    """
+    فحص التأخر إذا حان موعده - خارج _replica_lock (رحلة شبكة)
+
+    علم checking يمنع أكثر من خيط من فحص نفس النسخة في الوقت نفسه؛
+    الباقون يستخدمون الحالة الحالية
+    """
+    with _replica_lock:
+        due = force or time.time() - replica["checked_at"] > settings.DB_REPLICA_LAG_CHECK_INTERVAL
+        if not due or replica["checking"]:
+            return
+        replica["checking"] = True
+    try:
+        _check_replica(replica)
+    finally:
+        replica["checking"] = False
+
+
+def _ensure_replicas():
+    """تهيئة تجمعات القراءة عند أول استخدام (إذا لم يمر التطبيق بـ init_pool)"""
+    if not _replicas_ready and settings.DB_REPLICA_HOSTS:
+        with _replica_lock:
+            if not _replicas_ready:
+                init_read_pools()
+
+
+def replica_status(refresh: bool = False) -> list:
+    """حالة النسخ المتماثلة (لنقطة الصحة)"""
+    _ensure_replicas()
+    for replica in _replicas:
+        _refresh_replica(replica, force=refresh)
+    return [
+        {
+            "host": f"{r['host']}:{r['port']}",
+            "lag_seconds": r["lag"],
+            "healthy": r["healthy"],
+            **({"error": r["error"]} if r.get("error") else {}),
+        }
+        for r in _replicas
+    ]
+
+
+def _pick_replica():
+    """اختيار نسخة سليمة بالتناوب (round-robin)، مع فحص التأخر الدوري"""
+    global _rr_counter
+    _ensure_replicas()
+    if not _replicas:
+        return None
+    for replica in _replicas:
+        _refresh_replica(replica)
+    healthy = [r for r in _replicas if r["healthy"]]
+    if not healthy:
+        return None
+    with _replica_lock:
+        _rr_counter += 1
+        return healthy[_rr_counter % len(healthy)]
+
+
+def get_read_connection():
+    """
+    اتصال للقراءة فقط
+
+    يذهب للرئيسي إذا: لا نسخ متماثلة، أو الطلب كتب سابقاً (read-your-writes)،
+    أو كل النسخ متأخرة أكثر من DB_REPLICA_MAX_LAG
+    """
+    if _pool is None:
+        init_pool()
+    if use_primary():
+        return get_pool_connection()
+    replica = _pick_replica()
+    if replica is None:
+        return get_pool_connection()
+    try:
+        return replica["pool"].get_connection()
+    except Error as e:
+        logger.warning(f"⚠️ تجمع القراءة {replica['host']} غير متاح، التحويل للرئيسي: {e}")
+        return get_pool_connection()
 
 
 def close_pool():
     """إغلاق تجمع الاتصالات"""
-    global _pool
-    # mysql-connector-python لا يحتوي على close() للـ pool
+    global _pool, _replicas, _replicas_ready
+    if _pool is not None:
+        _pool.dispose()
+    for replica in _replicas:
+        replica["pool"].dispose()
     _pool = None
+    _replicas = []
+    _replicas_ready = False
     logger.info("🔒 تم إغلاق تجمع الاتصالات")
+
+
+def pool_stats() -> dict:
+    """عدادات تجمع الكتابة وتجمعات القراءة"""
+    return {
+        "primary": _pool.status() if _pool is not None else None,
+        "replicas": [
+            {**r["pool"].status(), "lag_seconds": r["lag"], "healthy": r["healthy"]}
+            for r in _replicas
+        ],
+    }
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+bench_ids.py
+مقارنة سرعة الإدراج وحجم الجدول: uuid4 نصي / UUIDv7 نصي / UUIDv7 BINARY(16)
+
+التشغيل:
+    python -m app.db.bench_ids [عدد_الصفوف]
+
+ينشئ جداول مؤقتة (bench_ids_*) ويحذفها في النهاية.
+"""
+import sys
+import time
+import uuid
+import mysql.connector
+from mysql.connector import Error
+from app.config import settings
+from app.db.ids import uuid7
+
+BATCH = 500
+
+VARIANTS = [
+    ("uuid4 CHAR(36)", "CHAR(36)", lambda: str(uuid.uuid4())),
+    ("uuid7 CHAR(36)", "CHAR(36)", lambda: str(uuid7())),
+    ("uuid7 BINARY(16)", "BINARY(16)", lambda: uuid7().bytes),
+]
+
+
+def print_section(title):
+    """طباعة عنوان قسم"""
+    print("\n" + "=" * 60)
+    print(f"  {title}")
+    print("=" * 60)
+
+
+def connect():
+    """اتصال مباشر بنفس إعدادات التطبيق"""
+    return mysql.connector.connect(
+        host=settings.DB_HOST,
+        user=settings.DB_USER,
+        password=settings.DB_PASS,
+        database=settings.DB_NAME,
+        charset=settings.DB_CHARSET,
+    )
+
+
+def run_variant(conn, table: str, id_type: str, make_id, rows: int) -> dict:
+    """إدراج rows صف بدفعات وقياس الزمن والحجم"""
+    cursor = conn.cursor()
+    cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    cursor.execute(
+        f"""CREATE TABLE {table} (
+                id {id_type} NOT NULL PRIMARY KEY,
+                thread_id {id_type} NOT NULL,
+                content TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                KEY idx_thread (thread_id)
+            ) ENGINE=InnoDB"""
+    )
+    thread_id = make_id()
+    query = f"INSERT INTO {table} (id, thread_id, content) VALUES (%s, %s, %s)"
+
+    started = time.perf_counter()
+    for offset in range(0, rows, BATCH):
+        batch = [(make_id(), thread_id, "نص رسالة تجريبية") for _ in range(min(BATCH, rows - offset))]
+        cursor.executemany(query, batch)
+        conn.commit()
+    elapsed = time.perf_counter() - started
+
+    cursor.execute(f"ANALYZE TABLE {table}")
+    cursor.fetchall()
+    cursor.execute(
+        "SELECT DATA_LENGTH, INDEX_LENGTH FROM information_schema.tables "
+        "WHERE table_schema = DATABASE() AND table_name = %s",
+        (table,)
+    )
+    data_length, index_length = cursor.fetchone()
+    cursor.execute(f"DROP TABLE {table}")
+    cursor.close()
+    return {
+        "rows_per_sec": rows / elapsed if elapsed else 0,
+        "seconds": elapsed,
+        "data_kb": data_length / 1024,
+        "index_kb": index_length / 1024,
+    }
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    print_section(f"⏱️ إدراج {rows} صف لكل نوع معرف (دفعات {BATCH})")
+    try:
+        conn = connect()
+    except Error as e:
+        print(f"❌ خطأ في الاتصال: {e}")
+        return 1
+
+    try:
+        for idx, (label, id_type, make_id) in enumerate(VARIANTS):
+            result = run_variant(conn, f"bench_ids_{idx}", id_type, make_id, rows)
+            print(
+                f"   📌 {label:<18} {result['rows_per_sec']:>9.0f} صف/ث  "
+                f"({result['seconds']:.2f}s)  بيانات {result['data_kb']:.0f}KB  "
+                f"فهارس {result['index_kb']:.0f}KB"
+            )
+    except Error as e:
+        print(f"❌ خطأ أثناء القياس: {e}")
+        return 1
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+bench_prepared.py
+مقارنة العبارات المحضّرة مع المسار النصي الحالي (زمن الاستجابة + عبء التحليل)
+
+التشغيل:
+    python -m app.db.bench_prepared [عدد_التكرارات]
+"""
+import sys
+import time
+import statistics
+import mysql.connector
+from mysql.connector import Error
+from app.config import settings
+
+# الاستعلامات الساخنة في مسار الدردشة (قراءة فقط حتى لا يتلوث الجدول)
+HOT_QUERIES = [
+    ("جلب محادثة", "SELECT * FROM ai_threads WHERE id = %s"),
+    ("جلب الذاكرة", "SELECT * FROM ai_thread_memory WHERE thread_id = %s"),
+    ("آخر الرسائل",
+     "SELECT * FROM ai_messages WHERE thread_id = %s ORDER BY created_at DESC LIMIT 10"),
+]
+
+
+def print_section(title):
+    """طباعة عنوان قسم"""
+    print("\n" + "=" * 60)
+    print(f"  {title}")
+    print("=" * 60)
+
+
+def connect():
+    """اتصال مباشر بنفس إعدادات التطبيق"""
+    return mysql.connector.connect(
+        host=settings.DB_HOST,
+        user=settings.DB_USER,
+        password=settings.DB_PASS,
+        database=settings.DB_NAME,
+        charset=settings.DB_CHARSET,
+    )
+
+
+def session_status(conn) -> dict:
+    """عدادات الخادم للجلسة الحالية"""
+    cursor = conn.cursor()
+    cursor.execute(
+        "SHOW SESSION STATUS WHERE Variable_name IN "
+        "('Questions', 'Com_stmt_prepare', 'Com_stmt_execute', 'Com_select')"
+    )
+    status = {name: int(value) for name, value in cursor.fetchall()}
+    cursor.close()
+    return status
+
+
+def sample_thread_id(conn) -> str:
+    """معرف محادثة حقيقي لاستخدامه كمعامل"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM ai_threads LIMIT 1")
+    row = cursor.fetchone()
+    cursor.close()
+    return row[0] if row else "00000000-0000-0000-0000-000000000000"
+
+
+def run_text(conn, query: str, param: str, iterations: int) -> list:
+    """المسار الحالي: cursor جديد ونص كامل في كل مرة"""
+    timings = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(query, (param,))
+        cursor.fetchall()
+        cursor.close()
+        timings.append((time.perf_counter() - t0) * 1000)
+    return timings
+
+
+def run_prepared(conn, query: str, param: str, iterations: int) -> list:
+    """العبارة المحضّرة: تحضير مرة واحدة ثم تنفيذ ثنائي"""
+    timings = []
+    cursor = conn.cursor(prepared=True, dictionary=True)
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        cursor.execute(query, (param,))
+        cursor.fetchall()
+        timings.append((time.perf_counter() - t0) * 1000)
+    cursor.close()
+    return timings
+
+
+def describe(timings: list) -> str:
+    """ملخص إحصائي"""
+    ordered = sorted(timings)
+    p95 = ordered[int(len(ordered) * 0.95) - 1] if len(ordered) > 1 else ordered[0]
+    return (f"متوسط {statistics.mean(ordered):.3f}ms | "
+            f"p50 {statistics.median(ordered):.3f}ms | p95 {p95:.3f}ms")
+
+
+def main():
+    """الدالة الرئيسية"""
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    if not all([settings.DB_USER, settings.DB_NAME]):
+        print("❌ متغيرات البيئة غير مكتملة (DB_USER / DB_NAME)")
+        return
+
+    try:
+        conn = connect()
+    except Error as e:
+        print(f"❌ خطأ في الاتصال: {e}")
+        return
+
+    thread_id = sample_thread_id(conn)
+    print_section(f"📊 {iterations} تكرار لكل استعلام")
+
+    for label, query in HOT_QUERIES:
+        print(f"\n🔍 {label}")
+
+        before = session_status(conn)
+        text_timings = run_text(conn, query, thread_id, iterations)
+        after_text = session_status(conn)
+        prep_timings = run_prepared(conn, query, thread_id, iterations)
+        after_prep = session_status(conn)
+
+        prep_prepares = after_prep["Com_stmt_prepare"] - after_text["Com_stmt_prepare"]
+        prep_executes = after_prep["Com_stmt_execute"] - after_text["Com_stmt_execute"]
+        text_parses = after_text["Com_select"] - before["Com_select"]
+
+        print(f"   نصي:    {describe(text_timings)}")
+        print(f"           تحليل SQL على الخادم: {text_parses} مرة")
+        print(f"   محضّر:  {describe(prep_timings)}")
+        print(f"           تحضير: {prep_prepares} مرة | تنفيذ ثنائي: {prep_executes} مرة")
+
+        speedup = statistics.mean(text_timings) / max(statistics.mean(prep_timings), 1e-9)
+        print(f"   ⚡ التسريع: {speedup:.2f}x")
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+# app/db/cache.py
+"""
+ذاكرة مؤقتة داخل العملية (لكل عامل) - صفوف المحادثات، الذاكرة، آخر الرسائل
+
+- LRU محدود الحجم مع عمر أقصى (CACHE_TTL_SECONDS) لكل عنصر
+- المستودعات تحدّثها عند الكتابة (write-through) بعد تأكيد المعاملة
+- آخر رسائل كل محادثة في حلقة (ring buffer) لا تُبنى إلا من قراءة كاملة
+  أو من محادثة أُنشئت في هذا العامل، فلا تُعاد قائمة ناقصة
+
+العمر الأقصى يحدّ من قِدم البيانات عندما يكتب عامل آخر نفس المحادثة
+"""
+import copy
+import time
+import threading
+from collections import OrderedDict, deque
+from app.config import settings
+
+_MISS = object()
+
+
+def on_commit(uow, fn):
+    """
+    تنفيذ fn بعد تأكيد الكتابة
+
+    UnitOfWork: بعد commit (لا شيء عند التراجع)؛ بدون وحدة عمل أو مع
+    الكتابة المؤجلة (تُكتب حتماً): فوراً
+    """
+    hook = getattr(uow, "after_commit", None)
+    if hook is None:
+        fn()
+    else:
+        hook(fn)
+
+
+class LRUCache:
+    """قاموس LRU آمن للخيوط مع عمر أقصى - القيم تُنسخ عند الإرجاع"""
+
+    def __init__(self, name: str, max_items: int, ttl: float):
+        self.name = name
+        self.max_items = max_items
+        self.ttl = ttl
+        self._items = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    def get(self, key, default=None):
+        """القيمة المخزنة (نسخة) أو default"""
+        value = self.peek(key)
+        return default if value is _MISS else copy.deepcopy(value)
+
+    def peek(self, key):
+        """القيمة المخزنة نفسها (بدون نسخ) أو _MISS"""
+        if not settings.CACHE_ENABLED:
+            return _MISS
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return _MISS
+            if entry[1] < time.monotonic():
+                del self._items[key]
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return _MISS
+            self._items.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def set(self, key, value):
+        if not settings.CACHE_ENABLED:
+            return
+        with self._lock:
+            self._items[key] = (value, time.monotonic() + self.ttl)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def pop(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def status(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                "name": self.name,
+                "size": len(self._items),
+                "max_items": self.max_items,
+                "ttl": self.ttl,
+                "hit_ratio": round(self._stats["hits"] / lookups, 3) if lookups else None,
+                **self._stats,
+            }
+
+
+class MessageRing:
+    """آخر CACHE_RECENT_MESSAGES رسالة لكل محادثة (الأقدم أولاً)"""
+
+    def __init__(self, max_threads: int, size: int, ttl: float):
+        self.size = size
+        self.ttl = ttl
+        self._threads = LRUCache("recent_messages", max_threads, ttl)
+        self._lock = threading.Lock()
+        # رسائل في طابور الكتابة المؤجلة لم تصل القاعدة بعد: message_id -> (thread_id, row, expires_at)
+        self._pending = OrderedDict()
+
+    def seed(self, thread_id: str, messages: list):
+        """بناء الحلقة من قراءة كاملة (الأقدم أولاً، حتى size رسالة)"""
+        self._threads.set(thread_id, deque(messages[-self.size:], maxlen=self.size))
+
+    def append(self, thread_id: str, message: dict):
+        """إضافة رسالة لحلقة موجودة (لا تُنشأ حلقة ناقصة)"""
+        ring = self._threads.peek(thread_id)
+        if ring is not _MISS:
+            with self._lock:
+                ring.append(message)
+
+    def hold(self, thread_id: str, message: dict):
+        """
+        تسجيل رسالة كُتبت مؤجلاً - تُدمج في أي حلقة تُبنى من القاعدة قبل وصولها
+
+        تُنسى عند ظهورها في قراءة من القاعدة أو بعد العمر الأقصى
+        """
+        now = time.monotonic()
+        with self._lock:
+            while self._pending:
+                oldest = next(iter(self._pending.values()))
+                if oldest[2] >= now:
+                    break
+                self._pending.popitem(last=False)
+            self._pending[message["id"]] = (thread_id, message, now + self.ttl)
+
+    def with_pending(self, thread_id: str, rows: list) -> list:
+        """rows من القاعدة (الأقدم أولاً) + رسائل المحادثة المؤجلة التي لم تُكتب بعد"""
+        now = time.monotonic()
+        stored = {r.get("id") for r in rows}
+        with self._lock:
+            held = [
+                (message_id, entry) for message_id, entry in self._pending.items()
+                if entry[0] == thread_id
+            ]
+            for message_id, entry in held:
+                if message_id in stored or entry[2] < now:
+                    del self._pending[message_id]
+        # المؤجلة أحدث من المكتوبة (رسالة المساعد تُسجَّل بعد commit رسالة المستخدم)
+        return rows + [
+            copy.deepcopy(entry[1]) for message_id, entry in held
+            if message_id not in stored and entry[2] >= now
+        ]
+
+    def recent(self, thread_id: str, limit: int):
+        """آخر limit رسالة (الأحدث أولاً) أو None إذا لم تكن الحلقة كافية"""
+        if limit > self.size:
+            return None
+        ring = self._threads.peek(thread_id)
+        if ring is _MISS:
+            return None
+        with self._lock:
+            messages = list(ring)[-limit:] if limit else []
+        messages.reverse()
+        return copy.deepcopy(messages)
+
+    def pop(self, thread_id: str):
+        self._threads.pop(thread_id)
+
+    def clear(self):
+        self._threads.clear()
+        with self._lock:
+            self._pending.clear()
+
+    def status(self) -> dict:
+        with self._lock:
+            pending = len(self._pending)
+        return {**self._threads.status(), "ring_size": self.size, "pending_deferred": pending}
+
+
+thread_cache = LRUCache("threads", settings.CACHE_MAX_THREADS, settings.CACHE_TTL_SECONDS)
+memory_cache = LRUCache("memory", settings.CACHE_MAX_THREADS, settings.CACHE_TTL_SECONDS)
+message_ring = MessageRing(
+    settings.CACHE_MAX_THREADS, settings.CACHE_RECENT_MESSAGES, settings.CACHE_TTL_SECONDS
+)
+
+
+def forget_thread(thread_id: str):
+    """إزالة كل ما يخص المحادثة (بعد الحذف)"""
+    thread_cache.pop(thread_id)
+    memory_cache.pop(thread_id)
+    message_ring.pop(thread_id)
+
+
+def cache_status() -> dict:
+    """عدادات الذاكرة المؤقتة (لنقطة الصحة)"""
+    return {
+        "enabled": settings.CACHE_ENABLED,
+        "threads": thread_cache.status(),
+        "memory": memory_cache.status(),
+        "recent_messages": message_ring.status(),
+    }
@@ -0,0 +1,111 @@
+# app/db/ids.py
+"""
+المعرفات - UUIDv7 مرتبة زمنياً، وتحويلها لتخزين BINARY(16)
+
+المفتاح الأساسي في InnoDB هو الفهرس العنقودي: المعرفات العشوائية (uuid4)
+تُدرج في صفحات عشوائية (انقسام صفحات + buffer pool منتفخ)، بينما UUIDv7
+يبدأ بالطابع الزمني فتُضاف الصفوف الجديدة دائماً في آخر الفهرس.
+
+DB_BINARY_IDS=true بعد ترحيل 0003: المعرفات تُخزَّن 16 بايت بدلاً من 36 حرفاً.
+الواجهة تبقى نصية في الحالتين - db_id() للمعاملات و decode_rows() للنتائج.
+"""
+import time
+import uuid
+import secrets
+import threading
+from app.config import settings
+
+# الجدول -> أعمدة المعرفات التي يحوّلها ترحيل 0003 إلى BINARY(16)
+# (المفتاح الأساسي + المفاتيح الأجنبية التي تشير إليه)
+BINARY_ID_COLUMNS = {
+    "ai_threads": ["id"],
+    "ai_messages": ["id", "thread_id"],
+    "ai_document_chunks": ["id"],
+    "ai_files": ["id"],
+    "ai_feedback": ["id", "message_id"],
+    "ai_thread_memory": ["thread_id"],
+    "ai_usage_logs": ["thread_id"],
+    "ai_message_files": ["message_id", "file_id"],
+    "ai_vision_analyses": ["file_id", "message_id"],
+    "ai_documents": ["file_id"],
+}
+
+# أسماء الأعمدة التي تُفك في نتائج الاستعلامات؛ last_message_id (ترحيل 0005) بنوع ai_messages.id
+ID_COLUMN_NAMES = frozenset(
+    column for columns in BINARY_ID_COLUMNS.values() for column in columns
+) | {"last_message_id"}
+
+_lock = threading.Lock()
+_last_ms = 0
+_seq = 0
+
+
+def uuid7() -> uuid.UUID:
+    """
+    UUIDv7 (RFC 9562): 48 بت ميلي ثانية + 12 بت تسلسل + 62 بت عشوائية
+
+    التسلسل يضمن ترتيباً تصاعدياً للمعرفات المولّدة في نفس الميلي ثانية
+    """
+    global _last_ms, _seq
+    with _lock:
+        ms = time.time_ns() // 1_000_000
+        if ms > _last_ms:
+            _last_ms = ms
+            _seq = secrets.randbits(10)  # بداية عشوائية مع هامش للزيادة
+        else:
+            _seq += 1
+            if _seq > 0xFFF:
+                # امتلأ التسلسل: استعارة الميلي ثانية التالية
+                _last_ms += 1
+                _seq = 0
+        ms, seq = _last_ms, _seq
+
+    value = (ms & 0xFFFFFFFFFFFF) << 80
+    value |= 0x7 << 76
+    value |= seq << 64
+    value |= 0b10 << 62
+    value |= secrets.randbits(62)
+    return uuid.UUID(int=value)
+
+
+def new_id() -> str:
+    """معرف جديد (نص UUIDv7)"""
+    return str(uuid7())
+
+
+def db_id(value):
+    """
+    تحويل معرف لمعامل استعلام
+
+    مع DB_BINARY_IDS: أي صيغة UUID نصية (قديمة uuid4 أو جديدة v7) -> 16 بايت،
+    فتبقى المعرفات النصية التي بحوزة العملاء صالحة بعد الترحيل.
+    القيم غير الصالحة تُمرَّر كما هي (لن تطابق أي صف).
+    """
+    if not settings.DB_BINARY_IDS or value is None or isinstance(value, (bytes, bytearray)):
+        return value
+    try:
+        return uuid.UUID(str(value)).bytes
+    except ValueError:
+        return value
+
+
+def decode_row(row: dict) -> dict:
+    """
+    تحويل أعمدة المعرفات BINARY(16) في الصف إلى نص UUID
+
+    أعمدة ID_COLUMN_NAMES فقط: قيمة ثنائية من 16 بايت في عمود آخر تبقى كما هي
+    """
+    for key in ID_COLUMN_NAMES.intersection(row):
+        value = row[key]
+        if isinstance(value, (bytes, bytearray)) and len(value) == 16:
+            row[key] = str(uuid.UUID(bytes=bytes(value)))
+    return row
+
+
+def decode_rows(rows):
+    """decode_row لكل الصفوف (لا شيء بدون DB_BINARY_IDS)"""
+    if rows and settings.DB_BINARY_IDS:
+        for row in rows:
+            if isinstance(row, dict):
+                decode_row(row)
+    return rows
@@ -0,0 +1,159 @@
+# app/db/instrumentation.py
+"""
+قياس الاستعلامات - بصمة الاستعلام، توزيع الأزمنة، سجل البطيء، كشف N+1 لكل طلب
+"""
+import re
+import time
+import threading
+from contextvars import ContextVar
+from app.config import settings
+from app.core.logging_config import logger
+
+# حدود أعمدة التوزيع (ميلي ثانية) - الأخير مفتوح
+HISTOGRAM_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+# عدّاد الطلب الحالي: {"total": int, "ms": float, "by_fp": {fp: n}, "by_key": {(verb, params): n}}
+_request_counter = ContextVar("db_request_counter", default=None)
+
+_RE_COMMENT = re.compile(r"/\*.*?\*/|--[^\n]*", re.DOTALL)
+_RE_STRING = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_RE_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_PLACEHOLDER = re.compile(r"%s|\?")
+_RE_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_RE_VALUES_LIST = re.compile(r"(values\s*\([^)]*\))(?:\s*,\s*\([^)]*\))+")
+_RE_OR_CHAIN = re.compile(r"(\b\w+ like \?)(?:\s+or\s+\w+ like \?)+")
+_RE_SPACES = re.compile(r"\s+")
+
+
+def fingerprint(query: str) -> str:
+    """
+    بصمة الاستعلام: نفس الشكل بقيم مختلفة = نفس البصمة
+
+    تُستبدل القيم والمعاملات بـ ?، وتُطوى قوائم IN / VALUES / سلاسل LIKE ... OR
+    """
+    fp = _RE_COMMENT.sub(" ", query)
+    fp = _RE_STRING.sub("?", fp)
+    fp = _RE_NUMBER.sub("?", fp)
+    fp = _RE_PLACEHOLDER.sub("?", fp)
+    fp = _RE_SPACES.sub(" ", fp).strip().lower()
+    fp = _RE_IN_LIST.sub("(?+)", fp)
+    fp = _RE_VALUES_LIST.sub(r"\1, ...", fp)
+    fp = _RE_OR_CHAIN.sub(r"\1 or ...", fp)
+    return fp
+
+
+def _bucket(elapsed_ms: float) -> str:
+    for bound in HISTOGRAM_BUCKETS_MS:
+        if elapsed_ms <= bound:
+            return f"<={bound}ms"
+    return f">{HISTOGRAM_BUCKETS_MS[-1]}ms"
+
+
+def record_query(query: str, started: float, rows: int = None, params=None, error=None):
+    """
+    تسجيل استعلام منفَّذ
+
+    Args:
+        started: قيمة time.perf_counter() قبل التنفيذ
+        rows: الصفوف المُعادة أو المتأثرة
+        error: الاستثناء إذا فشل التنفيذ (يُعد في errors / last_error للبصمة)
+    """
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    fp = fingerprint(query)
+
+    with _stats_lock:
+        entry = _stats.get(fp)
+        if entry is None:
+            entry = _stats[fp] = {
+                "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                "rows": 0, "errors": 0, "last_error": None, "histogram": {},
+            }
+        entry["count"] += 1
+        entry["total_ms"] += elapsed_ms
+        entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+        entry["rows"] += rows or 0
+        bucket = _bucket(elapsed_ms)
+        entry["histogram"][bucket] = entry["histogram"].get(bucket, 0) + 1
+        if error is not None:
+            entry["errors"] += 1
+            entry["last_error"] = str(error)[:200]
+
+    counter = _request_counter.get()
+    if counter is not None:
+        counter["total"] += 1
+        counter["ms"] += elapsed_ms
+        counter["by_fp"][fp] = counter["by_fp"].get(fp, 0) + 1
+        verb = fp.split(" ", 1)[0]
+        if verb in ("delete", "update", "insert") and params:
+            key = (verb, repr(params))
+            counter["by_key"][key] = counter["by_key"].get(key, 0) + 1
+
+    if elapsed_ms >= settings.DB_SLOW_QUERY_MS:
+        logger.warning(
+            f"🐢 استعلام بطيء {elapsed_ms:.1f}ms (صفوف: {rows}) | {fp[:300]}"
+        )
+
+
+def begin_request():
+    """بداية عدّاد استعلامات الطلب"""
+    return _request_counter.set({"total": 0, "ms": 0.0, "by_fp": {}, "by_key": {}})
+
+
+def current_request() -> dict:
+    """ملخص عدّاد الطلب حتى الآن (بدون إغلاقه)"""
+    counter = _request_counter.get()
+    if counter is None:
+        return {}
+    return {"queries": counter["total"], "db_ms": round(counter["ms"], 2)}
+
+
+def end_request(token, path: str = "") -> dict:
+    """نهاية الطلب: كشف أنماط N+1 وإرجاع ملخص العدّاد"""
+    counter = _request_counter.get()
+    _request_counter.reset(token)
+    if counter is None:
+        return {}
+
+    threshold = settings.DB_N_PLUS_ONE_THRESHOLD
+    # نفس الاستعلام يتكرر بقيم مختلفة (حلقة استعلامات)
+    for fp, n in counter["by_fp"].items():
+        if n >= threshold:
+            logger.warning(f"🔁 N+1 محتمل في {path}: {n} مرة | {fp[:200]}")
+    # عدة عبارات كتابة منفصلة بنفس المفتاح (يمكن دمجها في معاملة/عبارة واحدة)
+    for (verb, params), n in counter["by_key"].items():
+        if n >= threshold:
+            logger.warning(
+                f"🔁 {n} عبارات {verb.upper()} منفصلة بنفس المفتاح {params[:80]} في {path}"
+            )
+    return {"queries": counter["total"], "db_ms": round(counter["ms"], 2)}
+
+
+def query_stats(limit: int = 50, order_by: str = "total_ms") -> list:
+    """أعلى البصمات حسب الزمن الكلي (أو count / max_ms)"""
+    with _stats_lock:
+        items = [
+            {
+                "fingerprint": fp,
+                "count": e["count"],
+                "total_ms": round(e["total_ms"], 2),
+                "avg_ms": round(e["total_ms"] / e["count"], 3),
+                "max_ms": round(e["max_ms"], 2),
+                "rows": e["rows"],
+                "avg_rows": round(e["rows"] / e["count"], 2),
+                "errors": e["errors"],
+                "last_error": e["last_error"],
+                "histogram": dict(e["histogram"]),
+            }
+            for fp, e in _stats.items()
+        ]
+    items.sort(key=lambda x: x.get(order_by, 0), reverse=True)
+    return items[:limit]
+
+
+def reset_stats():
+    """تصفير الإحصائيات"""
+    with _stats_lock:
+        _stats.clear()
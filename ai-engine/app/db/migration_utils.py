@@ -0,0 +1,70 @@
+# app/db/migration_utils.py
+"""
+أدوات مساعدة لترحيلات Alembic (SQL مباشر على MySQL)
+"""
+from alembic import op
+from sqlalchemy import text
+
+
+def index_exists(table: str, name: str) -> bool:
+    """هل الفهرس موجود؟"""
+    row = op.get_bind().execute(
+        text(
+            "SELECT 1 FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = :t AND index_name = :n LIMIT 1"
+        ),
+        {"t": table, "n": name},
+    ).first()
+    return row is not None
+
+
+def has_leading_index(table: str, columns: list) -> bool:
+    """هل يوجد فهرس (أو مفتاح أساسي) يبدأ بنفس الأعمدة بنفس الترتيب؟"""
+    rows = op.get_bind().execute(
+        text(
+            "SELECT index_name, seq_in_index, column_name FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = :t "
+            "ORDER BY index_name, seq_in_index"
+        ),
+        {"t": table},
+    ).fetchall()
+    indexes = {}
+    for name, _, column in rows:
+        indexes.setdefault(name, []).append(column.lower())
+    wanted = [c.lower() for c in columns]
+    return any(cols[:len(wanted)] == wanted for cols in indexes.values())
+
+
+def table_exists(table: str) -> bool:
+    """هل الجدول موجود؟"""
+    row = op.get_bind().execute(
+        text(
+            "SELECT 1 FROM information_schema.tables "
+            "WHERE table_schema = DATABASE() AND table_name = :t LIMIT 1"
+        ),
+        {"t": table},
+    ).first()
+    return row is not None
+
+
+def create_index_if_missing(table: str, name: str, columns: list, unique: bool = False):
+    """
+    إنشاء فهرس بدون قفل الجدول (ALGORITHM=INPLACE, LOCK=NONE)
+
+    يتخطى الإنشاء إذا كان هناك فهرس يغطي نفس الأعمدة البادئة
+    """
+    if not table_exists(table) or index_exists(table, name):
+        return
+    if not unique and has_leading_index(table, columns):
+        return
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    cols = ", ".join(f"`{c}`" for c in columns)
+    op.execute(
+        f"ALTER TABLE `{table}` ADD {kind} `{name}` ({cols}), ALGORITHM=INPLACE, LOCK=NONE"
+    )
+
+
+def drop_index_if_exists(table: str, name: str):
+    """حذف فهرس إذا كان موجوداً"""
+    if table_exists(table) and index_exists(table, name):
+        op.execute(f"ALTER TABLE `{table}` DROP INDEX `{name}`")
@@ -1,72 +1,59 @@
 # app/db/mysql_conn.py
-import mysql.connector
 from mysql.connector import Error
-import os
-from dotenv import load_dotenv
+import time
+from app.db.base import get_pool_connection, get_read_connection
+from app.db.routing import mark_write
+from app.db.instrumentation import record_query, fingerprint
+from app.db.ids import decode_rows
+from app.core.logging_config import logger
 
-# تحميل إعدادات البيئة من .env
-load_dotenv()
+def get_connection(readonly=False):
+    """
+    اتصال مستعار من التجمع (readonly: تجمع القراءة / نسخة متماثلة إن وُجدت)
 
-DB_HOST = os.getenv("DB_HOST")
-DB_USER = os.getenv("DB_USER")
-DB_PASSWORD = os.getenv("DB_PASS")
-DB_NAME = os.getenv("DB_NAME")
-DB_CHARSET = os.getenv("DB_CHARSET", "utf8mb4")
-
-def get_connection():
-    """إنشاء اتصال بقاعدة البيانات"""
-    try:
-        conn = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME,
-            charset=DB_CHARSET
-        )
-        if conn.is_connected():
-            print(f"✅ اتصال ناجح بقاعدة البيانات: {DB_NAME}")
-            return conn
-    except Error as e:
-        print(f"❌ خطأ في الاتصال بقاعدة البيانات: {e}")
-        return None
+    close() يعيده للتجمع بدلاً من إغلاقه؛ التجمع الممتلئ يرفع PoolTimeoutError (503)
+    """
+    return get_read_connection() if readonly else get_pool_connection()
 
 def execute_query(query, params=None):
     """تنفيذ أي استعلام (SELECT أو INSERT/UPDATE/DELETE)"""
-    conn = get_connection()
+    is_select = query.strip().lower().startswith("select")
+    if not is_select:
+        mark_write()
+
+    conn = get_connection(readonly=is_select)
     if not conn:
         print("❌ فشل الحصول على اتصال قاعدة البيانات")
         return None
     
+    # القياس بدلاً من طباعة نص كل استعلام (انظر /health/queries)
+    started = time.perf_counter()
     try:
         cursor = conn.cursor(dictionary=True)
         
-        print(f"🔍 تنفيذ الاستعلام: {query[:100]}...")
-        
         if params:
             cursor.execute(query, params)
         else:
             cursor.execute(query)
         
         # إذا كان SELECT
-        if query.strip().lower().startswith("select"):
-            result = cursor.fetchall()
-            print(f"✅ تم جلب {len(result)} سجل")
+        if is_select:
+            result = decode_rows(cursor.fetchall())
+            record_query(query, started, len(result), params)
         else:
             conn.commit()
             result = cursor.rowcount
-            print(f"✅ تم تعديل {result} سجل")
+            record_query(query, started, result, params)
         
         cursor.close()
         return result
         
     except Error as e:
-        print(f"❌ خطأ في تنفيذ الاستعلام: {e}")
-        print(f"📝 الاستعلام: {query}")
-        if params:
-            print(f"📝 المعاملات: {params}")
+        # البصمة بدلاً من النص والمعاملات (قد تحوي بيانات المستخدم)؛ الفشل يُعد في /health/queries
+        record_query(query, started, 0, params, error=e)
+        logger.error(f"❌ خطأ في تنفيذ الاستعلام: {e} | {fingerprint(query)[:300]}")
         return None
         
     finally:
-        if conn and conn.is_connected():
-            conn.close()
-            print("🔒 تم إغلاق الاتصال")
\ No newline at end of file
+        # إعادة الاتصال للتجمع
+        conn.close()
\ No newline at end of file
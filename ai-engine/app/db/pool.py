@@ -0,0 +1,201 @@
+# app/db/pool.py
+"""
+مدير تجمع الاتصالات - overflow، انتظار محدود، pre-ping، تدوير حسب العمر، إغلاق كامل
+"""
+import time
+import threading
+from collections import deque
+import mysql.connector
+from mysql.connector import Error
+from mysql.connector.errors import PoolError
+from app.core.logging_config import logger
+
+
+class PoolTimeoutError(PoolError):
+    """انتهت مهلة انتظار اتصال حر من التجمع"""
+
+
+class PooledConnection:
+    """غلاف الاتصال المستعار - close() يعيده للتجمع بدلاً من إغلاقه"""
+
+    def __init__(self, pool, cnx, created_at: float):
+        self._pool = pool
+        self._cnx = cnx
+        self._created_at = created_at
+        self._returned = False
+
+    @property
+    def raw(self):
+        """الاتصال الفعلي (يبقى نفسه بين مرات الاستعارة - ذاكرة العبارات المحضّرة عليه)"""
+        return self._cnx
+
+    def close(self):
+        if not self._returned:
+            self._returned = True
+            self._pool._release(self._cnx, self._created_at)
+
+    def __getattr__(self, name):
+        return getattr(self._cnx, name)
+
+
+class ConnectionPool:
+    """
+    تجمع اتصالات MySQL
+
+    - size اتصال دائم + max_overflow اتصال مؤقت عند الضغط
+    - عند الامتلاء: انتظار حتى timeout ثم PoolTimeoutError (بدون اتصالات مباشرة إضافية)
+    - pre-ping للاتصال الخامل أكثر من ping_after ثانية
+    - تدوير الاتصال الأقدم من recycle ثانية
+    - dispose() يغلق كل الاتصالات
+    """
+
+    def __init__(self, name: str, size: int, max_overflow: int = 0, timeout: float = 5.0,
+                 recycle: int = 0, ping_after: int = 30, reset_session: bool = True,
+                 **connect_args):
+        self.name = name
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self.reset_session = reset_session
+        self._connect_args = connect_args
+
+        self._idle = deque()  # [(cnx, created_at, last_used)]
+        self._total = 0
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._stats = {
+            "checkouts": 0,
+            "created": 0,
+            "closed": 0,
+            "recycled": 0,
+            "ping_failures": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "overflow_created": 0,
+            "max_wait_ms": 0.0,
+        }
+
+    def _connect(self):
+        cnx = mysql.connector.connect(**self._connect_args)
+        with self._cond:
+            self._stats["created"] += 1
+            if self._total > self.size:
+                self._stats["overflow_created"] += 1
+        return cnx
+
+    def _discard(self, cnx):
+        try:
+            cnx.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._stats["closed"] += 1
+
+    def get_connection(self) -> PooledConnection:
+        """استعارة اتصال (ينتظر حتى timeout إذا كان التجمع ممتلئاً)"""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        entry = None
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolError(f"التجمع {self.name} مغلق")
+                if self._idle:
+                    entry = self._idle.pop()  # LIFO: الأحدث استخداماً أقل عرضة للانقطاع
+                    break
+                if self._total < self.size + self.max_overflow:
+                    self._total += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeoutError(
+                        f"انتهت مهلة انتظار اتصال من {self.name} ({self.timeout}s)"
+                    )
+                self._stats["waits"] += 1
+                self._cond.wait(remaining)
+            self._in_use += 1
+            self._stats["checkouts"] += 1
+            waited_ms = (time.monotonic() - started) * 1000
+            self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], round(waited_ms, 2))
+
+        try:
+            cnx, created_at = self._validate(entry) if entry else (self._connect(), time.time())
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return PooledConnection(self, cnx, created_at)
+
+    def _validate(self, entry: tuple) -> tuple:
+        """تدوير الاتصال القديم وفحص الخامل قبل تسليمه"""
+        cnx, created_at, last_used = entry
+        now = time.time()
+        if self.recycle and now - created_at > self.recycle:
+            self._discard(cnx)
+            with self._cond:
+                self._stats["recycled"] += 1
+            return self._connect(), time.time()
+        if now - last_used > self.ping_after:
+            try:
+                cnx.ping(reconnect=False)
+            except Error:
+                self._discard(cnx)
+                with self._cond:
+                    self._stats["ping_failures"] += 1
+                return self._connect(), time.time()
+        return cnx, created_at
+
+    def _release(self, cnx, created_at: float):
+        """إعادة اتصال للتجمع (أو إغلاقه إذا كان زائداً / تالفاً / التجمع مغلق)"""
+        healthy = True
+        try:
+            if cnx.unread_result:
+                cnx.consume_results()
+            cnx.rollback()
+            if self.reset_session:
+                cnx.reset_session()
+        except Exception:
+            healthy = False
+
+        with self._cond:
+            self._in_use -= 1
+            keep = healthy and not self._closed and len(self._idle) < self.size
+            if keep:
+                self._idle.append((cnx, created_at, time.time()))
+            else:
+                self._total -= 1
+            self._cond.notify()
+        if not keep:
+            self._discard(cnx)
+
+    def dispose(self):
+        """إغلاق التجمع وكل الاتصالات الخاملة (المستعارة تُغلق عند إعادتها)"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._total -= len(idle)
+            self._cond.notify_all()
+        for cnx, _, _ in idle:
+            self._discard(cnx)
+        logger.info(f"🔒 تم إغلاق {len(idle)} اتصال من {self.name}")
+
+    def status(self) -> dict:
+        """عدادات التجمع"""
+        with self._cond:
+            return {
+                "name": self.name,
+                "size": self.size,
+                "max_overflow": self.max_overflow,
+                "total": self._total,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "overflow_in_use": max(self._total - self.size, 0),
+                "closed": self._closed,
+                **self._stats,
+            }
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+rebuild_counters.py
+إعادة بناء جدول العدادات (ai_stat_counters) من الجداول الأصلية
+
+الاستخدام:
+    python -m app.db.rebuild_counters
+"""
+import sys
+from app.repositories.counter_repo import CounterRepository
+
+
+def main():
+    print("🔄 إعادة بناء العدادات...")
+    try:
+        CounterRepository.rebuild()
+    except Exception as e:
+        print(f"❌ فشلت إعادة البناء: {e}")
+        return 1
+    values = CounterRepository.get(*CounterRepository.SOURCES)
+    for name, value in values.items():
+        print(f"   📌 {name}: count={value['count']} total={value['total']}")
+    print("✅ تمت إعادة البناء")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
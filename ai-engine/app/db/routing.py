@@ -0,0 +1,58 @@
+# app/db/routing.py
+"""
+توجيه القراءة/الكتابة - تثبيت القراءات على الخادم الرئيسي بعد الكتابة (read-your-writes)
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# حالة الطلب الحالي: {"pinned": bool}
+# كائن قابل للتعديل حتى تبقى الحالة مشتركة بين نسخ الـ context (threadpool / tasks)
+_route_state = ContextVar("db_route_state", default=None)
+
+
+def begin_request():
+    """بداية طلب جديد - لا تثبيت بعد"""
+    return _route_state.set({"pinned": False})
+
+
+def end_request(token):
+    """نهاية الطلب"""
+    _route_state.reset(token)
+
+
+def mark_write():
+    """
+    تسجيل كتابة - كل القراءات التالية في نفس الطلب تذهب للرئيسي
+
+    خارج نطاق طلب (begin_request) بلا أثر: تعيين الحالة هنا كان سيبقى في
+    context الخيط (عمّال المهام / الكتابة المؤجلة) ويثبّت كل قراءاته للأبد
+    """
+    state = _route_state.get()
+    if state is not None:
+        state["pinned"] = True
+
+
+def use_primary() -> bool:
+    """هل يجب توجيه القراءة للرئيسي؟"""
+    state = _route_state.get()
+    return bool(state and state["pinned"])
+
+
+@contextmanager
+def primary_only():
+    """إجبار كل القراءات داخل الكتلة على الرئيسي"""
+    state = _route_state.get()
+    if state is None:
+        token = _route_state.set({"pinned": True})
+        try:
+            yield
+        finally:
+            _route_state.reset(token)
+        return
+
+    previous = state["pinned"]
+    state["pinned"] = True
+    try:
+        yield
+    finally:
+        state["pinned"] = previous
@@ -2,16 +2,31 @@
 """
 إدارة الجلسات - Context Manager للاستعلامات
 """
+import time
+from collections import OrderedDict
 from contextlib import contextmanager
 from mysql.connector import Error
-from app.db.base import get_pool_connection
+from app.db.base import get_pool_connection, get_read_connection
+from app.db.pool import PooledConnection
+from app.db.routing import mark_write
+from app.db.instrumentation import record_query
+from app.db.ids import decode_rows, decode_row
+from app.config import settings
 from app.core.logging_config import logger
 
 
+def _is_select(query: str) -> bool:
+    return query.strip().upper().startswith("SELECT")
+
+
 @contextmanager
-def get_db():
-    """Context manager للحصول على اتصال مع auto-commit/rollback"""
-    conn = get_pool_connection()
+def get_db(readonly: bool = False):
+    """
+    Context manager للحصول على اتصال مع auto-commit/rollback
+
+    readonly=True: اتصال من تجمع القراءة (نسخة متماثلة) ما لم يكن الطلب مثبّتاً على الرئيسي
+    """
+    conn = get_read_connection() if readonly else get_pool_connection()
     if conn is None:
         raise Exception("فشل الاتصال بقاعدة البيانات")
     try:
@@ -28,32 +43,173 @@ def get_db():
             pass
 
 
-def execute_query(query: str, params: tuple = None, fetch: bool = True):
-    """تنفيذ استعلام واحد مع إدارة الاتصال"""
-    with get_db() as conn:
+def _raw_connection(conn):
+    """الاتصال الفعلي خلف غلاف التجمع (يبقى نفسه بين مرات الاستعارة)"""
+    return conn.raw if isinstance(conn, PooledConnection) else conn
+
+
+def prepared_cursor(conn, query: str):
+    """
+    cursor مُحضَّر من ذاكرة الاتصال (مفتاحها نص الاستعلام)
+
+    MySQLCursorPrepared يعيد استخدام العبارة المحضّرة على الخادم
+    طالما نُفّذ نفس النص على نفس الـ cursor. لا يُغلق بعد التنفيذ
+    """
+    raw = _raw_connection(conn)
+    cache = getattr(raw, "_prepared_cache", None)
+    if cache is None:
+        cache = OrderedDict()
+        raw._prepared_cache = cache
+
+    cursor = cache.get(query)
+    if cursor is not None:
+        cache.move_to_end(query)
+        return cursor
+
+    cursor = raw.cursor(prepared=True, dictionary=True)
+    cache[query] = cursor
+    while len(cache) > settings.DB_PREPARED_CACHE_SIZE:
+        _, old = cache.popitem(last=False)
+        try:
+            old.close()
+        except Exception:
+            pass
+    return cursor
+
+
+def drop_prepared(conn, query: str):
+    """إزالة cursor تالف من الذاكرة"""
+    cache = getattr(_raw_connection(conn), "_prepared_cache", None)
+    if cache and query in cache:
+        try:
+            cache.pop(query).close()
+        except Exception:
+            pass
+
+
+def execute_query(query: str, params: tuple = None, fetch: bool = True, uow=None,
+                  prepared: bool = False):
+    """
+    تنفيذ استعلام واحد مع إدارة الاتصال
+
+    إذا مُررت وحدة عمل (uow): القراءة تتم على اتصالها، والكتابة تُؤجَّل حتى commit
+    prepared=True: يستخدم عبارة محضّرة من ذاكرة الاتصال (إذا DB_PREPARED_STATEMENTS مفعّل)،
+    مع وحدة العمل أيضاً (على اتصالها)
+    """
+    prepared = prepared and settings.DB_PREPARED_STATEMENTS
+    if uow is not None:
+        if fetch and _is_select(query):
+            return uow.query(query, params, prepared=prepared)
+        uow.add(query, params, prepared=prepared)
+        return None
+
+    is_read = fetch and _is_select(query)
+    if not is_read:
+        mark_write()
+
+    if prepared:
+        return _execute_prepared(query, params, fetch, is_read)
+
+    with get_db(readonly=is_read) as conn:
         cursor = conn.cursor(dictionary=True)
+        started = time.perf_counter()
         try:
             if params:
                 cursor.execute(query, params)
             else:
                 cursor.execute(query)
 
-            if fetch and query.strip().upper().startswith("SELECT"):
-                return cursor.fetchall()
+            if is_read:
+                rows = cursor.fetchall()
+                record_query(query, started, len(rows), params)
+                return decode_rows(rows)
             else:
                 conn.commit()
+                record_query(query, started, cursor.rowcount, params)
                 return cursor.lastrowid if cursor.lastrowid else cursor.rowcount
+        except Error as e:
+            # الفشل يُعد في errors / last_error للبصمة (/health/queries)
+            record_query(query, started, 0, params, error=e)
+            raise
         finally:
             cursor.close()
 
 
-def execute_many(query: str, data_list: list):
+def _execute_prepared(query: str, params: tuple, fetch: bool, is_read: bool):
+    """تنفيذ عبر cursor محضّر (لا يُغلق - يبقى في ذاكرة الاتصال)"""
+    with get_db(readonly=is_read) as conn:
+        cursor = prepared_cursor(conn, query)
+        started = time.perf_counter()
+        try:
+            cursor.execute(query, params or ())
+            if is_read:
+                rows = cursor.fetchall()
+                record_query(query, started, len(rows), params)
+                return decode_rows(rows)
+            conn.commit()
+            record_query(query, started, cursor.rowcount, params)
+            return cursor.lastrowid if cursor.lastrowid else cursor.rowcount
+        except Error as e:
+            record_query(query, started, 0, params, error=e)
+            drop_prepared(conn, query)
+            raise
+
+
+def stream_query(query: str, params: tuple = None, batch_size: int = None):
+    """
+    تنفيذ SELECT وإرجاع الصفوف تدريجياً (generator)
+
+    يستخدم cursor غير مخزَّن مؤقتاً (unbuffered) و fetchmany بدفعات،
+    فيبقى استهلاك الذاكرة ثابتاً مهما كان حجم الجدول.
+    الاتصال يبقى محجوزاً حتى انتهاء القراءة أو إغلاق الـ generator.
+    """
+    batch_size = batch_size or settings.DB_STREAM_BATCH_SIZE
+    decode = settings.DB_BINARY_IDS
+    with get_db(readonly=True) as conn:
+        cursor = conn.cursor(dictionary=True, buffered=False)
+        started = time.perf_counter()
+        total = 0
+        error = None
+        try:
+            cursor.execute(query, params or ())
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                total += len(rows)
+                for row in rows:
+                    yield decode_row(row) if decode else row
+        except Error as e:
+            error = e
+            raise
+        finally:
+            record_query(query, started, total, params, error=error)
+            # عند الخروج المبكر يجب استهلاك الباقي قبل إعادة الاتصال للتجمع
+            try:
+                if conn.unread_result:
+                    conn.consume_results()
+                cursor.close()
+            except Error:
+                pass
+
+
+def execute_many(query: str, data_list: list, uow=None):
     """تنفيذ استعلام متعدد (INSERT باتش)"""
+    if uow is not None:
+        uow.add_many(query, data_list)
+        return len(data_list)
+
+    mark_write()
     with get_db() as conn:
         cursor = conn.cursor()
+        started = time.perf_counter()
         try:
             cursor.executemany(query, data_list)
             conn.commit()
+            record_query(query, started, cursor.rowcount)
             return cursor.rowcount
+        except Error as e:
+            record_query(query, started, 0, error=e)
+            raise
         finally:
             cursor.close()
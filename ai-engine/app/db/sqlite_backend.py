@@ -0,0 +1,465 @@
+# app/db/sqlite_backend.py
+"""
+واجهة SQLite المدمجة (DB_BACKEND=sqlite) - للتثبيتات أحادية الخادم ولاختبارات الأداء
+
+نفس المستودعات ونفس نص الاستعلامات: الاتصال هنا يحاكي الجزء المستخدم من
+mysql-connector (cursor(dictionary=True) / commit / rollback / ping)،
+ويترجم صيغة MySQL إلى SQLite عند التنفيذ:
+
+- %s -> ?
+- INSERT IGNORE -> INSERT OR IGNORE
+- ON DUPLICATE KEY UPDATE col = col + VALUES(col) -> ON CONFLICT DO UPDATE SET ... excluded.col
+- SELECT ... FOR UPDATE [SKIP LOCKED] -> BEGIN IMMEDIATE ثم SELECT (قفل الكتابة حتى commit)
+
+الملف في وضع WAL (قراءات متزامنة مع كاتب واحد)، وبحث القطع عبر FTS5 (trigram)
+"""
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+from pathlib import Path
+from mysql.connector import errors
+from app.db.pool import ConnectionPool
+from app.db.ids import new_id
+from app.utils.text_processing import normalize_arabic
+from app.config import settings
+from app.core.logging_config import logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ai_knowledge_bases (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT,
+    is_public INTEGER NOT NULL DEFAULT 0,
+    metadata TEXT,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+    updated_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE INDEX IF NOT EXISTS idx_kb_created ON ai_knowledge_bases (created_at);
+
+CREATE TABLE IF NOT EXISTS ai_files (
+    id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    mime_type TEXT,
+    file_size INTEGER,
+    file_path TEXT,
+    extracted_text TEXT,
+    structured_data TEXT,
+    embedding_model TEXT,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE INDEX IF NOT EXISTS idx_files_created ON ai_files (created_at, id);
+
+CREATE TABLE IF NOT EXISTS ai_documents (
+    id TEXT PRIMARY KEY,
+    knowledge_base_id TEXT REFERENCES ai_knowledge_bases (id) ON DELETE CASCADE,
+    file_id TEXT,
+    title TEXT,
+    source_url TEXT,
+    language TEXT DEFAULT 'ar',
+    metadata TEXT,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE INDEX IF NOT EXISTS idx_documents_kb ON ai_documents (knowledge_base_id, created_at);
+
+CREATE TABLE IF NOT EXISTS ai_document_chunks (
+    id TEXT PRIMARY KEY,
+    document_id TEXT NOT NULL REFERENCES ai_documents (id) ON DELETE CASCADE,
+    chunk_index INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    language TEXT DEFAULT 'ar',
+    token_count INTEGER,
+    metadata TEXT,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE INDEX IF NOT EXISTS idx_chunks_document ON ai_document_chunks (document_id, chunk_index);
+CREATE INDEX IF NOT EXISTS idx_chunks_created ON ai_document_chunks (created_at);
+
+-- فهرس نصي: trigram يطابق أجزاء الكلمات مثل LIKE '%...%'
+-- المحتوى مطبَّع (ar_normalize: التشكيل / الهمزات / التاء المربوطة) بدل collation الـ MySQL
+CREATE VIRTUAL TABLE IF NOT EXISTS ai_document_chunks_fts USING fts5(content, tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS ai_chunks_fts_insert AFTER INSERT ON ai_document_chunks BEGIN
+    INSERT INTO ai_document_chunks_fts (rowid, content) VALUES (new.rowid, ar_normalize(new.content));
+END;
+CREATE TRIGGER IF NOT EXISTS ai_chunks_fts_delete AFTER DELETE ON ai_document_chunks BEGIN
+    DELETE FROM ai_document_chunks_fts WHERE rowid = old.rowid;
+END;
+CREATE TRIGGER IF NOT EXISTS ai_chunks_fts_update AFTER UPDATE OF content ON ai_document_chunks BEGIN
+    DELETE FROM ai_document_chunks_fts WHERE rowid = old.rowid;
+    INSERT INTO ai_document_chunks_fts (rowid, content) VALUES (new.rowid, ar_normalize(new.content));
+END;
+
+CREATE TABLE IF NOT EXISTS ai_threads (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    metadata TEXT,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+    updated_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE INDEX IF NOT EXISTS idx_threads_updated ON ai_threads (updated_at, id);
+-- مكافئ ON UPDATE CURRENT_TIMESTAMP
+CREATE TRIGGER IF NOT EXISTS ai_threads_touch AFTER UPDATE ON ai_threads
+WHEN new.updated_at = old.updated_at BEGIN
+    UPDATE ai_threads SET updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE id = new.id;
+END;
+
+CREATE TABLE IF NOT EXISTS ai_messages (
+    id TEXT PRIMARY KEY,
+    thread_id TEXT NOT NULL REFERENCES ai_threads (id) ON DELETE CASCADE,
+    role TEXT NOT NULL,
+    content TEXT,
+    model TEXT,
+    tokens INTEGER,
+    latency_ms INTEGER,
+    citations TEXT,
+    tool_calls TEXT,
+    language TEXT DEFAULT 'ar',
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE INDEX IF NOT EXISTS idx_messages_thread ON ai_messages (thread_id, created_at);
+
+CREATE TABLE IF NOT EXISTS ai_message_files (
+    message_id TEXT NOT NULL REFERENCES ai_messages (id) ON DELETE CASCADE,
+    file_id TEXT NOT NULL REFERENCES ai_files (id) ON DELETE CASCADE,
+    PRIMARY KEY (message_id, file_id)
+);
+
+CREATE TABLE IF NOT EXISTS ai_feedback (
+    id TEXT PRIMARY KEY,
+    message_id TEXT NOT NULL REFERENCES ai_messages (id) ON DELETE CASCADE,
+    rating INTEGER NOT NULL,
+    comment TEXT,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE INDEX IF NOT EXISTS idx_feedback_created ON ai_feedback (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_feedback_message_created ON ai_feedback (message_id, created_at);
+
+CREATE TABLE IF NOT EXISTS ai_thread_memory (
+    thread_id TEXT PRIMARY KEY REFERENCES ai_threads (id) ON DELETE CASCADE,
+    summary TEXT,
+    key_facts TEXT,
+    topics TEXT,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    last_message_at TEXT,
+    last_message_id TEXT,
+    updated_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+
+CREATE TRIGGER IF NOT EXISTS ai_thread_memory_touch AFTER UPDATE ON ai_thread_memory
+WHEN new.updated_at = old.updated_at BEGIN
+    UPDATE ai_thread_memory SET updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now')
+    WHERE thread_id = new.thread_id;
+END;
+
+CREATE TABLE IF NOT EXISTS ai_usage_logs (
+    id TEXT PRIMARY KEY,
+    thread_id TEXT,
+    model TEXT,
+    tokens_input INTEGER DEFAULT 0,
+    tokens_output INTEGER DEFAULT 0,
+    cost_usd REAL DEFAULT 0,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE INDEX IF NOT EXISTS idx_usage_thread ON ai_usage_logs (thread_id, created_at);
+
+CREATE TABLE IF NOT EXISTS ai_vision_analyses (
+    id TEXT PRIMARY KEY,
+    file_id TEXT,
+    message_id TEXT,
+    extracted_text TEXT,
+    description TEXT,
+    structured_data TEXT,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE INDEX IF NOT EXISTS idx_vision_file ON ai_vision_analyses (file_id, created_at);
+
+CREATE TABLE IF NOT EXISTS ai_stat_counters (
+    name TEXT NOT NULL,
+    slot INTEGER NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    total REAL NOT NULL DEFAULT 0,
+    updated_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+    PRIMARY KEY (name, slot)
+);
+
+CREATE TABLE IF NOT EXISTS ai_jobs (
+    id TEXT PRIMARY KEY,
+    queue TEXT NOT NULL,
+    task TEXT NOT NULL,
+    payload TEXT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    run_after TEXT NOT NULL,
+    locked_by TEXT,
+    locked_at TEXT,
+    last_error TEXT,
+    result TEXT,
+    progress TEXT,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+    finished_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_claim ON ai_jobs (queue, status, run_after);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON ai_jobs (status, finished_at);
+"""
+
+# أعمدة أُضيفت بعد إنشاء الجداول (ملفات قائمة لا يعيد SCHEMA إنشاءها)
+ADDED_COLUMNS = (
+    ("ai_thread_memory", "topics", "TEXT"),
+    ("ai_thread_memory", "message_count", "INTEGER NOT NULL DEFAULT 0"),
+    ("ai_thread_memory", "last_message_at", "TEXT"),
+    ("ai_thread_memory", "last_message_id", "TEXT"),
+    ("ai_jobs", "progress", "TEXT"),
+)
+
+# أقل طول لمصطلح يستخدم فهرس trigram (الأقصر يُبحث عنه بـ LIKE)
+FTS_MIN_TERM = 3
+
+_RE_FOR_UPDATE = re.compile(r"\s+FOR\s+UPDATE(?:\s+SKIP\s+LOCKED)?\b", re.IGNORECASE)
+_RE_INSERT_IGNORE = re.compile(r"\bINSERT\s+IGNORE\s+INTO\b", re.IGNORECASE)
+_RE_ON_DUPLICATE = re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.IGNORECASE)
+_RE_VALUES_FN = re.compile(r"\bVALUES\((\w+)\)", re.IGNORECASE)
+_RE_NOW = re.compile(r"\bNOW\(\)", re.IGNORECASE)
+
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+sqlite3.register_adapter(Decimal, float)
+sqlite3.register_adapter(datetime, lambda v: v.isoformat(sep=" "))
+sqlite3.register_adapter(date, lambda v: v.isoformat())
+
+
+def is_sqlite() -> bool:
+    """هل الواجهة المختارة SQLite؟"""
+    return settings.DB_BACKEND == "sqlite"
+
+
+@lru_cache(maxsize=512)
+def translate(query: str) -> tuple:
+    """
+    ترجمة استعلام بصيغة MySQL
+
+    Returns:
+        (نص SQLite، هل يحتاج قفل كتابة - FOR UPDATE)
+    """
+    locking = bool(_RE_FOR_UPDATE.search(query))
+    sql = _RE_FOR_UPDATE.sub("", query)
+    sql = _RE_INSERT_IGNORE.sub("INSERT OR IGNORE INTO", sql)
+    match = _RE_ON_DUPLICATE.search(sql)
+    if match:
+        head, tail = sql[:match.start()], sql[match.end():]
+        sql = head + "ON CONFLICT DO UPDATE SET" + _RE_VALUES_FN.sub(r"excluded.\1", tail)
+    sql = _RE_NOW.sub("CURRENT_TIMESTAMP", sql)
+    return sql.replace("%s", "?"), locking
+
+
+def _is_insert(sql: str) -> bool:
+    return sql.lstrip()[:7].upper() in ("INSERT ", "REPLACE")
+
+
+def fts_match(terms: list) -> str:
+    """تعبير MATCH لـ FTS5 (أي مصطلح) من المصطلحات بطول FTS_MIN_TERM فأكثر"""
+    normalized = (normalize_arabic(term) for term in terms)
+    quoted = [
+        '"' + term.replace('"', '""') + '"'
+        for term in normalized if len(term) >= FTS_MIN_TERM
+    ]
+    return " OR ".join(quoted)
+
+
+@contextmanager
+def _mysql_errors():
+    """أخطاء sqlite3 -> أخطاء mysql.connector (نفس معالجة الأخطاء في المستدعين)"""
+    try:
+        yield
+    except sqlite3.IntegrityError as e:
+        message = str(e)
+        if "UNIQUE" in message or "PRIMARY KEY" in message:
+            raise errors.IntegrityError(msg=message, errno=1062) from e
+        if "FOREIGN KEY" in message:
+            raise errors.IntegrityError(msg=message, errno=1452) from e
+        raise errors.IntegrityError(msg=message) from e
+    except sqlite3.OperationalError as e:
+        message = str(e)
+        if "locked" in message or "busy" in message:
+            # مكافئ Lock wait timeout
+            raise errors.OperationalError(msg=message, errno=1205) from e
+        raise errors.ProgrammingError(msg=message) from e
+    except sqlite3.Error as e:
+        raise errors.DatabaseError(msg=str(e)) from e
+
+
+class SQLiteCursor:
+    """cursor بواجهة mysql-connector (dictionary / fetchmany / rowcount / lastrowid)"""
+
+    def __init__(self, conn, dictionary: bool = False):
+        self._conn = conn
+        self._cursor = conn._db.cursor()
+        self._dictionary = dictionary
+        self._inserted = False
+
+    def execute(self, query: str, params=None):
+        sql, locking = translate(query)
+        self._inserted = _is_insert(sql)
+        with _mysql_errors():
+            if locking and not self._conn._db.in_transaction:
+                self._conn._db.execute("BEGIN IMMEDIATE")
+            self._cursor.execute(sql, tuple(params or ()))
+
+    def executemany(self, query: str, seq_params):
+        sql, _ = translate(query)
+        self._inserted = False
+        with _mysql_errors():
+            self._cursor.executemany(sql, [tuple(p or ()) for p in seq_params])
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {col[0]: value for col, value in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchall(self) -> list:
+        return [self._row(r) for r in self._cursor.fetchall()]
+
+    def fetchmany(self, size: int = 1) -> list:
+        return [self._row(r) for r in self._cursor.fetchmany(size)]
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        # sqlite3 يبقي rowid آخر INSERT على الاتصال بعد UPDATE/DELETE؛ mysql-connector يعيد 0
+        # (execute_query يعيد lastrowid إن وُجد وإلا rowcount)
+        return self._cursor.lastrowid if self._inserted else None
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """اتصال SQLite بواجهة mysql-connector المستخدمة في المشروع"""
+
+    unread_result = False
+
+    def __init__(self, path: str, timeout: float):
+        # IMMEDIATE: المعاملة تأخذ قفل الكتابة عند أول INSERT/UPDATE/DELETE
+        # (القراءات قبلها خارج المعاملة فلا يحدث تعارض ترقية القفل)
+        self._db = sqlite3.connect(
+            path, timeout=timeout, isolation_level="IMMEDIATE", check_same_thread=False
+        )
+        # مستخدمة في محفزات فهرس FTS (يجب تسجيلها على كل اتصال يكتب)
+        self._db.create_function("ar_normalize", 1, normalize_arabic, deterministic=True)
+        self._db.execute("PRAGMA foreign_keys = ON")
+        self._db.execute(f"PRAGMA synchronous = {settings.SQLITE_SYNCHRONOUS}")
+        self._db.execute(f"PRAGMA cache_size = -{settings.SQLITE_CACHE_MB * 1024}")
+        self._db.execute("PRAGMA temp_store = MEMORY")
+
+    def cursor(self, dictionary: bool = False, prepared: bool = False, buffered: bool = True):
+        # sqlite3 يحتفظ بالعبارات المترجمة في ذاكرته؛ prepared/buffered بلا أثر هنا
+        return SQLiteCursor(self, dictionary)
+
+    def commit(self):
+        with _mysql_errors():
+            self._db.commit()
+
+    def rollback(self):
+        self._db.rollback()
+
+    def ping(self, reconnect: bool = False):
+        with _mysql_errors():
+            self._db.execute("SELECT 1").fetchone()
+
+    def is_connected(self) -> bool:
+        return True
+
+    def consume_results(self):
+        pass
+
+    def reset_session(self):
+        pass
+
+    def close(self):
+        self._db.close()
+
+
+def _add_columns(db):
+    """إضافة أعمدة ADDED_COLUMNS الناقصة (مكافئ ترحيلات Alembic لـ SQLite)"""
+    for table, column, ddl in ADDED_COLUMNS:
+        existing = {row[1] for row in db.execute(f"PRAGMA table_info({table})")}
+        if column not in existing:
+            db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+
+def _detach_legacy_usage(db) -> bool:
+    """
+    ai_usage_logs بمعرف INTEGER (قبل المعرف من العميل - مكافئ ترحيل 0007):
+    إعادة تسميته حتى ينشئ المخطط الجدول الجديد
+    """
+    columns = {row[1]: row[2] for row in db.execute("PRAGMA table_info(ai_usage_logs)")}
+    if columns.get("id", "").upper() != "INTEGER":
+        return False
+    db.execute("DROP INDEX IF EXISTS idx_usage_thread")
+    db.execute("ALTER TABLE ai_usage_logs RENAME TO ai_usage_logs_legacy")
+    return True
+
+
+def _copy_legacy_usage(db):
+    db.create_function("new_id", 0, new_id)
+    db.execute(
+        """INSERT INTO ai_usage_logs
+               (id, thread_id, model, tokens_input, tokens_output, cost_usd, created_at)
+           SELECT new_id(), thread_id, model, tokens_input, tokens_output, cost_usd, created_at
+           FROM ai_usage_logs_legacy ORDER BY id"""
+    )
+    db.execute("DROP TABLE ai_usage_logs_legacy")
+
+
+def init_schema(path: str):
+    """إنشاء الملف والجداول (مرة لكل ملف) وتفعيل WAL"""
+    if path in _schema_ready:
+        return
+    with _schema_lock:
+        if path in _schema_ready:
+            return
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(path, timeout=settings.DB_POOL_TIMEOUT)
+        try:
+            mode = db.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+            legacy_usage = _detach_legacy_usage(db)
+            db.executescript(SCHEMA)
+            if legacy_usage:
+                _copy_legacy_usage(db)
+            _add_columns(db)
+            db.commit()
+        finally:
+            db.close()
+        _schema_ready.add(path)
+        logger.info(f"✅ قاعدة SQLite جاهزة: {path} (journal_mode={mode})")
+
+
+class SQLitePool(ConnectionPool):
+    """تجمع اتصالات SQLite (نفس الحدود والعدادات والانتظار كتجمع MySQL)"""
+
+    def __init__(self, name: str, size: int, path: str, **kwargs):
+        super().__init__(name, size, **kwargs)
+        self.path = path
+
+    def _connect(self):
+        init_schema(self.path)
+        try:
+            cnx = SQLiteConnection(self.path, timeout=self.timeout)
+        except sqlite3.Error as e:
+            raise errors.InterfaceError(msg=f"فشل فتح {self.path}: {e}") from e
+        with self._cond:
+            self._stats["created"] += 1
+            if self._total > self.size:
+                self._stats["overflow_created"] += 1
+        return cnx
+
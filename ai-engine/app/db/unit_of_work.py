@@ -0,0 +1,157 @@
+# app/db/unit_of_work.py
+"""
+وحدة العمل (Unit of Work) - تجميع كتابات الطلب في معاملة واحدة
+"""
+import time
+from mysql.connector import Error
+from app.db.base import get_pool_connection
+from app.db.routing import mark_write
+from app.db.instrumentation import record_query
+from app.db.session import prepared_cursor, drop_prepared
+from app.db.ids import decode_rows
+from app.config import settings
+from app.core.logging_config import logger
+
+
+def _is_insert(query: str) -> bool:
+    return query.lstrip().upper().startswith("INSERT")
+
+
+class UnitOfWork:
+    """
+    يجمع عمليات الكتابة ويؤجلها حتى flush/commit
+
+    - اتصال واحد من التجمع طوال الوحدة بدلاً من اتصال لكل استعلام
+    - عبارات INSERT المتتالية بنفس النص تُدمج في INSERT متعدد الصفوف
+    - prepared=True: العبارات المفردة تُنفَّذ بـ cursor محضّر من ذاكرة الاتصال
+    - commit واحد في النهاية، أو rollback كامل عند أي خطأ
+    - فشل flush/query يُعلِّم الوحدة فاشلة: تُلغى عند الخروج حتى لو ابتُلع الاستثناء
+
+    الاستخدام:
+        with UnitOfWork() as uow:
+            ThreadRepository.create(title, uow=uow)
+            MessageRepository.create(thread_id, "user", q, uow=uow)
+    """
+
+    def __init__(self, batch_size: int = None):
+        self.batch_size = batch_size or settings.DB_BATCH_SIZE
+        self.round_trips = 0
+        self.failed = False
+        self._conn = None
+        self._pending = []  # [(query, [params, ...], prepared)]
+        self._after_commit = []
+
+    def __enter__(self):
+        # الوحدة تكتب دائماً على الرئيسي؛ القراءات بعدها في نفس الطلب تُثبَّت عليه
+        mark_write()
+        self._conn = get_pool_connection()
+        if self._conn is None:
+            raise Exception("فشل الاتصال بقاعدة البيانات")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None and not self.failed:
+                self.commit()
+            else:
+                self.rollback()
+        finally:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+        return False
+
+    def add(self, query: str, params: tuple = None, prepared: bool = False):
+        """تسجيل عملية كتابة مؤجلة"""
+        if self._pending and _is_insert(query) and self._pending[-1][0] == query:
+            self._pending[-1][1].append(params)
+        else:
+            self._pending.append((query, [params], prepared))
+
+    def add_many(self, query: str, data_list: list):
+        """تسجيل عدة صفوف لنفس العبارة"""
+        for params in data_list:
+            self.add(query, params)
+
+    def after_commit(self, fn):
+        """تنفيذ fn بعد commit ناجح فقط (تحديث الذاكرة المؤقتة مثلاً)"""
+        self._after_commit.append(fn)
+
+    def query(self, query: str, params: tuple = None, prepared: bool = False) -> list:
+        """قراءة على نفس الاتصال (ترى الكتابات غير المؤكدة لهذه الوحدة)"""
+        self.flush()
+        cursor = prepared_cursor(self._conn, query) if prepared else self._conn.cursor(dictionary=True)
+        started = time.perf_counter()
+        try:
+            cursor.execute(query, params or ())
+            self.round_trips += 1
+            rows = cursor.fetchall()
+            record_query(query, started, len(rows), params)
+            return decode_rows(rows)
+        except Exception as e:
+            self.failed = True
+            record_query(query, started, 0, params, error=e)
+            if prepared:
+                drop_prepared(self._conn, query)
+            raise
+        finally:
+            if not prepared:
+                cursor.close()
+
+    def flush(self):
+        """تنفيذ الكتابات المؤجلة داخل المعاملة الحالية بدون commit"""
+        if self.failed:
+            raise Exception("وحدة العمل فاشلة - لا كتابات بعد خطأ سابق")
+        pending, self._pending = self._pending, []
+        for query, rows, prepared in pending:
+            # الدفعات متعددة الصفوف تبقى على cursor عادي (إعادة كتابة executemany)
+            prepared = prepared and len(rows) == 1
+            cursor = prepared_cursor(self._conn, query) if prepared else self._conn.cursor()
+            params = rows[0] if len(rows) == 1 else None
+            started = time.perf_counter()
+            try:
+                if len(rows) == 1:
+                    cursor.execute(query, params or ())
+                    self.round_trips += 1
+                    record_query(query, started, cursor.rowcount, params)
+                    continue
+                # executemany يعيد كتابة INSERT كعبارة واحدة متعددة الصفوف
+                for i in range(0, len(rows), self.batch_size):
+                    started = time.perf_counter()
+                    cursor.executemany(query, rows[i:i + self.batch_size])
+                    self.round_trips += 1
+                    record_query(query, started, cursor.rowcount)
+            except Exception as e:
+                # جزء من الكتابات نُفّذ وجزء سقط: المعاملة لا تُؤكَّد بعد الآن
+                self.failed = True
+                record_query(query, started, 0, params, error=e)
+                if prepared:
+                    drop_prepared(self._conn, query)
+                raise
+            finally:
+                if not prepared:
+                    cursor.close()
+
+    def commit(self):
+        """تنفيذ كل ما تبقى وتأكيد المعاملة"""
+        self.flush()
+        self._conn.commit()
+        self.round_trips += 1
+        callbacks, self._after_commit = self._after_commit, []
+        for fn in callbacks:
+            try:
+                fn()
+            except Exception as e:
+                logger.error(f"⚠️ خطأ بعد commit: {e}")
+
+    def rollback(self):
+        """إلغاء كل الكتابات"""
+        self._pending = []
+        self._after_commit = []
+        try:
+            self._conn.rollback()
+            logger.error("❌ خطأ في وحدة العمل - تم التراجع")
+        except Error as e:
+            logger.error(f"❌ فشل التراجع: {e}")
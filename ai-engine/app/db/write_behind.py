@@ -0,0 +1,458 @@
+# app/db/write_behind.py
+"""
+الكتابة المؤجلة (Write-Behind) - سجلات الاستخدام والتقييمات ورسائل المساعد
+
+تُسجَّل الكتابة في طابور داخل العملية ويرد الطلب فوراً، وخيط خلفي يكتبها
+على دفعات (INSERT متعدد الصفوف عبر UnitOfWork) عند امتلاء الدفعة أو مرور الفاصل.
+
+- الطابور محدود (WRITE_BEHIND_MAX_ITEMS): عند امتلائه تُكتب العناصر في ملف السجل
+- فشل الدفعة (قاعدة بطيئة / متوقفة): تُنقل لملف السجل وتُعاد لاحقاً
+- الإيقاف المنظم يفرّغ الطابور؛ ما لم يُكتب يبقى في السجل ويُعاد عند التشغيل التالي
+- التسليم "مرة واحدة على الأقل": إعادة عنصر كُتب سابقاً تُتجاهل (مفتاح مكرر)
+
+العنصر = عبارة أو أكثر تُكتب دائماً في معاملة واحدة ولا تُقسَّم. الصف وعداده
+(atomic()) عنصر واحد: إعادته بعد كتابته تصطدم بالمفتاح الأساسي للصف فيُلغى
+العنصر كاملاً ولا تُضاف زيادة العداد مرتين. لذلك كل عنصر يبدأ بـ INSERT بمعرف
+يولّده العميل (new_id())
+"""
+import os
+import json
+import time
+import base64
+import atexit
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+from mysql.connector.errors import IntegrityError
+from app.db.unit_of_work import UnitOfWork
+from app.config import settings
+from app.core.logging_config import logger
+
+# MySQL: مفتاح مكرر = العنصر كُتب في محاولة سابقة
+ER_DUP_ENTRY = 1062
+
+
+def _encode(value):
+    if isinstance(value, bytes):
+        return {"$b": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat(sep=" ") if isinstance(value, datetime) else value.isoformat()
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict) and "$b" in value:
+        return base64.b64decode(value["$b"])
+    return value
+
+
+def _dump(item: tuple) -> str:
+    statements, attempts = item
+    encoded = [
+        [query, [_encode(v) for v in params] if params is not None else None]
+        for query, params in statements
+    ]
+    return json.dumps({"s": encoded, "a": attempts}, ensure_ascii=False)
+
+
+def _load(line: str) -> tuple:
+    data = json.loads(line)
+    # سطر بالصيغة السابقة (عبارة واحدة): {"q", "p", "a"}
+    raw = data["s"] if "s" in data else [[data["q"], data["p"]]]
+    statements = tuple(
+        (query, tuple(_decode(v) for v in params) if params is not None else None)
+        for query, params in raw
+    )
+    return statements, data.get("a", 0)
+
+
+def _grouped(batch: list) -> list:
+    """
+    عبارات الدفعة بترتيب مستقر حسب نصها حتى تُدمج الصفوف المتشابهة في INSERT واحد
+
+    الدفعة كلها معاملة واحدة، فإعادة الترتيب لا تفصل عبارات عنصر عن بعضها
+    """
+    groups = {}
+    for statements, _ in batch:
+        for statement in statements:
+            groups.setdefault(statement[0], []).append(statement)
+    return [statement for statements in groups.values() for statement in statements]
+
+
+class AtomicItem:
+    """عبارات عنصر واحد (واجهة UnitOfWork) - تُكتب معاً في معاملة واحدة أو لا تُكتب"""
+
+    def __init__(self):
+        self.statements = []
+
+    def add(self, query: str, params: tuple = None, prepared: bool = False):
+        self.statements.append((query, params))
+
+    def add_many(self, query: str, data_list: list):
+        for params in data_list:
+            self.add(query, params)
+
+    def query(self, query: str, params: tuple = None, prepared: bool = False):
+        raise TypeError("الكتابة المؤجلة لا تدعم القراءة - استخدم UnitOfWork")
+
+
+class WriteBehindQueue:
+    """
+    طابور كتابة مؤجلة بواجهة UnitOfWork (add / add_many)
+
+    الاستخدام:
+        MessageRepository.create(thread_id, "assistant", answer, uow=deferred())
+    """
+
+    def __init__(self, max_items: int = None, batch_size: int = None,
+                 flush_interval: float = None, journal_dir: str = None):
+        self.max_items = max_items or settings.WRITE_BEHIND_MAX_ITEMS
+        self.batch_size = batch_size or settings.WRITE_BEHIND_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.WRITE_BEHIND_FLUSH_INTERVAL
+        self.journal_dir = journal_dir or settings.WRITE_BEHIND_JOURNAL_DIR
+
+        self._items = deque()  # [((query, params), ...), attempts)]
+        self._cond = threading.Condition()
+        self._journal_lock = threading.Lock()
+        self._thread = None
+        self._running = False
+        self._last_replay = 0.0
+        self._stats = {
+            "enqueued": 0,
+            "written": 0,
+            "batches": 0,
+            "failed_batches": 0,
+            "spilled": 0,
+            "replayed": 0,
+            "duplicates": 0,
+            "dead": 0,
+            "last_flush_ms": 0.0,
+            "last_error": None,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    # ------------------------------------------------------------------
+    # واجهة UnitOfWork
+    # ------------------------------------------------------------------
+
+    def add(self, query: str, params: tuple = None, prepared: bool = False):
+        """
+        تسجيل كتابة مؤجلة (لا تنتظر قاعدة البيانات)
+
+        prepared بلا أثر هنا: الطابور يُكتب بدفعات INSERT متعددة الصفوف
+        """
+        self._enqueue((((query, params),), 0))
+
+    def add_many(self, query: str, data_list: list):
+        """تسجيل عدة صفوف لنفس العبارة"""
+        for params in data_list:
+            self.add(query, params)
+
+    @contextmanager
+    def atomic(self):
+        """
+        تجميع عدة كتابات في عنصر واحد (صف + عداده)
+
+            with write_behind.atomic() as item:
+                uow.add(...)  # عبر المستودعات: uow=item
+
+        خطأ داخل الكتلة: لا يُسجَّل شيء
+        """
+        item = AtomicItem()
+        yield item
+        if item.statements:
+            self._enqueue((tuple(item.statements), 0))
+
+    def _enqueue(self, item: tuple):
+        with self._cond:
+            if len(self._items) < self.max_items:
+                self._items.append(item)
+                self._stats["enqueued"] += 1
+                if len(self._items) >= self.batch_size:
+                    self._cond.notify()
+                return
+        # الطابور ممتلئ: السجل على القرص بدلاً من حجب الطلب أو فقدان الكتابة
+        self._spill([item])
+
+    def query(self, query: str, params: tuple = None, prepared: bool = False):
+        raise TypeError("الكتابة المؤجلة لا تدعم القراءة - استخدم UnitOfWork")
+
+    # ------------------------------------------------------------------
+    # دورة الحياة
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """تشغيل خيط الكتابة (وإعادة ما تبقى في السجل من تشغيل سابق)"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        os.makedirs(self.journal_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+        logger.info(
+            f"✅ الكتابة المؤجلة تعمل (دفعة {self.batch_size} / كل {self.flush_interval}s، "
+            f"حد الطابور {self.max_items})"
+        )
+
+    def stop(self, timeout: float = 10.0):
+        """إيقاف منظم: تفريغ الطابور، وما يفشل يُحفظ في السجل"""
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+        while True:
+            batch = self._take(self.batch_size)
+            if not batch:
+                break
+            if not self._write(batch):
+                self._spill(self._take(len(self._items)))
+                break
+        logger.info(f"🔒 تم إيقاف الكتابة المؤجلة (مكتوب: {self._stats['written']})")
+
+    def flush(self):
+        """كتابة كل ما في الطابور الآن (للسكربتات والاختبارات اليدوية)"""
+        while True:
+            batch = self._take(self.batch_size)
+            if not batch or not self._write(batch):
+                break
+
+    def _take(self, limit: int) -> list:
+        with self._cond:
+            return [self._items.popleft() for _ in range(min(limit, len(self._items)))]
+
+    def _run(self):
+        self._replay()
+        while True:
+            with self._cond:
+                if self._running and len(self._items) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                if not self._running:
+                    return
+            batch = self._take(self.batch_size)
+            if batch and not self._write(batch):
+                # القاعدة متعثرة: تخفيف الضغط قبل المحاولة التالية
+                time.sleep(self.flush_interval)
+                continue
+            if time.time() - self._last_replay >= settings.WRITE_BEHIND_REPLAY_INTERVAL:
+                self._replay()
+
+    # ------------------------------------------------------------------
+    # الكتابة
+    # ------------------------------------------------------------------
+
+    def _write(self, batch: list) -> bool:
+        """
+        كتابة دفعة في معاملة واحدة
+
+        Returns:
+            False إذا كانت القاعدة غير متاحة (الدفعة نُقلت للسجل)
+        """
+        started = time.perf_counter()
+        try:
+            with UnitOfWork(batch_size=self.batch_size) as uow:
+                for query, params in _grouped(batch):
+                    uow.add(query, params)
+        except IntegrityError:
+            # مفتاح مكرر (إعادة) أو ترتيب مراجع داخل الدفعة: عنصراً عنصراً بالترتيب الأصلي
+            return self._write_each(batch)
+        except Exception as e:
+            self._failed(batch, e)
+            return False
+
+        with self._cond:
+            self._stats["written"] += len(batch)
+            self._stats["batches"] += 1
+            self._stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return True
+
+    def _write_each(self, batch: list) -> bool:
+        for idx, item in enumerate(batch):
+            try:
+                # العنصر كاملاً في معاملته: الصف وعداده لا يُفصلان
+                with UnitOfWork() as uow:
+                    for query, params in item[0]:
+                        uow.add(query, params)
+            except IntegrityError as e:
+                if e.errno == ER_DUP_ENTRY:
+                    with self._cond:
+                        self._stats["duplicates"] += 1
+                    continue
+                # مرجع غير موجود بعد (مثلاً رسالة ما زالت في طابور عملية أخرى)
+                self._retry_later([item], e)
+                continue
+            except Exception as e:
+                self._failed(batch[idx:], e)
+                return False
+            with self._cond:
+                self._stats["written"] += 1
+        with self._cond:
+            self._stats["batches"] += 1
+        return True
+
+    def _failed(self, items: list, error: Exception):
+        with self._cond:
+            self._stats["failed_batches"] += 1
+            self._stats["last_error"] = str(error)
+        logger.error(f"❌ فشل كتابة دفعة مؤجلة ({len(items)} عنصر) - نقلها للسجل: {error}")
+        # القاعدة غير متاحة: لا تُحسب محاولة على العناصر نفسها
+        self._spill(items)
+
+    def _retry_later(self, items: list, error: Exception):
+        """إعادة لاحقاً، أو dead-*.jsonl بعد WRITE_BEHIND_MAX_ATTEMPTS محاولة"""
+        retry, dead = [], []
+        for statements, attempts in items:
+            target = dead if attempts + 1 >= settings.WRITE_BEHIND_MAX_ATTEMPTS else retry
+            target.append((statements, attempts + 1))
+        if retry:
+            self._spill(retry)
+        if dead:
+            self._append(self._path("dead"), dead)
+            with self._cond:
+                self._stats["dead"] += len(dead)
+            logger.error(f"💀 {len(dead)} كتابة مؤجلة تجاوزت المحاولات - dead-{os.getpid()}.jsonl: {error}")
+
+    # ------------------------------------------------------------------
+    # السجل على القرص (JSON Lines)
+    # ------------------------------------------------------------------
+
+    def _path(self, kind: str) -> str:
+        # ملف لكل عملية: عدة عمّال (Passenger / uvicorn --workers) يتشاركون المجلد
+        return os.path.join(self.journal_dir, f"{kind}-{os.getpid()}.jsonl")
+
+    def _append(self, path: str, items: list):
+        if not items:
+            return
+        with self._journal_lock:
+            os.makedirs(self.journal_dir, exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                for item in items:
+                    f.write(_dump(item) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _spill(self, items: list):
+        if not items:
+            return
+        try:
+            self._append(self._path("pending"), items)
+        except OSError as e:
+            logger.error(f"❌ فشل حفظ {len(items)} كتابة مؤجلة في السجل: {e}")
+            return
+        with self._cond:
+            self._stats["spilled"] += len(items)
+
+    def _claim(self, name: str):
+        """حجز ملف سجل بإعادة تسميته (ذري) حتى لا تعيده عمليتان معاً"""
+        source = os.path.join(self.journal_dir, name)
+        target = os.path.join(self.journal_dir, f"replay-{os.getpid()}-{time.time_ns()}.jsonl")
+        with self._journal_lock:
+            try:
+                os.rename(source, target)
+            except OSError:
+                return None
+        return target
+
+    def _replay(self):
+        """إعادة كتابة ما في السجل (pending-* و replay-* المتروكة)"""
+        self._last_replay = time.time()
+        try:
+            names = sorted(
+                n for n in os.listdir(self.journal_dir)
+                if n.endswith(".jsonl") and n.startswith(("pending-", "replay-"))
+            )
+        except OSError:
+            return
+        for name in names:
+            path = self._claim(name)
+            if path is None:
+                continue
+            if not self._replay_file(path):
+                return
+
+    @staticmethod
+    def _read(f, path: str):
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield _load(line)
+            except (ValueError, KeyError) as e:
+                logger.error(f"❌ سطر تالف في {path}: {e}")
+
+    def _replay_file(self, path: str) -> bool:
+        total = 0
+        with open(path, encoding="utf-8") as f:
+            items = self._read(f, path)
+            batch = []
+            for item in items:
+                batch.append(item)
+                if len(batch) < self.batch_size:
+                    continue
+                if not self._write(batch):
+                    # الدفعة الفاشلة نُقلت للسجل؛ الباقي يلحقها
+                    self._spill(list(items))
+                    os.remove(path)
+                    return False
+                total += len(batch)
+                batch = []
+            if batch and not self._write(batch):
+                os.remove(path)
+                return False
+            total += len(batch)
+        os.remove(path)
+        with self._cond:
+            self._stats["replayed"] += total
+        logger.info(f"♻️ أُعيدت كتابة {total} عنصر من السجل")
+        return True
+
+    def status(self) -> dict:
+        """عدادات الطابور (لنقطة الصحة)"""
+        try:
+            journal_bytes = sum(
+                os.path.getsize(os.path.join(self.journal_dir, n))
+                for n in os.listdir(self.journal_dir)
+                if n.startswith(("pending-", "replay-"))
+            )
+        except OSError:
+            journal_bytes = 0
+        with self._cond:
+            return {
+                "running": self._running,
+                "depth": len(self._items),
+                "max_items": self.max_items,
+                "batch_size": self.batch_size,
+                "flush_interval": self.flush_interval,
+                "journal_bytes": journal_bytes,
+                **self._stats,
+            }
+
+
+write_behind = WriteBehindQueue()
+
+
+def deferred():
+    """
+    هدف الكتابة المؤجلة لتمريره كـ uow= للمستودعات
+
+    None (كتابة متزامنة عادية) إذا كانت الكتابة المؤجلة معطلة
+    """
+    if not settings.WRITE_BEHIND_ENABLED:
+        return None
+    if not write_behind.running:
+        # التشغيل عند أول استخدام: Passenger لا يمر دائماً بحدث startup
+        write_behind.start()
+    return write_behind
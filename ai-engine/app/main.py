@@ -6,8 +6,16 @@ RAG System API - نقطة البداية الرئيسية
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.core.logging_config import logger
 from app.db.base import init_pool, close_pool
+from app.db.pool import PoolTimeoutError
+from app.db.write_behind import write_behind
+from app.core.admission import AdmissionMiddleware
+from app.core.request_scope import DBRequestScopeMiddleware
+from app.utils.extraction_pool import extraction_pool
+from app.background.runner import job_runner
+from app.config import settings
 
 # إنشاء تطبيق FastAPI
 app = FastAPI(
@@ -18,7 +26,14 @@ app = FastAPI(
     redoc_url="/redoc",
 )
 
-# إعداد CORS
+# توجيه القراءة/الكتابة + عدّاد استعلامات الطلب (read-your-writes / N+1)
+app.add_middleware(DBRequestScopeMiddleware)
+
+
+# حد التزامن لكل فئة (chat / upload / admin): 429/503 سريع مع Retry-After بدلاً من التكدس
+app.add_middleware(AdmissionMiddleware)
+
+# إعداد CORS - يُضاف أخيراً ليبقى الطبقة الخارجية، فتحمل ردود 429/503 من القبول ترويساته
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -27,6 +42,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+# التجمع ممتلئ: رد سريع بدلاً من انتظار مفتوح
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(request, exc):
+    return JSONResponse(
+        status_code=503,
+        content={"status": "error", "detail": "الخادم مشغول، حاول مرة أخرى"},
+        headers={"Retry-After": "1"},
+    )
+
+
 # تسجيل كل الـ routers
 try:
     from app.api.v1.router import api_v1_router
@@ -54,6 +80,7 @@ def root():
             "files": "/api/v1/files",
             "knowledge": "/api/v1/knowledge-bases",
             "feedback": "/api/v1/feedback",
+            "ingest_jobs": "GET /api/v1/ingest-jobs/{id}",
             "questions": "/api/v1/questions",
         },
     }
@@ -78,7 +105,15 @@ async def startup_event():
     if pool_ok:
         logger.info("✅ تجمع قاعدة البيانات جاهز")
     else:
-        logger.warning("⚠️ فشل تهيئة تجمع قاعدة البيانات - سيستخدم اتصال مباشر")
+        logger.warning("⚠️ فشل تهيئة تجمع قاعدة البيانات - سيُعاد الاتصال عند أول طلب")
+
+    # خيط الكتابة المؤجلة (يعيد أيضاً ما تبقى في السجل من تشغيل سابق)
+    if settings.WRITE_BEHIND_ENABLED:
+        write_behind.start()
+
+    # عمّال المهام الخلفية (يستأنفون ما بقي في ai_jobs)
+    if settings.JOBS_ENABLED:
+        job_runner.start()
 
     logger.info("📖 API Docs: /docs")
     logger.info("🔍 Health: /api/v1/health")
@@ -90,5 +125,9 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """تنظيف عند الإيقاف"""
+    # إنهاء المهام الجارية ثم تفريغ الكتابات المؤجلة قبل إغلاق التجمع
+    job_runner.stop()
+    extraction_pool.shutdown()
+    write_behind.stop()
     close_pool()
     logger.info("🛑 تم إيقاف AI RAG System")
\ No newline at end of file
@@ -2,9 +2,13 @@
 """
 مستودع قطع المستندات (Document Chunks)
 """
-import uuid
 import json
-from app.db.session import execute_query, execute_many
+from app.db.session import execute_query, execute_many, stream_query
+from app.db.ids import new_id, db_id
+from app.db.unit_of_work import UnitOfWork
+from app.db.sqlite_backend import is_sqlite, fts_match, FTS_MIN_TERM
+from app.utils.text_processing import normalize_arabic
+from app.repositories.counter_repo import CounterRepository
 
 
 class ChunkRepository:
@@ -12,39 +16,57 @@ class ChunkRepository:
     @staticmethod
     def create(document_id: str, chunk_index: int, content: str,
                language: str = "ar", token_count: int = None,
-               metadata: dict = None) -> str:
+               metadata: dict = None, uow=None) -> str:
         """إنشاء قطعة جديدة"""
-        chunk_id = str(uuid.uuid4())
+        if uow is None:
+            with UnitOfWork() as uow:
+                return ChunkRepository.create(
+                    document_id, chunk_index, content, language, token_count, metadata, uow=uow
+                )
+
+        chunk_id = new_id()
         meta_json = json.dumps(metadata or {}, ensure_ascii=False)
         execute_query(
             """INSERT INTO ai_document_chunks 
                (id, document_id, chunk_index, content, language, token_count, metadata)
                VALUES (%s, %s, %s, %s, %s, %s, %s)""",
-            (chunk_id, document_id, chunk_index, content, language, token_count, meta_json),
-            fetch=False
+            (db_id(chunk_id), document_id, chunk_index, content, language, token_count, meta_json),
+            fetch=False,
+            uow=uow
         )
+        CounterRepository.increment({CounterRepository.CHUNKS: (1, 0)}, uow=uow)
         return chunk_id
 
     @staticmethod
-    def bulk_create(chunks: list):
+    def bulk_create(chunks: list, uow=None):
         """إنشاء عدة قطع دفعة واحدة"""
+        if not chunks:
+            return 0
+        if uow is None:
+            with UnitOfWork() as uow:
+                return ChunkRepository.bulk_create(chunks, uow=uow)
+
         query = """INSERT INTO ai_document_chunks 
                    (id, document_id, chunk_index, content, language, token_count, metadata)
                    VALUES (%s, %s, %s, %s, %s, %s, %s)"""
         data = [
             (
-                str(uuid.uuid4()),
+                db_id(new_id()),
                 c["document_id"], c["chunk_index"], c["content"],
                 c.get("language", "ar"), c.get("token_count", 0),
                 json.dumps(c.get("metadata", {}), ensure_ascii=False)
             )
             for c in chunks
         ]
-        return execute_many(query, data)
+        created = execute_many(query, data, uow=uow)
+        CounterRepository.increment({CounterRepository.CHUNKS: (len(data), 0)}, uow=uow)
+        return created
 
     @staticmethod
     def search_by_content(query_text: str, limit: int = 10) -> list:
         """بحث في محتوى القطع"""
+        if is_sqlite():
+            return ChunkRepository.fulltext_search([query_text], limit)
         return execute_query(
             """SELECT id, document_id, chunk_index, content, language, token_count
                FROM ai_document_chunks 
@@ -64,6 +86,16 @@ class ChunkRepository:
             (limit,)
         ) or []
 
+    @staticmethod
+    def stream_all(batch_size: int = None):
+        """المرور على كل القطع بدون تحميلها في الذاكرة (للفهرسة وإعادة التقطيع والتصدير)"""
+        return stream_query(
+            """SELECT id, document_id, chunk_index, content, language, token_count, created_at
+               FROM ai_document_chunks
+               ORDER BY document_id, chunk_index""",
+            batch_size=batch_size
+        )
+
     @staticmethod
     def get_by_document(document_id: str) -> list:
         """جلب قطع مستند"""
@@ -79,30 +111,47 @@ class ChunkRepository:
         """جلب قطعة"""
         results = execute_query(
             "SELECT * FROM ai_document_chunks WHERE id = %s",
-            (chunk_id,)
+            (db_id(chunk_id),)
         )
         return results[0] if results else None
 
     @staticmethod
-    def delete_by_document(document_id: str):
-        """حذف كل قطع مستند"""
+    def delete_by_document(document_id: str, uow=None) -> int:
+        """حذف كل قطع مستند (يعيد عدد المحذوف)"""
+        if uow is None:
+            with UnitOfWork() as uow:
+                return ChunkRepository.delete_by_document(document_id, uow=uow)
+
+        # عدّ قطع المستند فقط (فهرس document_id) مع قفلها حتى الحذف
+        result = execute_query(
+            "SELECT COUNT(*) as total FROM ai_document_chunks WHERE document_id = %s FOR UPDATE",
+            (document_id,),
+            uow=uow
+        )
+        total = result[0]["total"] if result else 0
+        if not total:
+            return 0
         execute_query(
             "DELETE FROM ai_document_chunks WHERE document_id = %s",
             (document_id,),
-            fetch=False
+            fetch=False,
+            uow=uow
         )
+        CounterRepository.increment({CounterRepository.CHUNKS: (-total, 0)}, uow=uow)
+        return total
 
     @staticmethod
     def count() -> int:
-        """عدد القطع الكلي"""
-        result = execute_query("SELECT COUNT(*) as total FROM ai_document_chunks")
-        return result[0]["total"] if result else 0
+        """عدد القطع الكلي (من جدول العدادات)"""
+        return CounterRepository.count(CounterRepository.CHUNKS)
 
     @staticmethod
     def fulltext_search(keywords: list, limit: int = 10) -> list:
         """بحث بكلمات متعددة"""
         if not keywords:
             return []
+        if is_sqlite():
+            return ChunkRepository._fts_search(keywords, limit)
         conditions = " OR ".join(["content LIKE %s" for _ in keywords])
         params = tuple(f"%{kw}%" for kw in keywords)
         params += (limit,)
@@ -113,3 +162,47 @@ class ChunkRepository:
                 LIMIT %s""",
             params
         ) or []
+
+    @staticmethod
+    def optimize_index(pages: int = 200) -> bool:
+        """
+        صيانة فهرس البحث بعد إدخال دفعة قطع
+
+        SQLite: دمج تدريجي لأجزاء FTS5 (المحفزات تضيف جزءاً لكل معاملة)، بحد pages صفحة.
+        MySQL: البحث بـ LIKE بدون فهرس نصي - لا شيء للصيانة (False)
+        """
+        if not is_sqlite():
+            return False
+        execute_query(
+            "INSERT INTO ai_document_chunks_fts (ai_document_chunks_fts, rank) VALUES ('merge', %s)",
+            (pages,),
+            fetch=False
+        )
+        return True
+
+    @staticmethod
+    def _fts_search(keywords: list, limit: int) -> list:
+        """
+        SQLite: نفس نتيجة LIKE '%كلمة%' عبر فهرس FTS5 (trigram)
+
+        الكلمات الأقصر من FTS_MIN_TERM لا يغطيها trigram فتبقى LIKE
+        """
+        conditions, params = [], []
+        match = fts_match(keywords)
+        if match:
+            conditions.append(
+                "rowid IN (SELECT rowid FROM ai_document_chunks_fts "
+                "WHERE ai_document_chunks_fts MATCH %s)"
+            )
+            params.append(match)
+        for kw in keywords:
+            if len(kw) < FTS_MIN_TERM:
+                conditions.append("ar_normalize(content) LIKE %s")
+                params.append(f"%{normalize_arabic(kw)}%")
+        return execute_query(
+            f"""SELECT id, document_id, chunk_index, content, language, token_count
+                FROM ai_document_chunks
+                WHERE {" OR ".join(conditions)}
+                LIMIT %s""",
+            tuple(params) + (limit,)
+        ) or []
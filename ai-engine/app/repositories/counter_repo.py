@@ -0,0 +1,107 @@
+# app/repositories/counter_repo.py
+"""
+مستودع العدادات (Stat Counters) - إحصائيات O(1) بدلاً من COUNT/AVG/SUM
+
+كل عداد = (عدد، مجموع) مقسّم على DB_COUNTER_SLOTS خانة:
+الكتابة تزيد خانة عشوائية داخل نفس معاملة الكتابة الأصلية،
+والقراءة تجمع الخانات (بضعة صفوف بالمفتاح الأساسي مهما كبر الجدول)
+"""
+import random
+from app.db.session import execute_query
+from app.db.unit_of_work import UnitOfWork
+from app.config import settings
+
+
+class CounterRepository:
+
+    THREADS = "threads"
+    CHUNKS = "chunks"
+    FEEDBACK_RATING = "feedback.rating"
+    USAGE_INPUT = "usage.tokens_input"
+    USAGE_OUTPUT = "usage.tokens_output"
+    USAGE_COST = "usage.cost_usd"
+
+    # (الاسم، استعلام القيمة الحقيقية) - لإعادة البناء عند الانحراف
+    SOURCES = {
+        THREADS: "SELECT COUNT(*) AS c, 0 AS t FROM ai_threads",
+        CHUNKS: "SELECT COUNT(*) AS c, 0 AS t FROM ai_document_chunks",
+        FEEDBACK_RATING: "SELECT COUNT(rating) AS c, COALESCE(SUM(rating), 0) AS t FROM ai_feedback",
+        USAGE_INPUT: "SELECT COUNT(*) AS c, COALESCE(SUM(tokens_input), 0) AS t FROM ai_usage_logs",
+        USAGE_OUTPUT: "SELECT COUNT(*) AS c, COALESCE(SUM(tokens_output), 0) AS t FROM ai_usage_logs",
+        USAGE_COST: "SELECT COUNT(*) AS c, COALESCE(SUM(cost_usd), 0) AS t FROM ai_usage_logs",
+    }
+
+    @staticmethod
+    def increment(deltas: dict, uow=None):
+        """
+        زيادة/إنقاص عدة عدادات في عبارة واحدة
+
+        Args:
+            deltas: {الاسم: (فرق العدد، فرق المجموع)}
+            uow: وحدة العمل التي تحتوي الكتابة الأصلية (نفس المعاملة)
+        """
+        if not deltas:
+            return
+        slot = random.randrange(max(settings.DB_COUNTER_SLOTS, 1))
+        # ترتيب ثابت للأقفال بين المعاملات المتزامنة (تجنب deadlock)
+        names = sorted(deltas)
+        params = []
+        for name in names:
+            count, total = deltas[name]
+            params.extend((name, slot, count, total))
+        execute_query(
+            f"""INSERT INTO ai_stat_counters (name, slot, count, total)
+                VALUES {", ".join(["(%s, %s, %s, %s)"] * len(names))}
+                ON DUPLICATE KEY UPDATE
+                    count = count + VALUES(count),
+                    total = total + VALUES(total)""",
+            tuple(params),
+            fetch=False,
+            uow=uow
+        )
+
+    @staticmethod
+    def get(*names) -> dict:
+        """قيم العدادات -> {الاسم: {"count": int, "total": float}}"""
+        result = {name: {"count": 0, "total": 0.0} for name in names}
+        rows = execute_query(
+            f"""SELECT name, SUM(count) AS count, SUM(total) AS total
+                FROM ai_stat_counters
+                WHERE name IN ({", ".join(["%s"] * len(names))})
+                GROUP BY name""",
+            names
+        ) or []
+        for row in rows:
+            result[row["name"]] = {
+                "count": int(row["count"] or 0),
+                "total": float(row["total"] or 0),
+            }
+        return result
+
+    @staticmethod
+    def count(name: str) -> int:
+        """عدد عداد واحد"""
+        return CounterRepository.get(name)[name]["count"]
+
+    @staticmethod
+    def average(name: str) -> float:
+        """المتوسط = المجموع / العدد"""
+        value = CounterRepository.get(name)[name]
+        return value["total"] / value["count"] if value["count"] else 0.0
+
+    @staticmethod
+    def rebuild():
+        """
+        إعادة حساب كل العدادات من الجداول
+
+        لإصلاح الانحراف بعد حذف متتالي (FK CASCADE) أو تعديل يدوي - عملية صيانة
+        تمسح الجداول كاملة، تُشغَّل عبر: python -m app.db.rebuild_counters
+        """
+        with UnitOfWork() as uow:
+            uow.add("DELETE FROM ai_stat_counters")
+            for name, source in CounterRepository.SOURCES.items():
+                uow.add(
+                    f"""INSERT INTO ai_stat_counters (name, slot, count, total)
+                        SELECT %s, 0, src.c, src.t FROM ({source}) AS src""",
+                    (name,)
+                )
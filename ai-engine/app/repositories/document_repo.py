@@ -2,9 +2,11 @@
 """
 مستودع المستندات (Documents)
 """
-import uuid
 import json
 from app.db.session import execute_query
+from app.db.ids import new_id, db_id
+from app.db.unit_of_work import UnitOfWork
+from app.repositories.chunk_repo import ChunkRepository
 
 
 class DocumentRepository:
@@ -12,16 +14,17 @@ class DocumentRepository:
     @staticmethod
     def create(knowledge_base_id: str, title: str = None,
                file_id: str = None, source_url: str = None,
-               language: str = "ar", metadata: dict = None) -> str:
+               language: str = "ar", metadata: dict = None, uow=None) -> str:
         """إنشاء مستند"""
-        doc_id = str(uuid.uuid4())
+        doc_id = new_id()
         execute_query(
             """INSERT INTO ai_documents 
                (id, knowledge_base_id, file_id, title, source_url, language, metadata)
                VALUES (%s, %s, %s, %s, %s, %s, %s)""",
-            (doc_id, knowledge_base_id, file_id, title, source_url,
+            (doc_id, knowledge_base_id, db_id(file_id), title, source_url,
              language, json.dumps(metadata or {}, ensure_ascii=False)),
-            fetch=False
+            fetch=False,
+            uow=uow
         )
         return doc_id
 
@@ -44,12 +47,15 @@ class DocumentRepository:
 
     @staticmethod
     def delete(doc_id: str):
-        """حذف مستند"""
-        execute_query(
-            "DELETE FROM ai_documents WHERE id = %s",
-            (doc_id,),
-            fetch=False
-        )
+        """حذف مستند مع قطعه (وتحديث عداد القطع في نفس المعاملة)"""
+        with UnitOfWork() as uow:
+            ChunkRepository.delete_by_document(doc_id, uow=uow)
+            execute_query(
+                "DELETE FROM ai_documents WHERE id = %s",
+                (doc_id,),
+                fetch=False,
+                uow=uow
+            )
 
     @staticmethod
     def count() -> int:
@@ -2,20 +2,36 @@
 """
 مستودع التقييمات (Feedback)
 """
-import uuid
 from app.db.session import execute_query
+from app.db.ids import new_id, db_id
+from app.db.unit_of_work import UnitOfWork
+from app.db.write_behind import WriteBehindQueue
+from app.repositories.counter_repo import CounterRepository
+from app.utils.pagination import keyset_condition, build_page
 
 
 class FeedbackRepository:
 
     @staticmethod
-    def create(message_id: str, rating: int, comment: str = None) -> str:
-        """إنشاء تقييم"""
-        feedback_id = str(uuid.uuid4())
+    def create(message_id: str, rating: int, comment: str = None, uow=None) -> str:
+        """إنشاء تقييم (مع عداد التقييمات في نفس المعاملة)"""
+        if uow is None:
+            with UnitOfWork() as uow:
+                return FeedbackRepository.create(message_id, rating, comment, uow=uow)
+        if isinstance(uow, WriteBehindQueue):
+            # التقييم وعداده عنصر واحد في الطابور (معاملة واحدة عند الكتابة والإعادة)
+            with uow.atomic() as item:
+                return FeedbackRepository.create(message_id, rating, comment, uow=item)
+
+        feedback_id = new_id()
         execute_query(
             "INSERT INTO ai_feedback (id, message_id, rating, comment) VALUES (%s, %s, %s, %s)",
-            (feedback_id, message_id, rating, comment),
-            fetch=False
+            (db_id(feedback_id), db_id(message_id), rating, comment),
+            fetch=False,
+            uow=uow
+        )
+        CounterRepository.increment(
+            {CounterRepository.FEEDBACK_RATING: (1, float(rating))}, uow=uow
         )
         return feedback_id
 
@@ -24,19 +40,28 @@ class FeedbackRepository:
         """جلب تقييمات رسالة"""
         return execute_query(
             "SELECT * FROM ai_feedback WHERE message_id = %s ORDER BY created_at DESC",
-            (message_id,)
+            (db_id(message_id),)
         ) or []
 
     @staticmethod
     def get_average_rating() -> float:
-        """متوسط التقييمات"""
-        result = execute_query("SELECT AVG(rating) as avg_rating FROM ai_feedback")
-        return float(result[0]["avg_rating"]) if result and result[0]["avg_rating"] else 0.0
+        """متوسط التقييمات (من جدول العدادات)"""
+        return CounterRepository.average(CounterRepository.FEEDBACK_RATING)
 
     @staticmethod
-    def list_all(limit: int = 50) -> list:
-        """جلب كل التقييمات"""
-        return execute_query(
-            "SELECT * FROM ai_feedback ORDER BY created_at DESC LIMIT %s",
-            (limit,)
+    def list_all(limit: int = 50, cursor: str = None) -> list:
+        """جلب صفحة من التقييمات (cursor من list_page)"""
+        return FeedbackRepository.list_page(limit, cursor)[0]
+
+    @staticmethod
+    def list_page(limit: int = 50, cursor: str = None) -> tuple:
+        """صفحة من التقييمات -> (التقييمات، next_cursor أو None)"""
+        condition, params = keyset_condition("created_at", cursor)
+        rows = execute_query(
+            f"""SELECT * FROM ai_feedback
+               {"WHERE " + condition if condition else ""}
+               ORDER BY created_at DESC, id DESC
+               LIMIT %s""",
+            params + (limit + 1,)
         ) or []
+        return build_page(rows, limit, "created_at")
@@ -2,9 +2,10 @@
 """
 مستودع الملفات (Files)
 """
-import uuid
 import json
 from app.db.session import execute_query
+from app.db.ids import new_id, db_id
+from app.utils.pagination import keyset_condition, build_page
 
 
 class FileRepository:
@@ -12,21 +13,22 @@ class FileRepository:
     @staticmethod
     def create(filename: str, mime_type: str = None, file_size: int = None,
                file_path: str = None, extracted_text: str = None,
-               structured_data: dict = None, embedding_model: str = None) -> str:
+               structured_data: dict = None, embedding_model: str = None, uow=None) -> str:
         """إنشاء سجل ملف"""
-        file_id = str(uuid.uuid4())
+        file_id = new_id()
         execute_query(
             """INSERT INTO ai_files 
                (id, filename, mime_type, file_size, file_path, 
                 extracted_text, structured_data, embedding_model)
                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
             (
-                file_id, filename, mime_type, file_size, file_path,
+                db_id(file_id), filename, mime_type, file_size, file_path,
                 extracted_text,
                 json.dumps(structured_data or {}, ensure_ascii=False),
                 embedding_model
             ),
-            fetch=False
+            fetch=False,
+            uow=uow
         )
         return file_id
 
@@ -35,24 +37,34 @@ class FileRepository:
         """جلب ملف"""
         results = execute_query(
             "SELECT * FROM ai_files WHERE id = %s",
-            (file_id,)
+            (db_id(file_id),)
         )
         return results[0] if results else None
 
     @staticmethod
-    def list_all(limit: int = 20) -> list:
-        """جلب كل الملفات"""
-        return execute_query(
-            "SELECT id, filename, mime_type, file_size, created_at FROM ai_files ORDER BY created_at DESC LIMIT %s",
-            (limit,)
+    def list_all(limit: int = 20, cursor: str = None) -> list:
+        """جلب صفحة من الملفات (cursor من list_page)"""
+        return FileRepository.list_page(limit, cursor)[0]
+
+    @staticmethod
+    def list_page(limit: int = 20, cursor: str = None) -> tuple:
+        """صفحة من الملفات -> (الملفات، next_cursor أو None)"""
+        condition, params = keyset_condition("created_at", cursor)
+        rows = execute_query(
+            f"""SELECT id, filename, mime_type, file_size, created_at FROM ai_files
+               {"WHERE " + condition if condition else ""}
+               ORDER BY created_at DESC, id DESC
+               LIMIT %s""",
+            params + (limit + 1,)
         ) or []
+        return build_page(rows, limit, "created_at")
 
     @staticmethod
     def update_extracted_text(file_id: str, text: str):
         """تحديث النص المستخرج"""
         execute_query(
             "UPDATE ai_files SET extracted_text = %s WHERE id = %s",
-            (text, file_id),
+            (text, db_id(file_id)),
             fetch=False
         )
 
@@ -61,15 +73,16 @@ class FileRepository:
         """حذف ملف"""
         execute_query(
             "DELETE FROM ai_files WHERE id = %s",
-            (file_id,),
+            (db_id(file_id),),
             fetch=False
         )
 
     @staticmethod
-    def link_to_message(message_id: str, file_id: str):
+    def link_to_message(message_id: str, file_id: str, uow=None):
         """ربط ملف برسالة"""
         execute_query(
             "INSERT IGNORE INTO ai_message_files (message_id, file_id) VALUES (%s, %s)",
-            (message_id, file_id),
-            fetch=False
+            (db_id(message_id), db_id(file_id)),
+            fetch=False,
+            uow=uow
         )
@@ -0,0 +1,205 @@
+# app/repositories/job_repo.py
+"""
+مستودع المهام الخلفية (ai_jobs) - طابور دائم في قاعدة البيانات
+
+الحالات: queued -> running -> done
+                           -> queued (إعادة بعد فشل) -> ... -> dead
+
+locked_at = آخر نبض للمهمة الجارية (الحجز، حفظ التقدم، نبض العامل الدوري)؛
+running بلا نبض حديث = عامل توقف، وتُحسب محاولته كأي فشل
+"""
+import json
+from datetime import datetime, timedelta
+from app.db.session import execute_query
+from app.db.ids import new_id
+from app.db.unit_of_work import UnitOfWork
+
+
+class JobRepository:
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    DEAD = "dead"
+
+    @staticmethod
+    def create(queue: str, task: str, payload: dict, max_attempts: int,
+               delay: float = 0, uow=None) -> str:
+        """
+        إضافة مهمة
+
+        مع uow: المهمة تُحفظ في نفس معاملة الكتابة التي أنشأتها
+        (لا مهمة لكتابة تراجعت، ولا كتابة بدون مهمتها)
+        """
+        job_id = new_id()
+        execute_query(
+            """INSERT INTO ai_jobs (id, queue, task, payload, status, max_attempts, run_after)
+               VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+            (
+                job_id, queue, task,
+                json.dumps(payload or {}, ensure_ascii=False, default=str),
+                JobRepository.QUEUED, max_attempts,
+                datetime.now() + timedelta(seconds=delay),
+            ),
+            fetch=False,
+            uow=uow
+        )
+        return job_id
+
+    @staticmethod
+    def claim(queue: str, worker: str, limit: int = 1) -> list:
+        """
+        حجز مهام جاهزة من طابور (SKIP LOCKED: العمّال لا ينتظرون بعضهم)
+
+        Returns:
+            المهام المحجوزة (status=running، attempts بعد الزيادة)
+        """
+        now = datetime.now()
+        with UnitOfWork() as uow:
+            rows = execute_query(
+                """SELECT id FROM ai_jobs
+                   WHERE queue = %s AND status = %s AND run_after <= %s
+                   ORDER BY run_after, id
+                   LIMIT %s
+                   FOR UPDATE SKIP LOCKED""",
+                (queue, JobRepository.QUEUED, now, limit),
+                uow=uow
+            ) or []
+            if not rows:
+                return []
+            ids = tuple(r["id"] for r in rows)
+            marks = ", ".join(["%s"] * len(ids))
+            execute_query(
+                f"""UPDATE ai_jobs
+                    SET status = %s, locked_by = %s, locked_at = %s, attempts = attempts + 1
+                    WHERE id IN ({marks})""",
+                (JobRepository.RUNNING, worker, now) + ids,
+                fetch=False,
+                uow=uow
+            )
+            jobs = execute_query(f"SELECT * FROM ai_jobs WHERE id IN ({marks})", ids, uow=uow)
+        for job in jobs:
+            job["payload"] = json.loads(job["payload"]) if job.get("payload") else {}
+            job["progress"] = json.loads(job["progress"]) if job.get("progress") else {}
+        return jobs
+
+    @staticmethod
+    def update_progress(job_id: str, progress: dict, uow=None):
+        """
+        حفظ تقدم مهمة متعددة المراحل
+
+        مع uow: التقدم يُؤكَّد مع كتابات المرحلة نفسها (لا تُعاد مرحلة مكتملة)
+        حفظ التقدم نبض أيضاً: يمدد locked_at
+        """
+        execute_query(
+            "UPDATE ai_jobs SET progress = %s, locked_at = %s WHERE id = %s",
+            (json.dumps(progress, ensure_ascii=False, default=str), datetime.now(), job_id),
+            fetch=False,
+            uow=uow
+        )
+
+    @staticmethod
+    def complete(job_id: str, result: dict = None):
+        """إنهاء مهمة بنجاح"""
+        execute_query(
+            """UPDATE ai_jobs
+               SET status = %s, result = %s, last_error = NULL, locked_by = NULL, finished_at = %s
+               WHERE id = %s""",
+            (
+                JobRepository.DONE,
+                json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+                datetime.now(), job_id,
+            ),
+            fetch=False
+        )
+
+    @staticmethod
+    def fail(job_id: str, error: str, retry_in: float = None):
+        """تسجيل فشل: إعادة بعد retry_in ثانية، أو dead إذا None"""
+        if retry_in is None:
+            execute_query(
+                """UPDATE ai_jobs
+                   SET status = %s, last_error = %s, locked_by = NULL, finished_at = %s
+                   WHERE id = %s""",
+                (JobRepository.DEAD, error[:2000], datetime.now(), job_id),
+                fetch=False
+            )
+            return
+        execute_query(
+            """UPDATE ai_jobs
+               SET status = %s, last_error = %s, locked_by = NULL, run_after = %s
+               WHERE id = %s""",
+            (JobRepository.QUEUED, error[:2000], datetime.now() + timedelta(seconds=retry_in), job_id),
+            fetch=False
+        )
+
+    @staticmethod
+    def heartbeat(job_ids: list) -> int:
+        """تمديد locked_at لمهام ما زالت تُنفَّذ (لا تُعد معلّقة مهما طالت)"""
+        if not job_ids:
+            return 0
+        marks = ", ".join(["%s"] * len(job_ids))
+        return execute_query(
+            f"UPDATE ai_jobs SET locked_at = %s WHERE status = %s AND id IN ({marks})",
+            (datetime.now(), JobRepository.RUNNING) + tuple(job_ids),
+            fetch=False
+        ) or 0
+
+    @staticmethod
+    def requeue_stale(older_than_seconds: float) -> tuple:
+        """
+        مهام running بلا نبض منذ older_than_seconds (عامل انهار / أُعيد تشغيله)
+
+        المحاولة حُسبت عند الحجز (attempts + 1)، فالمهمة التي استنفدت max_attempts
+        تصبح dead بدلاً من أن تُعاد بلا نهاية (مهمة تُسقط عاملها في كل مرة)
+
+        Returns:
+            (عدد المُعادة للطابور، عدد dead)
+        """
+        cutoff = datetime.now() - timedelta(seconds=older_than_seconds)
+        error = "توقف العامل أثناء التنفيذ (لا نبض)"
+        dead = execute_query(
+            """UPDATE ai_jobs
+               SET status = %s, locked_by = NULL, last_error = %s, finished_at = %s
+               WHERE status = %s AND locked_at < %s AND attempts >= max_attempts""",
+            (JobRepository.DEAD, error, datetime.now(), JobRepository.RUNNING, cutoff),
+            fetch=False
+        ) or 0
+        requeued = execute_query(
+            """UPDATE ai_jobs SET status = %s, locked_by = NULL, last_error = %s
+               WHERE status = %s AND locked_at < %s""",
+            (JobRepository.QUEUED, error, JobRepository.RUNNING, cutoff),
+            fetch=False
+        ) or 0
+        return requeued, dead
+
+    @staticmethod
+    def purge_finished(older_than_hours: float) -> int:
+        """حذف المهام المنتهية بنجاح الأقدم من المدة"""
+        return execute_query(
+            "DELETE FROM ai_jobs WHERE status = %s AND finished_at < %s",
+            (JobRepository.DONE, datetime.now() - timedelta(hours=older_than_hours)),
+            fetch=False
+        ) or 0
+
+    @staticmethod
+    def get_by_id(job_id: str) -> dict:
+        """جلب مهمة (مع payload / result كقواميس)"""
+        results = execute_query("SELECT * FROM ai_jobs WHERE id = %s", (job_id,))
+        if not results:
+            return None
+        job = results[0]
+        for key in ("payload", "result", "progress"):
+            if isinstance(job.get(key), str):
+                try:
+                    job[key] = json.loads(job[key])
+                except ValueError:
+                    pass
+        return job
+
+    @staticmethod
+    def counts() -> list:
+        """عدد المهام لكل (طابور، حالة)"""
+        return execute_query(
+            "SELECT queue, status, COUNT(*) AS total FROM ai_jobs GROUP BY queue, status"
+        ) or []
@@ -2,9 +2,9 @@
 """
 مستودع قواعد المعرفة (Knowledge Bases)
 """
-import uuid
 import json
 from app.db.session import execute_query
+from app.db.ids import new_id
 
 
 class KnowledgeBaseRepository:
@@ -13,7 +13,7 @@ class KnowledgeBaseRepository:
     def create(name: str, description: str = None,
                is_public: bool = False, metadata: dict = None) -> str:
         """إنشاء قاعدة معرفة"""
-        kb_id = str(uuid.uuid4())
+        kb_id = new_id()
         execute_query(
             """INSERT INTO ai_knowledge_bases (id, name, description, is_public, metadata)
                VALUES (%s, %s, %s, %s, %s)""",
@@ -3,54 +3,89 @@
 مستودع الذاكرة (Thread Memory)
 """
 import json
+from datetime import datetime
 from app.db.session import execute_query
+from app.db.cache import memory_cache, on_commit
+from app.db.ids import db_id
 
 
 class MemoryRepository:
 
     @staticmethod
-    def get(thread_id: str) -> dict:
-        """جلب ذاكرة محادثة"""
+    def get(thread_id: str, uow=None, for_update: bool = False) -> dict:
+        """
+        جلب ذاكرة محادثة
+
+        for_update (داخل uow): قفل الصف حتى commit - تحديثان متزامنان لنفس
+        المحادثة لا يطويان نفس الرسائل مرتين (يتجاوز الذاكرة المؤقتة)
+        """
+        if not for_update:
+            cached = memory_cache.get(thread_id)
+            if cached is not None:
+                return cached
+        query = "SELECT * FROM ai_thread_memory WHERE thread_id = %s"
+        if for_update:
+            query += " FOR UPDATE"
         results = execute_query(
-            "SELECT * FROM ai_thread_memory WHERE thread_id = %s",
-            (thread_id,)
+            query,
+            (db_id(thread_id),),
+            uow=uow,
+            prepared=not for_update
         )
         if results and results[0]:
             row = results[0]
-            if isinstance(row.get("key_facts"), str):
-                try:
-                    row["key_facts"] = json.loads(row["key_facts"])
-                except (json.JSONDecodeError, TypeError):
-                    row["key_facts"] = []
+            for key in ("key_facts", "topics"):
+                if isinstance(row.get(key), str):
+                    try:
+                        row[key] = json.loads(row[key])
+                    except (json.JSONDecodeError, TypeError):
+                        row[key] = []
+            if not for_update:
+                memory_cache.set(thread_id, row)
+                return dict(row)
             return row
         return None
 
     @staticmethod
-    def upsert(thread_id: str, summary: str, key_facts: list = None):
-        """إنشاء أو تحديث ذاكرة المحادثة"""
-        facts_json = json.dumps(key_facts or [], ensure_ascii=False)
-        existing = MemoryRepository.get(thread_id)
-        if existing:
-            execute_query(
-                """UPDATE ai_thread_memory 
-                   SET summary = %s, key_facts = %s 
-                   WHERE thread_id = %s""",
-                (summary, facts_json, thread_id),
-                fetch=False
-            )
-        else:
-            execute_query(
-                """INSERT INTO ai_thread_memory (thread_id, summary, key_facts) 
-                   VALUES (%s, %s, %s)""",
-                (thread_id, summary, facts_json),
-                fetch=False
-            )
+    def upsert(thread_id: str, summary: str, key_facts: list = None, topics: list = None,
+               message_count: int = 0, last_message_at=None, last_message_id: str = None,
+               uow=None):
+        """إنشاء أو تحديث ذاكرة المحادثة (عبارة واحدة بدون قراءة مسبقة)"""
+        execute_query(
+            """INSERT INTO ai_thread_memory
+               (thread_id, summary, key_facts, topics, message_count,
+                last_message_at, last_message_id)
+               VALUES (%s, %s, %s, %s, %s, %s, %s)
+               ON DUPLICATE KEY UPDATE
+                   summary = VALUES(summary),
+                   key_facts = VALUES(key_facts),
+                   topics = VALUES(topics),
+                   message_count = VALUES(message_count),
+                   last_message_at = VALUES(last_message_at),
+                   last_message_id = VALUES(last_message_id)""",
+            (
+                db_id(thread_id), summary,
+                json.dumps(key_facts or [], ensure_ascii=False),
+                json.dumps(topics or [], ensure_ascii=False),
+                message_count, last_message_at, db_id(last_message_id),
+            ),
+            fetch=False,
+            uow=uow
+        )
+        row = {
+            "thread_id": thread_id, "summary": summary,
+            "key_facts": list(key_facts or []), "topics": list(topics or []),
+            "message_count": message_count, "last_message_at": last_message_at,
+            "last_message_id": last_message_id, "updated_at": datetime.now(),
+        }
+        on_commit(uow, lambda: memory_cache.set(thread_id, row))
 
     @staticmethod
     def delete(thread_id: str):
         """حذف ذاكرة المحادثة"""
         execute_query(
             "DELETE FROM ai_thread_memory WHERE thread_id = %s",
-            (thread_id,),
+            (db_id(thread_id),),
             fetch=False
         )
+        memory_cache.pop(thread_id)
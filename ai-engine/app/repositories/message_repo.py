@@ -2,9 +2,13 @@
 """
 مستودع الرسائل (Messages)
 """
-import uuid
 import json
-from app.db.session import execute_query
+from datetime import datetime
+from app.db.session import execute_query, stream_query
+from app.db.cache import message_ring, on_commit
+from app.db.write_behind import WriteBehindQueue, AtomicItem
+from app.config import settings
+from app.db.ids import new_id, db_id
 
 
 class MessageRepository:
@@ -13,23 +17,36 @@ class MessageRepository:
     def create(thread_id: str, role: str, content: str, model: str = None,
                tokens: int = None, latency_ms: int = None,
                citations: list = None, tool_calls: list = None,
-               language: str = "ar") -> str:
-        """إنشاء رسالة جديدة"""
-        message_id = str(uuid.uuid4())
+               language: str = "ar", message_id: str = None, uow=None) -> str:
+        """إنشاء رسالة جديدة (message_id: معرف مُعلن مسبقاً، وإلا يُولَّد)"""
+        message_id = message_id or new_id()
+        row = {
+            "id": message_id, "thread_id": thread_id, "role": role, "content": content,
+            "model": model, "tokens": tokens, "latency_ms": latency_ms,
+            "citations": json.dumps(citations or [], ensure_ascii=False),
+            "tool_calls": json.dumps(tool_calls or [], ensure_ascii=False),
+            "language": language, "created_at": datetime.now(),
+        }
         execute_query(
             """INSERT INTO ai_messages 
                (id, thread_id, role, content, model, tokens, latency_ms, 
-                citations, tool_calls, language)
-               VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+                citations, tool_calls, language, created_at)
+               VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
             (
-                message_id, thread_id, role, content, model,
-                tokens, latency_ms,
-                json.dumps(citations or [], ensure_ascii=False),
-                json.dumps(tool_calls or [], ensure_ascii=False),
-                language
+                db_id(message_id), db_id(thread_id), role, content, model,
+                tokens, latency_ms, row["citations"], row["tool_calls"], language,
+                # وقت الدورة لا وقت الكتابة: الكتابة المؤجلة قد تصل بعد الرسالة التالية
+                row["created_at"]
             ),
-            fetch=False
+            fetch=False,
+            uow=uow,
+            prepared=True
         )
+        # الكتابة المؤجلة تُكتب حتماً: الرسالة تدخل الحلقة فوراً،
+        # وتُحفظ حتى تصل القاعدة لتُدمج في حلقة تُبنى من قراءة قبل ذلك
+        if isinstance(uow, (WriteBehindQueue, AtomicItem)):
+            message_ring.hold(thread_id, row)
+        on_commit(uow, lambda: message_ring.append(thread_id, row))
         return message_id
 
     @staticmethod
@@ -37,38 +54,92 @@ class MessageRepository:
         """جلب رسالة"""
         results = execute_query(
             "SELECT * FROM ai_messages WHERE id = %s",
-            (message_id,)
+            (db_id(message_id),)
         )
         return results[0] if results else None
 
     @staticmethod
-    def get_thread_messages(thread_id: str, limit: int = 50) -> list:
+    def get_thread_messages(thread_id: str, limit: int = 50, uow=None) -> list:
         """جلب رسائل محادثة"""
         return execute_query(
             """SELECT * FROM ai_messages 
                WHERE thread_id = %s 
                ORDER BY created_at ASC 
                LIMIT %s""",
-            (thread_id, limit)
+            (db_id(thread_id), limit),
+            uow=uow,
+            prepared=True
         ) or []
 
     @staticmethod
-    def get_recent_messages(thread_id: str, limit: int = 10) -> list:
-        """جلب آخر رسائل المحادثة"""
+    def get_messages_after(thread_id: str, after_at=None, after_id: str = None,
+                           limit: int = 50, uow=None) -> list:
+        """
+        رسائل المحادثة بعد (after_at, after_id) بالترتيب - للذاكرة التراكمية
+
+        تُجلب الأعمدة اللازمة فقط؛ بدون after_at من بداية المحادثة
+        """
+        condition, params = "", ()
+        if after_at is not None:
+            condition = "AND (created_at > %s OR (created_at = %s AND id > %s))"
+            params = (after_at, after_at, db_id(after_id))
         return execute_query(
+            f"""SELECT id, role, content, created_at FROM ai_messages
+               WHERE thread_id = %s {condition}
+               ORDER BY created_at ASC, id ASC
+               LIMIT %s""",
+            (db_id(thread_id),) + params + (limit,),
+            uow=uow,
+            prepared=True
+        ) or []
+
+    @staticmethod
+    def get_recent_messages(thread_id: str, limit: int = 10) -> list:
+        """
+        جلب آخر رسائل المحادثة (الأحدث أولاً)
+
+        من حلقة الرسائل إن كانت كافية؛ وإلا من القاعدة بحجم الحلقة على الأقل
+        حتى تُبنى منها الحلقة للدورات التالية. رسائل الكتابة المؤجلة التي لم
+        تصل القاعدة بعد تُدمج في النتيجة وفي الحلقة
+        """
+        cached = message_ring.recent(thread_id, limit)
+        if cached is not None:
+            return cached
+        fetch = max(limit, message_ring.size) if settings.CACHE_ENABLED else limit
+        rows = execute_query(
             """SELECT * FROM ai_messages 
                WHERE thread_id = %s 
                ORDER BY created_at DESC 
                LIMIT %s""",
-            (thread_id, limit)
+            (db_id(thread_id), fetch),
+            prepared=True
         ) or []
+        messages = message_ring.with_pending(thread_id, [dict(r) for r in reversed(rows)])
+        if settings.CACHE_ENABLED:
+            message_ring.seed(thread_id, [dict(m) for m in messages])
+        messages.reverse()
+        return messages[:limit]
+
+    @staticmethod
+    def stream_all(thread_id: str = None, batch_size: int = None):
+        """المرور على الرسائل (أو رسائل محادثة) بدون تحميلها في الذاكرة - للتصدير"""
+        if thread_id:
+            return stream_query(
+                "SELECT * FROM ai_messages WHERE thread_id = %s ORDER BY created_at ASC",
+                (db_id(thread_id),),
+                batch_size=batch_size
+            )
+        return stream_query(
+            "SELECT * FROM ai_messages ORDER BY thread_id, created_at",
+            batch_size=batch_size
+        )
 
     @staticmethod
     def count_thread_messages(thread_id: str) -> int:
         """عدد رسائل محادثة"""
         result = execute_query(
             "SELECT COUNT(*) as total FROM ai_messages WHERE thread_id = %s",
-            (thread_id,)
+            (db_id(thread_id),)
         )
         return result[0]["total"] if result else 0
 
@@ -77,6 +148,8 @@ class MessageRepository:
         """حذف رسالة"""
         execute_query(
             "DELETE FROM ai_messages WHERE id = %s",
-            (message_id,),
+            (db_id(message_id),),
             fetch=False
         )
+        # المحادثة غير معروفة هنا (حذف نادر): تفريغ كل الحلقات
+        message_ring.clear()
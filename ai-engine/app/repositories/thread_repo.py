@@ -2,62 +2,126 @@
 """
 مستودع المحادثات (Threads)
 """
-import uuid
 import json
+from datetime import datetime
 from app.db.session import execute_query
+from app.db.cache import thread_cache, message_ring, forget_thread, on_commit
+from app.db.ids import new_id, db_id
+from app.db.unit_of_work import UnitOfWork
+from app.repositories.counter_repo import CounterRepository
+from app.utils.pagination import keyset_condition, build_page
 
 
 class ThreadRepository:
 
     @staticmethod
-    def create(title: str = None, metadata: dict = None) -> str:
-        """إنشاء محادثة جديدة"""
-        thread_id = str(uuid.uuid4())
+    def create(title: str = None, metadata: dict = None, thread_id: str = None,
+               uow=None) -> str:
+        """
+        إنشاء محادثة جديدة (مع عداد المحادثات في نفس المعاملة)
+
+        thread_id: معرف مُعلن مسبقاً للعميل (الدردشة المتدفقة تحفظ بعد البث)
+        """
+        if uow is None:
+            with UnitOfWork() as uow:
+                return ThreadRepository.create(title, metadata, thread_id, uow=uow)
+
+        thread_id = thread_id or new_id()
         meta_json = json.dumps(metadata or {}, ensure_ascii=False)
         execute_query(
             "INSERT INTO ai_threads (id, title, metadata) VALUES (%s, %s, %s)",
-            (thread_id, title or "محادثة جديدة", meta_json),
-            fetch=False
+            (db_id(thread_id), title or "محادثة جديدة", meta_json),
+            fetch=False,
+            uow=uow,
+            prepared=True
         )
+        CounterRepository.increment({CounterRepository.THREADS: (1, 0)}, uow=uow)
+
+        now = datetime.now()
+        row = {
+            "id": thread_id, "title": title or "محادثة جديدة", "metadata": meta_json,
+            "created_at": now, "updated_at": now,
+        }
+
+        def cache():
+            thread_cache.set(thread_id, row)
+            # محادثة جديدة في هذا العامل: حلقة الرسائل الفارغة كاملة
+            message_ring.seed(thread_id, [])
+
+        on_commit(uow, cache)
         return thread_id
 
     @staticmethod
-    def get_by_id(thread_id: str) -> dict:
-        """جلب محادثة بالمعرف"""
+    def get_by_id(thread_id: str, uow=None) -> dict:
+        """جلب محادثة بالمعرف (من الذاكرة المؤقتة إن وُجدت)"""
+        cached = thread_cache.get(thread_id)
+        if cached is not None:
+            return cached
         results = execute_query(
             "SELECT * FROM ai_threads WHERE id = %s",
-            (thread_id,)
+            (db_id(thread_id),),
+            uow=uow,
+            prepared=True
         )
-        return results[0] if results else None
+        if not results:
+            return None
+        thread_cache.set(thread_id, results[0])
+        return dict(results[0])
 
     @staticmethod
-    def list_all(limit: int = 20, offset: int = 0) -> list:
-        """جلب كل المحادثات"""
-        return execute_query(
-            "SELECT * FROM ai_threads ORDER BY updated_at DESC LIMIT %s OFFSET %s",
-            (limit, offset)
+    def list_all(limit: int = 20, cursor: str = None) -> list:
+        """جلب صفحة من المحادثات (cursor من list_page)"""
+        return ThreadRepository.list_page(limit, cursor)[0]
+
+    @staticmethod
+    def list_page(limit: int = 20, cursor: str = None) -> tuple:
+        """صفحة من المحادثات (الأحدث أولاً) -> (المحادثات، next_cursor أو None)"""
+        condition, params = keyset_condition("updated_at", cursor)
+        rows = execute_query(
+            f"""SELECT * FROM ai_threads
+               {"WHERE " + condition if condition else ""}
+               ORDER BY updated_at DESC, id DESC
+               LIMIT %s""",
+            params + (limit + 1,)
         ) or []
+        return build_page(rows, limit, "updated_at")
 
     @staticmethod
     def update_title(thread_id: str, title: str):
         """تحديث عنوان المحادثة"""
         execute_query(
             "UPDATE ai_threads SET title = %s WHERE id = %s",
-            (title, thread_id),
+            (title, db_id(thread_id)),
             fetch=False
         )
+        thread_cache.pop(thread_id)
 
     @staticmethod
-    def delete(thread_id: str):
-        """حذف محادثة"""
+    def delete(thread_id: str, uow=None) -> bool:
+        """حذف محادثة (False إذا لم تكن موجودة)"""
+        if uow is None:
+            with UnitOfWork() as uow:
+                return ThreadRepository.delete(thread_id, uow=uow)
+
+        # قفل الصف حتى لا يُنقص حذفان متزامنان العداد مرتين
+        existing = execute_query(
+            "SELECT id FROM ai_threads WHERE id = %s FOR UPDATE",
+            (db_id(thread_id),),
+            uow=uow
+        )
+        if not existing:
+            return False
         execute_query(
             "DELETE FROM ai_threads WHERE id = %s",
-            (thread_id,),
-            fetch=False
+            (db_id(thread_id),),
+            fetch=False,
+            uow=uow
         )
+        CounterRepository.increment({CounterRepository.THREADS: (-1, 0)}, uow=uow)
+        on_commit(uow, lambda: forget_thread(thread_id))
+        return True
 
     @staticmethod
     def count() -> int:
-        """عدد المحادثات"""
-        result = execute_query("SELECT COUNT(*) as total FROM ai_threads")
-        return result[0]["total"] if result else 0
+        """عدد المحادثات (من جدول العدادات)"""
+        return CounterRepository.count(CounterRepository.THREADS)
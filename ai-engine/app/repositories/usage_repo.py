@@ -3,44 +3,69 @@
 مستودع سجلات الاستخدام (Usage Logs)
 """
 from app.db.session import execute_query
+from app.db.ids import new_id, db_id
+from app.db.unit_of_work import UnitOfWork
+from app.db.write_behind import WriteBehindQueue
+from app.repositories.counter_repo import CounterRepository
 
 
 class UsageRepository:
 
     @staticmethod
     def log(thread_id: str, model: str, tokens_input: int = 0,
-            tokens_output: int = 0, cost_usd: float = 0.0):
-        """تسجيل استخدام"""
+            tokens_output: int = 0, cost_usd: float = 0.0, uow=None) -> str:
+        """
+        تسجيل استخدام (مع عدادات الإجمالي في نفس المعاملة)
+
+        المعرف من العميل: إعادة الكتابة المؤجلة تصطدم بالمفتاح فلا يتكرر الصف ولا العداد
+        """
+        if uow is None:
+            with UnitOfWork() as uow:
+                return UsageRepository.log(
+                    thread_id, model, tokens_input, tokens_output, cost_usd, uow=uow
+                )
+        if isinstance(uow, WriteBehindQueue):
+            with uow.atomic() as item:
+                return UsageRepository.log(
+                    thread_id, model, tokens_input, tokens_output, cost_usd, uow=item
+                )
+
+        usage_id = new_id()
         execute_query(
             """INSERT INTO ai_usage_logs 
-               (thread_id, model, tokens_input, tokens_output, cost_usd)
-               VALUES (%s, %s, %s, %s, %s)""",
-            (thread_id, model, tokens_input, tokens_output, cost_usd),
-            fetch=False
+               (id, thread_id, model, tokens_input, tokens_output, cost_usd)
+               VALUES (%s, %s, %s, %s, %s, %s)""",
+            (db_id(usage_id), db_id(thread_id), model, tokens_input, tokens_output, cost_usd),
+            fetch=False,
+            uow=uow,
+            prepared=True
         )
+        CounterRepository.increment({
+            CounterRepository.USAGE_INPUT: (1, tokens_input or 0),
+            CounterRepository.USAGE_OUTPUT: (1, tokens_output or 0),
+            CounterRepository.USAGE_COST: (1, cost_usd or 0.0),
+        }, uow=uow)
+        return usage_id
 
     @staticmethod
     def get_thread_usage(thread_id: str) -> list:
         """جلب استخدام محادثة"""
         return execute_query(
             "SELECT * FROM ai_usage_logs WHERE thread_id = %s ORDER BY created_at DESC",
-            (thread_id,)
+            (db_id(thread_id),)
         ) or []
 
     @staticmethod
     def get_total_usage() -> dict:
-        """إجمالي الاستخدام"""
-        result = execute_query(
-            """SELECT 
-                 COUNT(*) as total_requests,
-                 COALESCE(SUM(tokens_input), 0) as total_input_tokens,
-                 COALESCE(SUM(tokens_output), 0) as total_output_tokens,
-                 COALESCE(SUM(cost_usd), 0) as total_cost
-               FROM ai_usage_logs"""
+        """إجمالي الاستخدام (من جدول العدادات بدلاً من SUM على كل السجلات)"""
+        values = CounterRepository.get(
+            CounterRepository.USAGE_INPUT,
+            CounterRepository.USAGE_OUTPUT,
+            CounterRepository.USAGE_COST,
         )
-        return result[0] if result else {
-            "total_requests": 0,
-            "total_input_tokens": 0,
-            "total_output_tokens": 0,
-            "total_cost": 0
+        return {
+            "total_requests": values[CounterRepository.USAGE_INPUT]["count"],
+            "total_input_tokens": int(values[CounterRepository.USAGE_INPUT]["total"]),
+            "total_output_tokens": int(values[CounterRepository.USAGE_OUTPUT]["total"]),
+            "total_cost": values[CounterRepository.USAGE_COST]["total"],
         }
@@ -2,9 +2,9 @@
 """
 مستودع تحليل الصور (Vision / OCR)
 """
-import uuid
 import json
 from app.db.session import execute_query
+from app.db.ids import new_id, db_id
 
 
 class VisionRepository:
@@ -14,13 +14,13 @@ class VisionRepository:
                description: str = None, structured_data: dict = None,
                message_id: str = None) -> str:
         """إنشاء سجل تحليل صورة"""
-        vision_id = str(uuid.uuid4())
+        vision_id = new_id()
         execute_query(
             """INSERT INTO ai_vision_analyses 
                (id, file_id, message_id, extracted_text, description, structured_data)
                VALUES (%s, %s, %s, %s, %s, %s)""",
             (
-                vision_id, file_id, message_id,
+                vision_id, db_id(file_id), db_id(message_id),
                 extracted_text, description,
                 json.dumps(structured_data or {}, ensure_ascii=False)
             ),
@@ -33,7 +33,7 @@ class VisionRepository:
         """جلب تحليل صورة بملف"""
         results = execute_query(
             "SELECT * FROM ai_vision_analyses WHERE file_id = %s ORDER BY created_at DESC LIMIT 1",
-            (file_id,)
+            (db_id(file_id),)
         )
         return results[0] if results else None
 
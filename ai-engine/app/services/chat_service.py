@@ -3,14 +3,21 @@
 خدمة الدردشة الرئيسية - المنسق الأساسي
 """
 import time
+import asyncio
+from contextlib import nullcontext
 from app.services.rag_service import rag_service
 from app.services.memory_service import memory_service
 from app.services.usage_service import usage_service
 from app.services.vision_service import vision_service
 from app.repositories.thread_repo import ThreadRepository
 from app.repositories.message_repo import MessageRepository
+from app.repositories.file_repo import FileRepository
+from app.db.unit_of_work import UnitOfWork
+from app.db.write_behind import deferred
+from app.db.ids import new_id
+from app.config import settings
 from app.utils.text_processing import count_tokens, detect_language
-from app.core.constants import ROLE_USER, ROLE_ASSISTANT, AI_MODEL_NAME, SYSTEM_MESSAGES
+from app.core.constants import ROLE_USER, ROLE_ASSISTANT, AI_MODEL_NAME
 from app.core.logging_config import logger
 
 
@@ -33,44 +40,33 @@ class ChatService:
         4. بحث RAG في قاعدة المعرفة
         5. توليد الإجابة
         6. حفظ الرسائل
-        7. تحديث الذاكرة
-        8. تسجيل الاستخدام
+        7. تسجيل الاستخدام
+        8. تحديث الذاكرة
+
+        كتابات الطلب تُجمع في وحدة عمل واحدة (اتصال واحد، commit واحد) تُفتح
+        بعد توليد الإجابة فقط - الصورة والبحث والتوليد لا تحجز اتصالاً من التجمع؛
+        رسالة المساعد وسجل الاستخدام يُكتبان مؤجلاً (write-behind) بعد الرد
         """
         start_time = time.time()
 
-        # 1. إنشاء أو استرجاع المحادثة
-        if not thread_id:
-            thread_title = question[:80] if question else "محادثة جديدة"
-            thread_id = self.thread_repo.create(title=thread_title)
-            is_new_thread = True
-        else:
-            existing = self.thread_repo.get_by_id(thread_id)
-            if not existing:
-                thread_id = self.thread_repo.create(title=question[:80])
-                is_new_thread = True
-            else:
-                is_new_thread = False
+        # 1. استرجاع المحادثة (الجديدة يُحجز معرفها الآن وتُنشأ مع رسالة المستخدم)
+        existing = self.thread_repo.get_by_id(thread_id) if thread_id else None
+        is_new_thread = not existing
+        thread_id = thread_id if existing else new_id()
 
         # 2. تحليل الصورة إن وجدت
-        image_context = ""
         vision_result = None
         if image_file_id and image_path:
             vision_result = vision_service.analyze_image(
                 file_id=image_file_id,
                 file_path=image_path,
             )
-            if vision_result.get("extracted_text"):
-                image_context = f"نص مستخرج من الصورة: {vision_result['extracted_text']}"
-            if vision_result.get("description"):
-                image_context += f"\nوصف الصورة: {vision_result['description']}"
 
-        # 3. جلب سياق الذاكرة
-        memory_context = memory_service.get_context(thread_id)
+        # 3. جلب سياق الذاكرة (المحادثة الجديدة لا ذاكرة لها)
+        memory_context = "" if is_new_thread else memory_service.get_context(thread_id)
 
         # 4. جمع السؤال مع سياق الصورة
-        full_query = question
-        if image_context:
-            full_query = f"{question}\n\n{image_context}"
+        full_query = self._with_image_context(question, vision_result)
 
         # 5. بحث RAG
         relevant_chunks = rag_service.search(full_query)
@@ -82,7 +78,161 @@ class ChatService:
         # حساب الزمن
         latency_ms = int((time.time() - start_time) * 1000)
 
-        # 7. حفظ رسالة المستخدم
+        # 7. المحادثة + رسالة المستخدم + الصورة + الذاكرة: معاملة واحدة حول الكتابات فقط
+        with UnitOfWork() as uow:
+            if is_new_thread:
+                title = question[:80] if question else "محادثة جديدة"
+                self.thread_repo.create(title=title, thread_id=thread_id, uow=uow)
+            input_tokens = self._save_user_turn(thread_id, question, image_file_id, uow)
+
+        # 8. رسالة المساعد + الاستخدام: بعد commit المحادثة (المرجع موجود) وخارج مسار الرد
+        assistant_msg_id, output_tokens = self._save_assistant_turn(
+            thread_id, answer, relevant_chunks, latency_ms, input_tokens
+        )
+
+        logger.info(
+            f"✅ تم الرد على السؤال في {latency_ms}ms ({len(relevant_chunks)} مصادر، "
+            f"{uow.round_trips} رحلة DB)"
+        )
+
+        return self._response(
+            thread_id, assistant_msg_id, answer, relevant_chunks, vision_result, {
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "latency_ms": latency_ms,
+                "is_new_thread": is_new_thread,
+                "has_image": bool(image_file_id),
+                "has_memory": bool(memory_context),
+                "db_round_trips": uow.round_trips,
+            }
+        )
+
+    async def chat_async(self, question: str, thread_id: str = None,
+                         image_file_id: str = None, image_path: str = None,
+                         deadline_ms: int = None) -> dict:
+        """
+        نفس chat() لكن المراحل المستقلة تعمل بالتوازي
+
+        - استرجاع المحادثة ∥ الذاكرة ∥ البحث
+        - تحليل الصورة ∥ استرجاع المحادثة (البحث ينتظر نص الصورة)
+        - الذاكرة / الصورة / البحث محكومة بمهلة الطلب (CHAT_DEADLINE_MS):
+          ما لم ينتهِ يُستبعد (سياق فارغ) ويُذكر في metadata.timed_out
+        - زمن كل مرحلة في metadata.timings (ميلي ثانية)
+        """
+        start_time = time.time()
+        deadline = start_time + (deadline_ms or settings.CHAT_DEADLINE_MS) / 1000
+        timings = {}
+
+        async def timed(stage: str, fn, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                # to_thread ينسخ الـ context: توجيه القراءة وعدّاد الاستعلامات يبقيان للطلب
+                return await asyncio.to_thread(fn, *args, **kwargs)
+            finally:
+                timings[stage] = round((time.perf_counter() - started) * 1000, 2)
+
+        thread_task = asyncio.create_task(
+            timed("thread", self.thread_repo.get_by_id, thread_id)
+        ) if thread_id else None
+        memory_task = asyncio.create_task(
+            timed("memory", memory_service.get_context, thread_id)
+        ) if thread_id else None
+        vision_task = asyncio.create_task(
+            timed("vision", vision_service.analyze_image, file_id=image_file_id, file_path=image_path)
+        ) if image_file_id and image_path else None
+
+        async def retrieve():
+            vision_result = None
+            if vision_task is not None:
+                done, _ = await asyncio.wait({vision_task}, timeout=deadline - time.time())
+                vision_result = self._stage_result(vision_task, "vision") if done else None
+            full_query = self._with_image_context(question, vision_result)
+            chunks = await timed("retrieval", rag_service.search, full_query)
+            return full_query, chunks, vision_result
+
+        retrieval_task = asyncio.create_task(retrieve())
+
+        # المحادثة إلزامية (بدونها قد تُنشأ محادثة مكررة) - لا تخضع للمهلة
+        existing = await thread_task if thread_task is not None else None
+        is_new_thread = not existing
+        thread_id = thread_id if existing else new_id()
+
+        bounded = [t for t in (memory_task, vision_task, retrieval_task) if t is not None]
+        _, pending = await asyncio.wait(bounded, timeout=max(deadline - time.time(), 0))
+        timed_out = []
+        for task, stage in ((memory_task, "memory"), (vision_task, "vision"), (retrieval_task, "retrieval")):
+            if task in pending:
+                # الخيط نفسه لا يُلغى؛ نتوقف فقط عن انتظاره
+                task.cancel()
+                timed_out.append(stage)
+
+        memory_context = ""
+        if memory_task is not None and not is_new_thread and memory_task not in pending:
+            memory_context = self._stage_result(memory_task, "memory") or ""
+        full_query, relevant_chunks, vision_result = question, [], None
+        if retrieval_task not in pending:
+            full_query, relevant_chunks, vision_result = (
+                self._stage_result(retrieval_task, "retrieval") or (question, [], None)
+            )
+
+        context = rag_service.build_context(relevant_chunks)
+        answer = await timed("generate", rag_service.generate_answer, full_query, context, memory_context)
+        latency_ms = int((time.time() - start_time) * 1000)
+
+        def save():
+            with UnitOfWork() as uow:
+                if is_new_thread:
+                    self.thread_repo.create(title=question[:80], thread_id=thread_id, uow=uow)
+                input_tokens = self._save_user_turn(thread_id, question, image_file_id, uow)
+            return (input_tokens, uow.round_trips) + self._save_assistant_turn(
+                thread_id, answer, relevant_chunks, latency_ms, input_tokens
+            )
+
+        input_tokens, round_trips, assistant_msg_id, output_tokens = await timed("save", save)
+
+        logger.info(
+            f"✅ تم الرد (متوازي) في {latency_ms}ms ({len(relevant_chunks)} مصادر) | "
+            + " ".join(f"{k}={v}ms" for k, v in timings.items())
+            + (f" | تجاوز المهلة: {', '.join(timed_out)}" if timed_out else "")
+        )
+
+        return self._response(
+            thread_id, assistant_msg_id, answer, relevant_chunks, vision_result, {
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "latency_ms": latency_ms,
+                "is_new_thread": is_new_thread,
+                "has_image": bool(image_file_id),
+                "has_memory": bool(memory_context),
+                "db_round_trips": round_trips,
+                "timings": timings,
+                "timed_out": timed_out,
+            }
+        )
+
+    @staticmethod
+    def _stage_result(task, stage: str):
+        """نتيجة مرحلة منتهية، أو None إذا فشلت (الرد يستمر بدونها)"""
+        try:
+            return task.result()
+        except Exception as e:
+            logger.error(f"⚠️ فشل مرحلة {stage}: {e}")
+            return None
+
+    @staticmethod
+    def _with_image_context(question: str, vision_result: dict) -> str:
+        """السؤال + النص المستخرج ووصف الصورة"""
+        if not vision_result:
+            return question
+        image_context = ""
+        if vision_result.get("extracted_text"):
+            image_context = f"نص مستخرج من الصورة: {vision_result['extracted_text']}"
+        if vision_result.get("description"):
+            image_context += f"\nوصف الصورة: {vision_result['description']}"
+        return f"{question}\n\n{image_context}" if image_context else question
+
+    def _save_user_turn(self, thread_id: str, question: str, image_file_id: str, uow) -> int:
+        """رسالة المستخدم + ربط الصورة داخل وحدة العمل -> عدد التوكنات"""
         input_tokens = count_tokens(question)
         user_msg_id = self.message_repo.create(
             thread_id=thread_id,
@@ -90,9 +240,23 @@ class ChatService:
             content=question,
             language=detect_language(question),
             tokens=input_tokens,
+            uow=uow,
         )
 
-        # 8. حفظ رسالة المساعد
+        # ربط الصورة بالرسالة
+        if image_file_id:
+            FileRepository.link_to_message(user_msg_id, image_file_id, uow=uow)
+        return input_tokens
+
+    def _save_assistant_turn(self, thread_id: str, answer: str, relevant_chunks: list,
+                             latency_ms: int, input_tokens: int) -> tuple:
+        """
+        رسالة المساعد + تحديث الذاكرة + الاستخدام عبر الكتابة المؤجلة -> (معرف الرسالة، توكنات الإجابة)
+
+        مهمة memory.update تُكتب في نفس عنصر رسالة المساعد (معاملة واحدة):
+        العامل لا يراها قبل أن يُكتب الرد، فيدخل الرد في الملخص بلا تخمين توقيت
+        """
+        writer = deferred()
         output_tokens = count_tokens(answer)
         citations = [
             {
@@ -103,40 +267,34 @@ class ChatService:
             for c in relevant_chunks[:3]
         ]
 
-        assistant_msg_id = self.message_repo.create(
-            thread_id=thread_id,
-            role=ROLE_ASSISTANT,
-            content=answer,
-            model=AI_MODEL_NAME,
-            tokens=output_tokens,
-            latency_ms=latency_ms,
-            citations=citations,
-            language=detect_language(answer),
-        )
-
-        # ربط الصورة بالرسالة
-        if image_file_id:
-            from app.repositories.file_repo import FileRepository
-            FileRepository.link_to_message(user_msg_id, image_file_id)
-
-        # 9. تحديث الذاكرة
-        try:
-            memory_service.update_memory(thread_id)
-        except Exception as e:
-            logger.error(f"⚠️ خطأ في تحديث الذاكرة: {e}")
+        with (writer.atomic() if writer is not None else nullcontext()) as item:
+            assistant_msg_id = self.message_repo.create(
+                thread_id=thread_id,
+                role=ROLE_ASSISTANT,
+                content=answer,
+                model=AI_MODEL_NAME,
+                tokens=output_tokens,
+                latency_ms=latency_ms,
+                citations=citations,
+                language=detect_language(answer),
+                uow=item,
+            )
+            memory_service.schedule_update(thread_id, uow=item)
 
-        # 10. تسجيل الاستخدام
         usage_service.log_request(
             thread_id=thread_id,
             tokens_input=input_tokens,
             tokens_output=output_tokens,
+            uow=writer,
         )
+        return assistant_msg_id, output_tokens
 
-        logger.info(f"✅ تم الرد على السؤال في {latency_ms}ms ({len(relevant_chunks)} مصادر)")
-
+    @staticmethod
+    def _response(thread_id: str, message_id: str, answer: str, relevant_chunks: list,
+                  vision_result: dict, metadata: dict) -> dict:
         return {
             "thread_id": thread_id,
-            "message_id": assistant_msg_id,
+            "message_id": message_id,
             "answer": answer,
             "sources": [
                 {
@@ -148,13 +306,8 @@ class ChatService:
             ],
             "metadata": {
                 "model": AI_MODEL_NAME,
-                "input_tokens": input_tokens,
-                "output_tokens": output_tokens,
-                "latency_ms": latency_ms,
                 "sources_found": len(relevant_chunks),
-                "is_new_thread": is_new_thread,
-                "has_image": bool(image_file_id),
-                "has_memory": bool(memory_context),
+                **metadata,
             },
             "vision": vision_result if vision_result else None,
         }
@@ -0,0 +1,165 @@
+# app/services/ingest_service.py
+"""
+خدمة الإدخال - مسار الملف إلى قاعدة المعرفة على مراحل
+
+    extract -> chunk -> insert -> index
+
+- تعمل كمهمة ingest.file في طابور ingest (أو مباشرة عند JOBS_ENABLED=false)
+- تقدم كل مرحلة (الزمن، البايتات، القطع) يُحفظ في ai_jobs.progress
+- المحاولة بعد فشل تستأنف: النص المستخرج محفوظ في ai_files، والمستند وقطعه
+  يُؤكَّدان مع تقدم المرحلة في نفس المعاملة فلا يتكرر الإدخال
+"""
+import time
+from app.repositories.file_repo import FileRepository
+from app.repositories.document_repo import DocumentRepository
+from app.repositories.chunk_repo import ChunkRepository
+from app.db.unit_of_work import UnitOfWork
+from app.background.runner import current_job, report_progress
+from app.utils.chunking import chunk_text
+from app.utils.extraction_pool import extraction_pool, RETRYABLE_METHODS
+from app.utils.text_processing import count_tokens, detect_language
+from app.config import settings
+from app.core.logging_config import logger
+
+STAGES = ("extract", "chunk", "insert", "index")
+
+
+class IngestService:
+    """مسار الإدخال متعدد المراحل"""
+
+    def run(self, file_id: str, knowledge_base_id: str = None, title: str = None) -> dict:
+        """
+        تنفيذ المسار لملف محفوظ في ai_files
+
+        بدون knowledge_base_id (أو بدون نص قابل للقراءة) يتوقف بعد extract
+
+        Returns:
+            {"file_id", "chars", "document_id", "chunks", "indexed"}
+        """
+        job = current_job()
+        progress = dict(job.get("progress") or {}) if job else {}
+        progress.setdefault("started_at", time.time())
+        stages = progress.setdefault("stages", {})
+
+        file = FileRepository.get_by_id(file_id)
+        if not file:
+            logger.warning(f"⚠️ الملف {file_id} لم يعد موجوداً - تم تجاهل الإدخال")
+            return {"file_id": file_id, "skipped": True}
+
+        # 1. extract
+        if "extract" in stages:
+            text = file.get("extracted_text") or ""
+            readable = stages["extract"].get("readable", bool(text))
+        else:
+            self._begin(progress, "extract")
+            started = time.perf_counter()
+            processed = extraction_pool.extract(file.get("file_path"), file.get("mime_type") or "")
+            if processed.get("method") in RETRYABLE_METHODS:
+                # خطأ عابر محتمل (ملف قيد الكتابة / مكتبة OCR): إعادة المحاولة لاحقاً
+                raise RuntimeError(processed.get("text") or "فشل استخراج النص")
+            text = processed.get("text", "")
+            readable = bool(processed.get("success"))
+            FileRepository.update_extracted_text(file_id, text)
+            stages["extract"] = {
+                "ms": self._elapsed(started),
+                "bytes": int(file.get("file_size") or 0),
+                "chars": len(text),
+                "method": processed.get("method"),
+                "readable": readable,
+            }
+            self._save(progress)
+
+        result = {"file_id": file_id, "chars": len(text), "document_id": None,
+                  "chunks": 0, "indexed": False}
+        if not knowledge_base_id or not readable or not text.strip():
+            # رسائل "نوع غير مدعوم" ليست محتوى يُضاف لقاعدة المعرفة
+            self._finish(progress)
+            return result
+
+        # 2. chunk (حتمي ورخيص: يُعاد حسابه عند الاستئناف بدلاً من تخزين القطع)
+        started = time.perf_counter()
+        if "chunk" not in stages:
+            self._begin(progress, "chunk")
+        pieces = chunk_text(text)
+        stages["chunk"] = {"ms": self._elapsed(started), "chunks": len(pieces)}
+
+        # 3. insert: المستند وقطعه وتقدم المرحلة في معاملة واحدة
+        if "insert" not in stages:
+            self._begin(progress, "insert")
+            started = time.perf_counter()
+            with UnitOfWork(batch_size=settings.DB_CHUNK_BATCH_SIZE) as uow:
+                doc_id = DocumentRepository.create(
+                    knowledge_base_id=knowledge_base_id,
+                    title=title or file.get("filename"),
+                    file_id=file_id,
+                    language=detect_language(text),
+                    metadata={"ingest_job": job["id"]} if job else None,
+                    uow=uow,
+                )
+                created = ChunkRepository.bulk_create(
+                    [
+                        {
+                            "document_id": doc_id,
+                            "chunk_index": idx + 1,
+                            "content": piece,
+                            "language": detect_language(piece),
+                            "token_count": count_tokens(piece),
+                        }
+                        for idx, piece in enumerate(pieces)
+                    ],
+                    uow=uow
+                )
+                progress["document_id"] = doc_id
+                stages["insert"] = {"ms": self._elapsed(started), "rows": created}
+                self._save(progress, uow=uow)
+            logger.info(f"📝 تم إنشاء {created} قطعة من {file.get('filename')}")
+
+        # 4. index
+        self._begin(progress, "index")
+        started = time.perf_counter()
+        optimized = ChunkRepository.optimize_index()
+        stages["index"] = {"ms": self._elapsed(started), "optimized": optimized}
+        self._finish(progress)
+
+        result.update(
+            document_id=progress.get("document_id"),
+            chunks=stages["insert"]["rows"],
+            indexed=True,
+        )
+        return result
+
+    def _begin(self, progress: dict, stage: str):
+        progress["stage"] = stage
+        self._save(progress)
+
+    def _finish(self, progress: dict):
+        progress["stage"] = "done"
+        self._save(progress)
+
+    def _save(self, progress: dict, uow=None):
+        progress["updated_at"] = time.time()
+        report_progress(progress, uow=uow)
+
+    @staticmethod
+    def _elapsed(started: float) -> float:
+        return round((time.perf_counter() - started) * 1000, 2)
+
+
+def throughput(progress: dict) -> dict:
+    """معدلات المسار من تقدم المهمة (للحالة): بايت/ث للاستخراج، قطعة/ث للإدخال"""
+    stages = (progress or {}).get("stages", {})
+    extract, insert = stages.get("extract") or {}, stages.get("insert") or {}
+    started, updated = (progress or {}).get("started_at"), (progress or {}).get("updated_at")
+    return {
+        "elapsed_ms": round((updated - started) * 1000, 2) if started and updated else None,
+        "extract_bytes_per_second": (
+            round(extract["bytes"] / (extract["ms"] / 1000), 1) if extract.get("ms") else None
+        ),
+        "insert_chunks_per_second": (
+            round(insert["rows"] / (insert["ms"] / 1000), 1) if insert.get("ms") else None
+        ),
+    }
+
+
+# إنشاء instance
+ingest_service = IngestService()
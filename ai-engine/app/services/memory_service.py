@@ -5,9 +5,16 @@
 import json
 from app.repositories.memory_repo import MemoryRepository
 from app.repositories.message_repo import MessageRepository
+from app.background.runner import enqueue
 from app.config import settings
+from app.db.unit_of_work import UnitOfWork
 from app.core.logging_config import logger
 
+# حدود الذاكرة التراكمية
+MEMORY_TOPICS = 5        # آخر المواضيع في الملخص
+MEMORY_KEY_FACTS = 20    # آخر الحقائق
+MEMORY_FOLD_BATCH = 50   # رسائل لكل قراءة عند الطي
+
 
 class MemoryService:
     """إدارة ذاكرة المحادثات"""
@@ -16,9 +23,9 @@ class MemoryService:
         self.memory_repo = MemoryRepository()
         self.message_repo = MessageRepository()
 
-    def get_context(self, thread_id: str) -> str:
+    def get_context(self, thread_id: str, uow=None) -> str:
         """جلب سياق الذاكرة للمحادثة"""
-        memory = self.memory_repo.get(thread_id)
+        memory = self.memory_repo.get(thread_id, uow=uow)
         if not memory:
             return ""
 
@@ -53,50 +60,96 @@ class MemoryService:
             for msg in messages
         ]
 
-    def update_memory(self, thread_id: str):
-        """تحديث ذاكرة المحادثة"""
-        messages = self.message_repo.get_thread_messages(thread_id, limit=50)
-        if not messages:
-            return
-
-        msg_count = len(messages)
-
-        # استخراج ملخص
-        summary = self._summarize_messages(messages)
+    def schedule_update(self, thread_id: str, uow=None):
+        """
+        تحديث الذاكرة خارج مسار الطلب (مهمة memory.update) بعد حفظ رد المساعد
 
-        # استخراج حقائق مهمة
-        key_facts = self._extract_key_facts(messages)
-
-        # حفظ/تحديث الذاكرة
-        self.memory_repo.upsert(thread_id, summary, key_facts)
-        logger.info(f"💾 تم تحديث ذاكرة المحادثة {thread_id} ({msg_count} رسالة)")
-
-    def _summarize_messages(self, messages: list) -> str:
-        """تلخيص الرسائل"""
-        if not messages:
-            return ""
-
-        # جمع أسئلة المستخدم
-        user_questions = []
+        uow: الكتابة التي تحمل رد المساعد (عنصر write_behind.atomic() أو وحدة عمل)؛
+        المهمة تُحفظ معها في نفس المعاملة فلا تُنفَّذ قبل أن يُكتب الرد.
+        بدون JOBS_ENABLED: تحديث مباشر بما كُتب حتى الآن (الرد المؤجل يُطوى في الدورة التالية)
+        """
+        if not settings.JOBS_ENABLED:
+            try:
+                self.update_memory(thread_id)
+            except Exception as e:
+                logger.error(f"⚠️ فشل تحديث ذاكرة المحادثة {thread_id}: {e}")
+            return
+        enqueue("memory.update", uow=uow, thread_id=thread_id)
+
+    def update_memory(self, thread_id: str, uow=None):
+        """
+        تحديث ذاكرة المحادثة تراكمياً
+
+        تُطوى الرسائل الجديدة فقط (بعد last_message_at / last_message_id) في
+        الحالة المحفوظة: عدد الرسائل، آخر المواضيع، آخر الحقائق.
+        الكلفة ثابتة لكل دورة مهما طالت المحادثة
+        """
+        if uow is None:
+            with UnitOfWork() as uow:
+                return self.update_memory(thread_id, uow=uow)
+
+        memory = self.memory_repo.get(thread_id, uow=uow, for_update=True)
+        if memory and memory.get("last_message_at") is None:
+            # ذاكرة من قبل الطي التراكمي: تُبنى من البداية مرة واحدة
+            memory = None
+        memory = memory or {}
+        after_at = memory.get("last_message_at")
+        after_id = memory.get("last_message_id")
+        count = memory.get("message_count") or 0
+        topics = list(memory.get("topics") or [])
+        key_facts = list(memory.get("key_facts") or [])
+
+        folded = 0
+        while True:
+            messages = self.message_repo.get_messages_after(
+                thread_id, after_at, after_id, limit=MEMORY_FOLD_BATCH, uow=uow
+            )
+            if not messages:
+                break
+            folded += len(messages)
+            topics = (topics + self._extract_topics(messages))[-MEMORY_TOPICS:]
+            key_facts = (key_facts + self._extract_key_facts(messages))[-MEMORY_KEY_FACTS:]
+            after_at, after_id = messages[-1]["created_at"], messages[-1]["id"]
+            if len(messages) < MEMORY_FOLD_BATCH:
+                break
+
+        if not folded:
+            return
+        count += folded
+
+        self.memory_repo.upsert(
+            thread_id,
+            self._summarize(count, topics),
+            key_facts,
+            topics=topics,
+            message_count=count,
+            last_message_at=after_at,
+            last_message_id=after_id,
+            uow=uow,
+        )
+        logger.info(f"💾 تم تحديث ذاكرة المحادثة {thread_id} (+{folded} / {count} رسالة)")
+
+    def _extract_topics(self, messages: list) -> list:
+        """أسئلة المستخدم المختصرة كمواضيع"""
+        topics = []
         for msg in messages:
             if msg.get("role") == "user":
                 content = msg.get("content", "")
                 if content:
                     # اختصار السؤال
                     short = content[:100] + "..." if len(content) > 100 else content
-                    user_questions.append(short)
+                    topics.append(short)
+        return topics
 
-        if not user_questions:
+    def _summarize(self, total: int, topics: list) -> str:
+        """نص الملخص من الحالة التراكمية"""
+        if not topics:
             return "محادثة بدون أسئلة واضحة"
-
-        total = len(messages)
-        topics = user_questions[:5]  # أول 5 مواضيع
         summary = f"محادثة تحتوي على {total} رسالة. المواضيع: {' | '.join(topics)}"
-
         return summary[:500]
 
     def _extract_key_facts(self, messages: list) -> list:
-        """استخراج حقائق مهمة من المحادثة"""
+        """استخراج حقائق مهمة من الرسائل الجديدة"""
         facts = []
 
         for msg in messages:
@@ -113,8 +166,7 @@ class MemoryService:
                 short = content[:80]
                 facts.append(f"أجاب: {short}")
 
-        # احتفظ بآخر 20 حقيقة
-        return facts[-20:]
+        return facts
 
     def clear_memory(self, thread_id: str):
         """مسح ذاكرة المحادثة"""
@@ -3,6 +3,7 @@
 خدمة تسجيل الاستخدام
 """
 from app.repositories.usage_repo import UsageRepository
+from app.db.write_behind import deferred
 from app.core.constants import AI_MODEL_NAME
 from app.core.logging_config import logger
 
@@ -14,15 +15,16 @@ class UsageService:
         self.repo = UsageRepository()
 
     def log_request(self, thread_id: str, tokens_input: int = 0,
-                    tokens_output: int = 0, model: str = None):
-        """تسجيل طلب"""
+                    tokens_output: int = 0, model: str = None, uow=None):
+        """تسجيل طلب (مؤجل افتراضياً - لا ينتظر قاعدة البيانات)"""
         try:
             self.repo.log(
                 thread_id=thread_id,
                 model=model or AI_MODEL_NAME,
                 tokens_input=tokens_input,
                 tokens_output=tokens_output,
-                cost_usd=0.0  # محلي = مجاني
+                cost_usd=0.0,  # محلي = مجاني
+                uow=uow if uow is not None else deferred()
             )
         except Exception as e:
             logger.error(f"❌ خطأ في تسجيل الاستخدام: {e}")
@@ -0,0 +1,185 @@
+# app/utils/extraction_pool.py
+"""
+تجمع عمليات لاستخراج النص (PDF / DOCX / OCR) - عمل CPU خارج خيوط الطلبات
+
+- ProcessPoolExecutor بعدد EXTRACT_POOL_WORKERS (0 = التنفيذ في الخيط الحالي)
+- مهلة لكل مهمة: عند تجاوزها تُنهى عمليات التجمع ويُنشأ تجمع جديد
+  (المهام الأخرى الجارية فيه تفشل بـ "crashed")
+- حد ذاكرة لكل عملية (RLIMIT_AS) على الأنظمة التي تدعمه
+- تدوير العمليات بعد EXTRACT_RECYCLE_AFTER مهمة (تسريبات مكتبات PDF/OCR)
+
+الاستخدام:
+    result = extraction_pool.extract(file_path, mime_type)          # خيوط العمّال
+    result = await extraction_pool.aextract(file_path, mime_type)   # نقاط النهاية async
+"""
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from app.utils.file_processor import extract_text_from_file
+from app.config import settings
+from app.core.logging_config import logger
+
+# فشل قد لا يتكرر (خطأ عابر / عملية أُنهيت بسبب مهلة مهمة أخرى): المهام الخلفية تعيد المحاولة
+RETRYABLE_METHODS = ("error", "crashed")
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _init_worker(max_memory_mb: int):
+    """تهيئة عملية العامل: حد مساحة العنوان (MemoryError بدلاً من استنزاف الخادم)"""
+    if resource is not None and max_memory_mb > 0:
+        limit = max_memory_mb * 1024 * 1024
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ValueError, OSError):
+            pass
+
+
+def _failed(method: str, message: str) -> dict:
+    """نتيجة فشل بنفس شكل extract_text_from_file"""
+    return {"text": message, "method": method, "metadata": {}, "success": False}
+
+
+class ExtractionPool:
+    """تجمع عمليات الاستخراج (ينشأ عند أول استخدام)"""
+
+    def __init__(self, workers: int = None, timeout: float = None,
+                 max_memory_mb: int = None, recycle_after: int = None):
+        self.workers = settings.EXTRACT_POOL_WORKERS if workers is None else workers
+        self.timeout = timeout or settings.EXTRACT_TIMEOUT_SECONDS
+        self.max_memory_mb = settings.EXTRACT_MAX_MEMORY_MB if max_memory_mb is None else max_memory_mb
+        self.recycle_after = settings.EXTRACT_RECYCLE_AFTER if recycle_after is None else recycle_after
+        self._executor = None
+        self._submitted = 0  # مهام التجمع الحالي (للتدوير)
+        self._lock = threading.Lock()
+        self._stats = {
+            "tasks": 0,
+            "in_flight": 0,
+            "timeouts": 0,
+            "crashed": 0,
+            "recycled": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    # ------------------------------------------------------------------
+    # التنفيذ
+    # ------------------------------------------------------------------
+
+    def extract(self, file_path: str, mime_type: str = "") -> dict:
+        """استخراج متزامن (خيوط العمّال / الخدمات)"""
+        if not self.enabled:
+            return extract_text_from_file(file_path, mime_type)
+        executor, future = self._submit(file_path, mime_type)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            return self._on_timeout(executor, file_path)
+        except BrokenProcessPool:
+            return self._on_crash(executor, file_path)
+        finally:
+            self._done()
+
+    async def aextract(self, file_path: str, mime_type: str = "") -> dict:
+        """استخراج بدون حجز حلقة الأحداث (نقاط النهاية async)"""
+        if not self.enabled:
+            return await asyncio.to_thread(extract_text_from_file, file_path, mime_type)
+        executor, future = self._submit(file_path, mime_type)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            return self._on_timeout(executor, file_path)
+        except BrokenProcessPool:
+            return self._on_crash(executor, file_path)
+        finally:
+            self._done()
+
+    def _submit(self, file_path: str, mime_type: str) -> tuple:
+        # المسار فقط يعبر حدود العملية (لا bytes الملف)
+        with self._lock:
+            if self._executor is not None and self.recycle_after and self._submitted >= self.recycle_after:
+                # المهام الجارية تكتمل ثم تخرج العمليات القديمة
+                self._executor.shutdown(wait=False)
+                self._executor = None
+                self._stats["recycled"] += 1
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(settings.EXTRACT_START_METHOD),
+                    initializer=_init_worker,
+                    initargs=(self.max_memory_mb,),
+                )
+                self._submitted = 0
+            executor = self._executor
+            self._submitted += 1
+            self._stats["tasks"] += 1
+            self._stats["in_flight"] += 1
+            return executor, executor.submit(extract_text_from_file, file_path, mime_type)
+
+    def _done(self):
+        with self._lock:
+            self._stats["in_flight"] -= 1
+
+    def _on_timeout(self, executor, file_path: str) -> dict:
+        logger.error(f"⏰ تجاوز استخراج {file_path} المهلة ({self.timeout}s) - إعادة إنشاء التجمع")
+        with self._lock:
+            self._stats["timeouts"] += 1
+        self._discard(executor, kill=True)
+        return _failed("timeout", f"انتهت مهلة استخراج النص ({self.timeout:g} ثانية)")
+
+    def _on_crash(self, executor, file_path: str) -> dict:
+        # عملية انهارت (حد الذاكرة / خطأ في مكتبة أصلية) أو أُنهيت بسبب مهلة مهمة أخرى
+        logger.error(f"💥 توقفت عملية الاستخراج أثناء {file_path} - إعادة إنشاء التجمع")
+        with self._lock:
+            self._stats["crashed"] += 1
+        self._discard(executor)
+        return _failed("crashed", "توقفت عملية استخراج النص (الملف كبير أو تالف)")
+
+    def _discard(self, executor, kill: bool = False):
+        """إخراج تجمع معطوب (الطلب التالي ينشئ تجمعاً جديداً)"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        if kill:
+            # لا طريقة لإلغاء مهمة تعمل داخل عملية غير إنهاء العملية نفسها
+            for process in list((getattr(executor, "_processes", None) or {}).values()):
+                try:
+                    process.terminate()
+                except Exception:
+                    pass
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    # ------------------------------------------------------------------
+    # الحالة ودورة الحياة
+    # ------------------------------------------------------------------
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "workers": self.workers,
+                "running": self._executor is not None,
+                "timeout_seconds": self.timeout,
+                "max_memory_mb": self.max_memory_mb,
+                "recycle_after": self.recycle_after,
+                **self._stats,
+            }
+
+    def shutdown(self):
+        """إيقاف العمليات عند إيقاف التطبيق"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+            logger.info("🔒 تم إيقاف تجمع عمليات الاستخراج")
+
+
+# إنشاء instance
+extraction_pool = ExtractionPool()
@@ -0,0 +1,87 @@
+# app/utils/pagination.py
+"""
+ترقيم الصفحات بالمفاتيح (Keyset) - مؤشرات معتمة على (عمود الترتيب، id)
+
+كل صفحة تبدأ من آخر صف في الصفحة السابقة عبر الفهرس، لذلك الصفحات العميقة
+بنفس كلفة الأولى (بخلاف OFFSET الذي يقرأ كل الصفوف المتخطاة ثم يرميها)
+"""
+import json
+import base64
+from app.exceptions import ValidationError
+from app.db.ids import db_id
+from app.db.sqlite_backend import is_sqlite
+
+MAX_PAGE_SIZE = 100
+
+
+def clamp_limit(limit: int, default: int = 20) -> int:
+    """حجم صفحة ضمن [1, MAX_PAGE_SIZE]"""
+    if not limit or limit < 1:
+        return default
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def encode_cursor(sort_value, row_id) -> str:
+    """مؤشر معتم من قيمة الترتيب والمعرف لآخر صف"""
+    raw = json.dumps([str(sort_value), str(row_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """فك المؤشر -> (قيمة الترتيب، المعرف)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return sort_value, row_id
+    except (ValueError, TypeError, UnicodeError):
+        raise ValidationError("مؤشر الصفحة غير صالح")
+
+
+def keyset_condition(sort_column: str, cursor: str = None) -> tuple:
+    """
+    شرط الصفحة التالية لترتيب تنازلي على (sort_column, id)
+
+    Returns:
+        (نص الشرط أو "", المعاملات)
+    """
+    if not cursor:
+        return "", ()
+    sort_value, row_id = decode_cursor(cursor)
+    # صيغة OR بدلاً من (a, b) < (x, y) لأن MySQL لا يستخدم الفهرس دائماً مع مقارنة الصفوف
+    return (
+        f"({sort_column} < %s OR ({sort_column} = %s AND id < %s))",
+        (sort_value, sort_value, db_id(row_id)),
+    )
+
+
+def build_page(rows: list, limit: int, sort_column: str) -> tuple:
+    """
+    قص الصف الزائد (الاستعلام يطلب limit + 1) وحساب مؤشر الصفحة التالية
+
+    Returns:
+        (صفوف الصفحة، next_cursor أو None)
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last[sort_column], last["id"])
+
+
+def approximate_total(table: str, execute_query) -> int:
+    """
+    عدد تقريبي للصفوف من information_schema (بدون مسح الجدول كما في COUNT(*))
+
+    Args:
+        execute_query: دالة التنفيذ المستخدمة في المستدعي (session أو mysql_conn)
+    """
+    if is_sqlite():
+        # لا إحصائيات صفوف في SQLite؛ الجداول صغيرة في التثبيتات المحلية
+        result = execute_query(f"SELECT COUNT(*) AS total FROM {table}")
+        return int(result[0]["total"] or 0) if result else 0
+    result = execute_query(
+        "SELECT TABLE_ROWS AS total FROM information_schema.tables "
+        "WHERE table_schema = DATABASE() AND table_name = %s",
+        (table,)
+    )
+    return int(result[0]["total"] or 0) if result else 0
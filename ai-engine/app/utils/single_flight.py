@@ -0,0 +1,67 @@
+# app/utils/single_flight.py
+"""
+دمج الطلبات المتطابقة المتزامنة (single-flight)
+
+أول طلب بمفتاح معيّن ينفّذ الحساب، والطلبات المتطابقة التي تصل أثناء
+تنفيذه تنتظر نفس النتيجة (أو نفس الاستثناء) بدلاً من تكراره.
+لا تخزين بعد الانتهاء: الطلب التالي يحسب من جديد
+"""
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """مجموعة حسابات جارية بمفاتيحها"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {"leaders": 0, "coalesced": 0}
+
+    def do(self, key, fn, *args, **kwargs) -> tuple:
+        """
+        تنفيذ fn مرة واحدة لكل مجموعة طلبات متزامنة بنفس المفتاح
+
+        Returns:
+            (النتيجة، هل كانت مشتركة من طلب آخر)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._stats["coalesced"] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self._stats["leaders"] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result, False
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def status(self) -> dict:
+        with self._lock:
+            return {"in_flight": len(self._calls), **self._stats}
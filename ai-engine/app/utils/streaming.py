@@ -0,0 +1,63 @@
+# app/utils/streaming.py
+"""
+ترميز أحداث الاستجابات المتدفقة - SSE (text/event-stream) أو NDJSON
+"""
+import json
+import re
+
+STREAM_MEDIA_TYPES = {
+    "sse": "text/event-stream",
+    "ndjson": "application/x-ndjson",
+}
+
+# منع التخزين المؤقت في الطريق (nginx / Passenger يجمعان الاستجابة بدونها)
+STREAM_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+# حد تقريبي لطول كل جزء من الإجابة المتدفقة
+STREAM_PIECE_CHARS = 80
+
+# جملة/عبارة حتى علامة الترقيم وما بعدها من مسافات
+_RE_PIECE = re.compile(r"[^.!?؟،,:\n]+[.!?؟،,:\n]*\s*|[.!?؟،,:\n]+\s*")
+
+
+def sse_event(event: str, data: dict) -> str:
+    """حدث SSE: سطر event + سطر data (JSON في سطر واحد)"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+def ndjson_event(event: str, data: dict) -> str:
+    """حدث NDJSON: كائن JSON في سطر مع الحقل event"""
+    return json.dumps({"event": event, **data}, ensure_ascii=False, default=str) + "\n"
+
+
+def event_encoder(fmt: str):
+    """دالة الترميز حسب الصيغة (sse / ndjson)"""
+    return ndjson_event if fmt == "ndjson" else sse_event
+
+
+def split_text(text: str, max_chars: int = STREAM_PIECE_CHARS) -> list:
+    """
+    تقسيم النص لأجزاء متتالية عند علامات الترقيم أو المسافات
+
+    دمج الأجزاء يعيد النص الأصلي حرفياً
+    """
+    pieces = []
+    current = ""
+    for part in _RE_PIECE.findall(text):
+        while len(part) > max_chars:
+            cut = part.rfind(" ", 0, max_chars) + 1 or max_chars
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(part[:cut])
+            part = part[cut:]
+        if current and len(current) + len(part) > max_chars:
+            pieces.append(current)
+            current = ""
+        current += part
+    if current:
+        pieces.append(current)
+    return pieces
@@ -0,0 +1,31 @@
+# app/utils/timing.py
+"""
+أزمنة مراحل الطلب - metadata.timings وسطر سجل منظم (JSON) لكل طلب
+"""
+import json
+import time
+from contextlib import contextmanager
+from app.core.logging_config import logger
+
+
+@contextmanager
+def stage(timings: dict, name: str):
+    """
+    قياس مرحلة بالميلي ثانية في timings[name]
+
+    تكرار نفس المرحلة يجمع أزمنتها؛ timings=None لا يقيس شيئاً
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            elapsed = (time.perf_counter() - started) * 1000
+            timings[name] = round(timings.get(name, 0) + elapsed, 2)
+
+
+def log_timings(event: str, timings: dict, **fields):
+    """سطر سجل واحد قابل للتحليل: {"event", "timings", ...الحقول}"""
+    logger.info("⏱️ " + json.dumps(
+        {"event": event, "timings": timings, **fields}, ensure_ascii=False, default=str
+    ))
@@ -0,0 +1,74 @@
+# app/utils/uploads.py
+"""
+حفظ الملفات المرفوعة على القرص بأجزاء ثابتة الحجم (aiofiles)
+
+لا يُحمَّل الملف كاملاً في الذاكرة: الحجم الأقصى وبصمة SHA-256 تُحسبان أثناء
+الكتابة، والاستخراج يعمل بعدها من المسار
+"""
+import os
+import uuid
+import hashlib
+from typing import Optional
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException
+from app.config import settings
+
+
+def safe_upload_path(directory: str, filename: Optional[str], keep_name: bool = False) -> str:
+    """
+    مسار فريد داخل مجلد الرفع
+
+    keep_name: uuid_الاسم الأصلي (وإلا uuid + الامتداد فقط)
+    """
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.basename(filename or "")
+    if keep_name and base:
+        name = f"{uuid.uuid4()}_{base}"
+    else:
+        name = f"{uuid.uuid4()}{os.path.splitext(base)[1].lower() or '.bin'}"
+    return os.path.join(directory, name)
+
+
+async def save_upload(upload, file_path: str, max_size: int = None,
+                      expected_sha256: Optional[str] = None, chunk_size: int = None) -> dict:
+    """
+    نسخ UploadFile إلى file_path جزءاً جزءاً
+
+    - تجاوز max_size: حذف الملف الجزئي + 413
+    - expected_sha256 لا يطابق المحتوى: حذف الملف + 400
+
+    Returns:
+        {"path", "size", "sha256"}
+    """
+    max_size = max_size or settings.MAX_FILE_SIZE
+    chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(file_path, "wb") as out:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"حجم الملف يتجاوز الحد المسموح ({max_size / (1024 * 1024):.1f}MB)"
+                    )
+                digest.update(chunk)
+                await out.write(chunk)
+
+        sha256 = digest.hexdigest()
+        if expected_sha256 and expected_sha256.strip().lower() != sha256:
+            raise HTTPException(status_code=400, detail="بصمة SHA-256 لا تطابق محتوى الملف")
+    except BaseException:
+        # لا نترك ملفات جزئية أو مرفوضة في مجلد الرفع
+        try:
+            await aiofiles.os.remove(file_path)
+        except OSError:
+            pass
+        raise
+
+    return {"path": file_path, "size": size, "sha256": sha256}
@@ -14,7 +14,18 @@ app = FastAPI(
     redoc_url="/redoc",
 )
 
-# ====== CORS ======
+# ====== توجيه القراءة/الكتابة + عدّاد الاستعلامات لكل طلب ======
+from app.core.request_scope import DBRequestScopeMiddleware
+
+app.add_middleware(DBRequestScopeMiddleware)
+
+
+# ====== التحكم في القبول (حد تزامن لكل فئة + 429/503 مع Retry-After) ======
+from app.core.admission import AdmissionMiddleware
+
+app.add_middleware(AdmissionMiddleware)
+
+# ====== CORS (يُضاف أخيراً ليبقى الطبقة الخارجية: ردود 429/503 تحمل ترويساته) ======
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -23,6 +34,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+# ====== التجمع ممتلئ: رد سريع 503 بدلاً من انتظار مفتوح ======
+from fastapi.responses import JSONResponse
+from app.db.pool import PoolTimeoutError
+
+
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(request, exc):
+    return JSONResponse(
+        status_code=503,
+        content={"status": "error", "detail": "الخادم مشغول، حاول مرة أخرى"},
+        headers={"Retry-After": "1"},
+    )
+
+
 # ====== تسجيل الـ Routers ======
 
 # 1. Health (موجود ويعمل)
@@ -41,6 +67,14 @@ try:
 except ImportError as e:
     print(f"⚠️ Chat router: {e}")
 
+# 2b. Chat Batch (عدة أسئلة في طلب واحد)
+try:
+    from app.api.v1.endpoints import chat_batch
+    app.include_router(chat_batch.router, prefix="/api/v1", tags=["chat"])
+    print("✅ Chat batch router OK")
+except ImportError as e:
+    print(f"⚠️ Chat batch router: {e}")
+
 # 3. Questions (موجود)
 try:
     from app.api.v1.endpoints import questions
@@ -81,6 +115,14 @@ try:
 except ImportError as e:
     print(f"⚠️ Feedback router: {e}")
 
+# 8. Ingest Jobs (حالة مسار الإدخال)
+try:
+    from app.api.v1.endpoints import ingest
+    app.include_router(ingest.router, prefix="/api/v1", tags=["ingest"])
+    print("✅ Ingest router OK")
+except ImportError as e:
+    print(f"⚠️ Ingest router: {e}")
+
 
 # ====== الصفحة الرئيسية ======
 @app.get("/")
@@ -113,9 +155,52 @@ async def startup():
     print("💬 Chat:    POST /api/v1/chat")
     print("=" * 60 + "\n")
 
+    # تجمع الاتصالات (عند الفشل يُعاد الاتصال عند أول طلب)
+    try:
+        from app.db.base import init_pool
+        if init_pool():
+            print("✅ DB pool OK")
+        else:
+            print("⚠️ DB pool: فشل التهيئة - سيُعاد الاتصال عند أول طلب")
+    except Exception as e:
+        print(f"⚠️ DB pool: {e}")
+
+    # عمّال المهام الخلفية (يستأنفون ما بقي في ai_jobs من تشغيل سابق)
+    try:
+        from app.config import settings
+        from app.background.runner import job_runner
+        if settings.JOBS_ENABLED:
+            job_runner.start()
+    except Exception as e:
+        print(f"⚠️ Jobs: {e}")
+
 
 @app.on_event("shutdown")
 async def shutdown():
+    # إنهاء المهام الجارية
+    try:
+        from app.background.runner import job_runner
+        job_runner.stop()
+    except Exception as e:
+        print(f"⚠️ Jobs: {e}")
+    # إيقاف عمليات الاستخراج
+    try:
+        from app.utils.extraction_pool import extraction_pool
+        extraction_pool.shutdown()
+    except Exception as e:
+        print(f"⚠️ Extraction pool: {e}")
+    # تفريغ الكتابات المؤجلة (الخيط يبدأ عند أول استخدام)
+    try:
+        from app.db.write_behind import write_behind
+        write_behind.stop()
+    except Exception as e:
+        print(f"⚠️ Write-behind: {e}")
+    # إغلاق تجمع الاتصالات بعد آخر كتابة
+    try:
+        from app.db.base import close_pool
+        close_pool()
+    except Exception as e:
+        print(f"⚠️ DB pool: {e}")
     print("\n🛑 إيقاف FastAPI...\n")
 
 
@@ -0,0 +1,41 @@
+# tests/conftest.py
+"""
+إعداد الاختبارات - قاعدة SQLite مؤقتة بدلاً من MySQL
+
+المتغيرات تُضبط قبل أي استيراد من app (الإعدادات تُقرأ عند استيراد app.config)
+DB_BACKEND=mysql من البيئة يُحترم (test_query_plans يحتاجه بعد alembic upgrade head)
+"""
+import os
+import shutil
+import tempfile
+import pytest
+
+_TMP = tempfile.mkdtemp(prefix="ai_engine_tests_")
+os.environ.setdefault("DB_BACKEND", "sqlite")
+os.environ.update({
+    "SQLITE_PATH": os.path.join(_TMP, "ai_engine.db"),
+    "WRITE_BEHIND_JOURNAL_DIR": os.path.join(_TMP, "write_behind"),
+    "UPLOAD_DIR": os.path.join(_TMP, "uploads"),
+    "JOBS_ENABLED": "false",
+})
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    """تجمع SQLite للجلسة كاملة؛ يُفرَّغ الطابور المؤجل ويُحذف الملف في النهاية"""
+    from app.db.base import init_pool, close_pool
+    from app.db.write_behind import write_behind
+
+    init_pool()
+    yield
+    write_behind.stop()
+    close_pool()
+    shutil.rmtree(_TMP, ignore_errors=True)
+
+
+@pytest.fixture
+def tmp_dir():
+    """مجلد مؤقت داخل مجلد الجلسة"""
+    path = tempfile.mkdtemp(dir=_TMP)
+    yield path
+    shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,121 @@
+# tests/test_admission.py
+"""
+التحكم في القبول - 429 عند امتلاء الطابور، 503 عند انتهاء مهلة الانتظار،
+وتسليم المكان مباشرة لأقدم منتظر
+"""
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from app.core.admission import (
+    AdmissionGate, AdmissionRejected, AdmissionController, parse_limits, admission,
+)
+import main
+import app.main
+
+
+def test_full_queue_rejects_with_429():
+    async def scenario():
+        gate = AdmissionGate("chat", limit=1, queue_size=1, timeout=5)
+        await gate.acquire()
+        waiter = asyncio.create_task(gate.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await gate.acquire()
+        gate.release()
+        await waiter
+        return gate, rejected.value
+
+    gate, error = asyncio.run(scenario())
+    assert error.status_code == 429
+    assert error.retry_after >= 1
+    assert gate.status()["rejected_full"] == 1
+
+
+def test_queue_timeout_rejects_with_503():
+    async def scenario():
+        gate = AdmissionGate("chat", limit=1, queue_size=1, timeout=0.01)
+        await gate.acquire()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await gate.acquire()
+        return gate, rejected.value
+
+    gate, error = asyncio.run(scenario())
+    assert error.status_code == 503
+    assert gate.queued == 0
+    assert gate.status()["rejected_timeout"] == 1
+
+
+def test_release_hands_slot_to_oldest_waiter():
+    async def scenario():
+        gate = AdmissionGate("chat", limit=1, queue_size=2, timeout=5)
+        order = []
+        await gate.acquire()
+
+        async def wait(name):
+            await gate.acquire()
+            order.append(name)
+
+        first = asyncio.create_task(wait("first"))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(wait("second"))
+        await asyncio.sleep(0)
+
+        gate.release()
+        await first
+        # المكان انتقل ولم يتحرر: active ثابت
+        assert gate.active == 1 and gate.queued == 1
+        gate.release()
+        await second
+        gate.release()
+        return gate, order
+
+    gate, order = asyncio.run(scenario())
+    assert order == ["first", "second"]
+    assert gate.active == 0
+
+
+def test_cancelled_waiter_frees_its_place():
+    async def scenario():
+        gate = AdmissionGate("chat", limit=1, queue_size=1, timeout=5)
+        await gate.acquire()
+        waiter = asyncio.create_task(gate.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        gate.release()
+        return gate
+
+    gate = asyncio.run(scenario())
+    assert gate.active == 0 and gate.queued == 0
+
+
+def test_parse_limits_skips_invalid_entries():
+    assert parse_limits("chat:16:32,upload:x:8,admin:2") == {"chat": (16, 32), "admin": (2, 0)}
+
+
+def test_endpoint_classes():
+    controller = AdmissionController(limits={"chat": (1, 1), "upload": (1, 1), "admin": (1, 1)})
+
+    assert controller.gate_for("POST", "/api/v1/chat").name == "chat"
+    assert controller.gate_for("POST", "/api/v1/chat/with-image").name == "upload"
+    assert controller.gate_for("GET", "/api/v1/health/admission") is None
+    assert controller.gate_for("GET", "/api/v1/threads") is None
+
+
+@pytest.mark.parametrize("application", [main.app, app.main.app], ids=["main", "app.main"])
+def test_rejection_carries_cors_headers(application, monkeypatch):
+    # CORS هو الطبقة الخارجية: المتصفح يقرأ 429 وRetry-After بدل خطأ CORS
+    full = AdmissionGate("chat", limit=1, queue_size=0, timeout=1)
+    full.active = 1
+    monkeypatch.setitem(admission.gates, "chat", full)
+
+    response = TestClient(application).post(
+        "/api/v1/chat/json",
+        json={"question": "سؤال"},
+        headers={"Origin": "https://qooqz.example"},
+    )
+
+    assert response.status_code == 429
+    assert response.headers["access-control-allow-origin"] == "https://qooqz.example"
+    assert "retry-after" in response.headers
@@ -0,0 +1,106 @@
+# tests/test_chat_service.py
+"""
+ChatService (chat / chat_async) ونقطة النهاية /chat/json التي تستخدمها
+"""
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from mysql.connector import Error
+from app.services import chat_service as chat_module
+from app.services.chat_service import chat_service
+from app.repositories.thread_repo import ThreadRepository
+from app.repositories.message_repo import MessageRepository
+from app.repositories.memory_repo import MemoryRepository
+from app.db.write_behind import write_behind, WriteBehindQueue
+from app.db.session import execute_query
+from app.background.runner import job_runner
+from app.config import settings
+import main
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+def test_chat_json_saves_turn(client):
+    response = client.post("/api/v1/chat/json", json={"question": "ما هو الذكاء الاصطناعي؟"})
+    write_behind.flush()
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "ok"
+    assert body["metadata"]["is_new_thread"] is True
+    assert {"retrieval", "generate", "save"} <= set(body["metadata"]["timings"])
+    assert ThreadRepository.get_by_id(body["thread_id"]) is not None
+    roles = [m["role"] for m in MessageRepository.get_thread_messages(body["thread_id"])]
+    assert roles == ["user", "assistant"]
+
+
+def test_chat_json_failed_turn_leaves_no_thread(client, monkeypatch):
+    def fail(*args, **kwargs):
+        raise Error(msg="فشل مصطنع")
+
+    threads = ThreadRepository.count()
+    monkeypatch.setattr(MessageRepository, "create", staticmethod(fail))
+    response = client.post("/api/v1/chat/json", json={"question": "سؤال بلا حفظ"})
+
+    # المحادثة ورسالة المستخدم معاملة واحدة: فشل الرسالة يلغي المحادثة وعدادها
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert ThreadRepository.count() == threads
+
+
+def test_chat_async_continues_existing_thread():
+    first = chat_service.chat("سؤال أول")
+    result = asyncio.run(chat_service.chat_async("سؤال ثانٍ", thread_id=first["thread_id"]))
+    write_behind.flush()
+
+    assert result["thread_id"] == first["thread_id"]
+    assert result["metadata"]["is_new_thread"] is False
+    assert result["metadata"]["timed_out"] == []
+    assert {"thread", "memory", "retrieval", "generate", "save"} <= set(result["metadata"]["timings"])
+    assert len(MessageRepository.get_thread_messages(first["thread_id"])) == 4
+
+
+def test_chat_async_unknown_thread_starts_new_one():
+    result = asyncio.run(chat_service.chat_async("سؤال", thread_id="01890000-0000-7000-8000-000000000000"))
+
+    assert result["metadata"]["is_new_thread"] is True
+    assert result["thread_id"] != "01890000-0000-7000-8000-000000000000"
+    assert ThreadRepository.get_by_id(result["thread_id"]) is not None
+
+
+def memory_jobs(thread_id: str) -> list:
+    return execute_query(
+        "SELECT status, run_after FROM ai_jobs WHERE task = %s AND payload LIKE %s",
+        ("memory.update", f"%{thread_id}%"),
+    )
+
+
+def test_memory_job_is_written_with_assistant_message(tmp_dir, monkeypatch):
+    queue = WriteBehindQueue(batch_size=10, journal_dir=tmp_dir)
+    monkeypatch.setattr(chat_module, "deferred", lambda: queue)
+    monkeypatch.setattr(settings, "JOBS_ENABLED", True)
+    monkeypatch.setattr(job_runner, "start", lambda: None)
+    monkeypatch.setattr(job_runner, "notify", lambda queue: None)
+
+    result = chat_service.chat("سؤال للذاكرة")
+    thread_id = result["thread_id"]
+    # الرد ما زال في الطابور: لا مهمة يمكن أن تلخص المحادثة بدونه
+    assert memory_jobs(thread_id) == []
+
+    queue.flush()
+    jobs = memory_jobs(thread_id)
+    assert [job["status"] for job in jobs] == ["queued"]
+    assert len(MessageRepository.get_thread_messages(thread_id)) == 2
+
+
+def test_memory_updates_directly_without_jobs():
+    result = chat_service.chat("سؤال بلا طابور مهام")
+    write_behind.flush()
+
+    assert memory_jobs(result["thread_id"]) == []
+    assert MemoryRepository.get(result["thread_id"])["message_count"] >= 1
+
@@ -0,0 +1,69 @@
+# tests/test_ids.py
+"""
+المعرفات - ترتيب UUIDv7، تحويل db_id()، وفك أعمدة المعرفات فقط في decode_row()
+"""
+import uuid
+from app.db import ids
+from app.db.ids import uuid7, new_id, db_id, decode_row, decode_rows
+from app.config import settings
+
+
+def test_uuid7_is_version_7_and_increasing():
+    values = [uuid7() for _ in range(5000)]
+
+    assert all(v.version == 7 and v.variant == uuid.RFC_4122 for v in values)
+    assert values == sorted(values)
+    assert len(set(values)) == len(values)
+
+
+def test_new_id_sorts_as_text():
+    values = [new_id() for _ in range(100)]
+    assert values == sorted(values)
+
+
+def test_db_id_passthrough_without_binary_ids(monkeypatch):
+    monkeypatch.setattr(settings, "DB_BINARY_IDS", False)
+    value = new_id()
+
+    assert db_id(value) == value
+    assert db_id(None) is None
+
+
+def test_db_id_binary(monkeypatch):
+    monkeypatch.setattr(settings, "DB_BINARY_IDS", True)
+    value = new_id()
+    legacy = str(uuid.uuid4())
+
+    assert db_id(value) == uuid.UUID(value).bytes
+    assert db_id(legacy) == uuid.UUID(legacy).bytes
+    assert db_id(value.upper()) == uuid.UUID(value).bytes
+    # قيمة غير صالحة تُمرَّر كما هي (لن تطابق أي صف)
+    assert db_id("not-an-id") == "not-an-id"
+    assert db_id(b"\x00" * 16) == b"\x00" * 16
+
+
+def test_decode_row_only_touches_id_columns():
+    value = uuid7()
+    blob = b"\x01" * 16
+    row = {"id": value.bytes, "thread_id": value.bytes, "last_message_id": value.bytes,
+           "content_hash": blob, "title": "x"}
+
+    decode_row(row)
+
+    assert row["id"] == row["thread_id"] == row["last_message_id"] == str(value)
+    assert row["content_hash"] == blob
+    assert row["title"] == "x"
+
+
+def test_decode_rows_only_with_binary_ids(monkeypatch):
+    value = uuid7()
+    monkeypatch.setattr(settings, "DB_BINARY_IDS", False)
+    assert decode_rows([{"id": value.bytes}]) == [{"id": value.bytes}]
+
+    monkeypatch.setattr(settings, "DB_BINARY_IDS", True)
+    assert decode_rows([{"id": value.bytes}]) == [{"id": str(value)}]
+
+
+def test_id_column_names_match_migration():
+    assert "last_message_id" in ids.ID_COLUMN_NAMES
+    assert {"id", "thread_id", "message_id", "file_id"} <= ids.ID_COLUMN_NAMES
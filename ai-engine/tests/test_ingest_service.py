@@ -0,0 +1,61 @@
+# tests/test_ingest_service.py
+"""
+مسار الإدخال extract -> chunk -> insert -> index على قاعدة SQLite
+"""
+import os
+from app.services.ingest_service import ingest_service, throughput
+from app.repositories.file_repo import FileRepository
+from app.repositories.document_repo import DocumentRepository
+from app.repositories.chunk_repo import ChunkRepository
+from app.repositories.knowledge_base_repo import KnowledgeBaseRepository
+
+TEXT = "الذكاء الاصطناعي فرع من علوم الحاسوب. " * 200
+
+
+def saved_file(directory: str, content: str) -> str:
+    path = os.path.join(directory, "doc.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return FileRepository.create("doc.txt", "text/plain", len(content.encode("utf-8")), path)
+
+
+def test_ingest_runs_all_stages(tmp_dir):
+    kb_id = KnowledgeBaseRepository.create("ingest")
+    file_id = saved_file(tmp_dir, TEXT)
+
+    result = ingest_service.run(file_id, knowledge_base_id=kb_id)
+
+    assert result["indexed"] is True
+    assert result["chunks"] > 1
+    assert FileRepository.get_by_id(file_id)["extracted_text"].strip() == TEXT.strip()
+    documents = DocumentRepository.get_by_knowledge_base(kb_id)
+    assert [d["id"] for d in documents] == [result["document_id"]]
+    assert len(ChunkRepository.get_by_document(result["document_id"])) == result["chunks"]
+
+
+def test_ingest_without_knowledge_base_stops_after_extract(tmp_dir):
+    file_id = saved_file(tmp_dir, TEXT)
+
+    result = ingest_service.run(file_id)
+
+    assert result["document_id"] is None
+    assert result["chunks"] == 0
+    assert result["indexed"] is False
+    assert result["chars"] > 0
+
+
+def test_ingest_missing_file_is_skipped():
+    assert ingest_service.run("01890000-0000-7000-8000-000000000000")["skipped"] is True
+
+
+def test_throughput_from_progress():
+    progress = {
+        "started_at": 10.0, "updated_at": 12.0,
+        "stages": {"extract": {"ms": 500, "bytes": 1000}, "insert": {"ms": 250, "rows": 10}},
+    }
+
+    assert throughput(progress) == {
+        "elapsed_ms": 2000.0,
+        "extract_bytes_per_second": 2000.0,
+        "insert_chunks_per_second": 40.0,
+    }
@@ -0,0 +1,90 @@
+# tests/test_instrumentation.py
+"""
+قياس الاستعلامات - الفشل يُعد في errors لكل مسار تنفيذ، وعدّاد الطلب يشمل الردود المتدفقة
+"""
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from mysql.connector import Error
+from app.db import instrumentation
+from app.db.instrumentation import fingerprint, query_stats
+from app.db.session import execute_query, execute_many
+from app.db.unit_of_work import UnitOfWork
+from app.core.request_scope import DBRequestScopeMiddleware
+from app.config import settings
+
+BAD_SELECT = "SELECT id FROM ai_missing_table WHERE id = %s"
+BAD_INSERT = "INSERT INTO ai_missing_table (id) VALUES (%s)"
+COUNT_KB = "SELECT COUNT(*) AS n FROM ai_knowledge_bases WHERE name = %s"
+
+
+def errors_for(query: str) -> int:
+    fp = fingerprint(query)
+    return next((s["errors"] for s in query_stats(limit=10_000) if s["fingerprint"] == fp), 0)
+
+
+@pytest.mark.parametrize("query, run", [
+    (BAD_SELECT, lambda: execute_query(BAD_SELECT, ("x",))),
+    (BAD_SELECT, lambda: execute_query(BAD_SELECT, ("x",), prepared=True)),
+    (BAD_INSERT, lambda: execute_many(BAD_INSERT, [("x",), ("y",)])),
+], ids=["pooled", "prepared", "many"])
+def test_session_failure_is_counted(query, run, monkeypatch):
+    monkeypatch.setattr(settings, "DB_PREPARED_STATEMENTS", True)
+    before = errors_for(query)
+    with pytest.raises(Error):
+        run()
+    assert errors_for(query) == before + 1
+
+
+def test_unit_of_work_failures_are_counted():
+    before_read, before_write = errors_for(BAD_SELECT), errors_for(BAD_INSERT)
+
+    with UnitOfWork() as uow:
+        with pytest.raises(Error):
+            uow.query(BAD_SELECT, ("x",))
+    with UnitOfWork() as uow:
+        uow.add(BAD_INSERT, ("x",))
+        with pytest.raises(Error):
+            uow.flush()
+
+    assert errors_for(BAD_SELECT) == before_read + 1
+    assert errors_for(BAD_INSERT) == before_write + 1
+
+
+def test_request_counter_covers_streamed_body(monkeypatch):
+    app = FastAPI()
+    app.add_middleware(DBRequestScopeMiddleware)
+
+    @app.get("/stream")
+    def stream():
+        def body():
+            for i in range(3):
+                execute_query(COUNT_KB, (f"stream-{i}",))
+                yield f"{i}\n"
+        return StreamingResponse(body(), media_type="text/plain")
+
+    @app.get("/plain")
+    def plain():
+        execute_query(COUNT_KB, ("plain",))
+        return {"ok": True}
+
+    summaries = []
+    end_request = instrumentation.end_request
+
+    def capture(token, path=""):
+        summary = end_request(token, path)
+        summaries.append(summary)
+        return summary
+
+    monkeypatch.setattr(instrumentation, "end_request", capture)
+    client = TestClient(app)
+
+    response = client.get("/plain")
+    assert response.headers["X-DB-Queries"] == "1"
+
+    response = client.get("/stream")
+    assert response.text == "0\n1\n2\n"
+    # الترويسات تُرسل قبل الجسم؛ النطاق يُغلق بعده ويرى الاستعلامات الثلاثة
+    assert response.headers["X-DB-Queries"] == "0"
+    assert summaries[-1]["queries"] == 3
@@ -0,0 +1,62 @@
+# tests/test_job_repo.py
+"""
+طابور المهام - النبض يمنع إعادة مهمة جارية، والمهمة المعلّقة تُعاد ضمن حد المحاولات
+"""
+from datetime import datetime, timedelta
+from app.repositories.job_repo import JobRepository
+from app.db.session import execute_query
+
+QUEUE = "test-stale"
+
+
+def claimed(max_attempts: int) -> dict:
+    job_id = JobRepository.create(QUEUE, "test.noop", {}, max_attempts=max_attempts)
+    jobs = JobRepository.claim(QUEUE, "worker-1")
+    assert [job["id"] for job in jobs] == [job_id]
+    return jobs[0]
+
+
+def age(job_id: str, seconds: float):
+    """آخر نبض قبل seconds ثانية"""
+    execute_query(
+        "UPDATE ai_jobs SET locked_at = %s WHERE id = %s",
+        (datetime.now() - timedelta(seconds=seconds), job_id),
+        fetch=False
+    )
+
+
+def test_stale_job_is_requeued_then_dead_at_max_attempts():
+    job = claimed(max_attempts=2)
+    age(job["id"], 120)
+
+    assert JobRepository.requeue_stale(60) == (1, 0)
+    assert JobRepository.get_by_id(job["id"])["status"] == JobRepository.QUEUED
+
+    # المحاولة الثانية (الأخيرة) توقف عاملها أيضاً
+    job = JobRepository.claim(QUEUE, "worker-2")[0]
+    assert job["attempts"] == 2
+    age(job["id"], 120)
+
+    assert JobRepository.requeue_stale(60) == (0, 1)
+    job = JobRepository.get_by_id(job["id"])
+    assert job["status"] == JobRepository.DEAD
+    assert job["last_error"]
+
+
+def test_heartbeat_keeps_long_job_claimed():
+    job = claimed(max_attempts=5)
+    age(job["id"], 120)
+
+    assert JobRepository.heartbeat([job["id"]]) == 1
+    assert JobRepository.requeue_stale(60) == (0, 0)
+    assert JobRepository.get_by_id(job["id"])["status"] == JobRepository.RUNNING
+    JobRepository.complete(job["id"])
+
+
+def test_progress_update_is_a_heartbeat():
+    job = claimed(max_attempts=5)
+    age(job["id"], 120)
+
+    JobRepository.update_progress(job["id"], {"stage": "extract"})
+    assert JobRepository.requeue_stale(60) == (0, 0)
+    JobRepository.complete(job["id"])
@@ -0,0 +1,33 @@
+# tests/test_mysql_conn.py
+"""
+mysql_conn.execute_query - يستعير من التجمع ويعيد الاتصال، ولا يفتح اتصالاً مباشراً لكل استعلام
+"""
+import mysql.connector
+import pytest
+from app.db import mysql_conn
+from app.db.base import pool_stats
+
+
+@pytest.fixture
+def no_direct_connect(monkeypatch):
+    def connect(*args, **kwargs):
+        raise AssertionError("اتصال مباشر خارج التجمع")
+    monkeypatch.setattr(mysql.connector, "connect", connect)
+
+
+def test_queries_reuse_pooled_connections(no_direct_connect):
+    mysql_conn.execute_query("SELECT 1 AS one")
+    before = pool_stats()["primary"]
+
+    for _ in range(5):
+        assert mysql_conn.execute_query("SELECT 1 AS one") == [{"one": 1}]
+    mysql_conn.execute_query("UPDATE ai_threads SET title = title WHERE id = %s", ("none",))
+
+    after = pool_stats()["primary"]
+    assert after["total"] == before["total"]
+    assert after["in_use"] == 0
+
+
+def test_failed_query_returns_connection(no_direct_connect):
+    assert mysql_conn.execute_query("SELECT id FROM ai_missing_table") is None
+    assert pool_stats()["primary"]["in_use"] == 0
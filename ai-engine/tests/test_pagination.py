@@ -0,0 +1,55 @@
+# tests/test_pagination.py
+"""
+ترقيم الصفحات بالمؤشر - ذهاب وعودة المؤشر، المؤشر التالف (422)، وتسلسل الصفحات
+"""
+from datetime import datetime
+import pytest
+from fastapi.testclient import TestClient
+from app.exceptions import ValidationError
+from app.utils.pagination import encode_cursor, decode_cursor, keyset_condition, build_page
+from app.repositories.thread_repo import ThreadRepository
+from app.db.ids import new_id
+import main
+
+
+def test_cursor_round_trip():
+    row_id = new_id()
+    cursor = encode_cursor("2026-01-02 03:04:05", row_id)
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == ("2026-01-02 03:04:05", row_id)
+
+
+@pytest.mark.parametrize("cursor", ["bad", "!!!", encode_cursor("a", "b")[:-3]])
+def test_invalid_cursor_is_validation_error(cursor):
+    with pytest.raises(ValidationError):
+        keyset_condition("updated_at", cursor)
+
+
+def test_bad_cursor_returns_422():
+    with TestClient(main.app) as client:
+        response = client.get("/api/v1/threads", params={"cursor": "bad"})
+
+    assert response.status_code == 422
+
+
+def test_build_page_cursor_points_at_last_row():
+    rows = [{"id": str(i), "updated_at": datetime(2026, 1, 1, 0, 0, 10 - i)} for i in range(4)]
+    page, next_cursor = build_page(rows, 3, "updated_at")
+
+    assert len(page) == 3
+    assert decode_cursor(next_cursor) == (str(rows[2]["updated_at"]), "2")
+    assert build_page(rows, 4, "updated_at") == (rows, None)
+
+
+def test_pages_cover_all_threads_once():
+    created = {ThreadRepository.create(f"صفحة {i}") for i in range(5)}
+    seen, cursor = [], None
+    while True:
+        threads, cursor = ThreadRepository.list_page(2, cursor)
+        seen.extend(t["id"] for t in threads)
+        if not cursor:
+            break
+
+    assert len(seen) == len(set(seen))
+    assert created <= set(seen)
@@ -0,0 +1,130 @@
+# tests/test_query_plans.py
+"""
+خطط تنفيذ الاستعلامات الساخنة (EXPLAIN) - لا مسح كامل ولا فرز مؤقت
+
+نص الاستعلام ومعاملاته من المستودعات نفسها: كل مسار يُنفَّذ ويُلتقط ما وصل
+للقاعدة (بعد db_id() وشرط مؤشر الصفحة)، ثم يُفحص بـ EXPLAIN. لا نسخ لنص SQL هنا.
+بحث LIKE '%...%' والبحث النصي مستثنيان: لا يمكن لفهرس B-Tree خدمتهما.
+
+الفهارس المفحوصة هي فهارس ترحيلات Alembic على MySQL (type=ALL / Using filesort):
+
+    alembic upgrade head
+    DB_BACKEND=mysql python -m pytest -q -rs tests/test_query_plans.py
+
+على SQLite (الافتراضي في conftest) تُتخطى الوحدة بسبب ظاهر: مخطط sqlite_backend
+ليس المخطط الناتج عن الترحيلات، ونجاحه لا يثبت شيئاً عن فهارس MySQL
+"""
+import os
+from datetime import datetime
+import pytest
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from app.db import session, mysql_conn, unit_of_work
+from app.db.session import get_db
+from app.db.sqlite_backend import is_sqlite
+from app.db.ids import new_id
+from app.utils.pagination import encode_cursor
+from app.repositories.thread_repo import ThreadRepository
+from app.repositories.message_repo import MessageRepository
+from app.repositories.memory_repo import MemoryRepository
+from app.repositories.chunk_repo import ChunkRepository
+from app.repositories.document_repo import DocumentRepository
+from app.repositories.feedback_repo import FeedbackRepository
+from app.repositories.file_repo import FileRepository
+from app.repositories.usage_repo import UsageRepository
+from app.repositories.vision_repo import VisionRepository
+from app.repositories.knowledge_base_repo import KnowledgeBaseRepository
+from app.api.v1.endpoints import threads, files
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+
+SOME_ID = new_id()
+CURSOR = encode_cursor(datetime.now(), new_id())
+
+# (الاسم، المسار) - المسار يُنفَّذ كما في التطبيق
+HOT_PATHS = [
+    ("threads.get", lambda: ThreadRepository.get_by_id(new_id())),
+    ("threads.page", lambda: ThreadRepository.list_page(20)),
+    ("threads.page_cursor", lambda: ThreadRepository.list_page(20, CURSOR)),
+    ("threads.endpoint_cursor", lambda: threads.list_threads(limit=20, cursor=CURSOR)),
+    ("messages.thread", lambda: MessageRepository.get_thread_messages(SOME_ID)),
+    ("messages.recent", lambda: MessageRepository.get_recent_messages(new_id())),
+    ("messages.after", lambda: MessageRepository.get_messages_after(
+        SOME_ID, after_at=datetime.now(), after_id=new_id())),
+    ("messages.count", lambda: MessageRepository.count_thread_messages(SOME_ID)),
+    ("memory.get", lambda: MemoryRepository.get(new_id())),
+    ("chunks.by_document", lambda: ChunkRepository.get_by_document(SOME_ID)),
+    ("chunks.recent", lambda: ChunkRepository.get_all(50)),
+    ("documents.by_kb", lambda: DocumentRepository.get_by_knowledge_base(SOME_ID)),
+    ("feedback.by_message", lambda: FeedbackRepository.get_by_message(SOME_ID)),
+    ("feedback.page_cursor", lambda: FeedbackRepository.list_page(50, CURSOR)),
+    ("files.page_cursor", lambda: FileRepository.list_page(20, CURSOR)),
+    ("files.endpoint_cursor", lambda: files.list_files(limit=20, cursor=CURSOR)),
+    ("usage.by_thread", lambda: UsageRepository.get_thread_usage(SOME_ID)),
+    ("vision.by_file", lambda: VisionRepository.get_by_file(SOME_ID)),
+    ("knowledge_bases.list", lambda: KnowledgeBaseRepository.list_all(20)),
+]
+
+
+@pytest.fixture(scope="module", autouse=True)
+def migrated_schema():
+    """MySQL على آخر ترحيل، وإلا تخطٍّ (SQLite) أو فشل (ترحيل ناقص) بسبب ظاهر"""
+    if is_sqlite():
+        pytest.skip(
+            "خطط الاستعلامات تُفحص على مخطط ترحيلات Alembic فقط: "
+            "شغّل alembic upgrade head ثم DB_BACKEND=mysql python -m pytest tests/test_query_plans.py"
+        )
+    head = ScriptDirectory.from_config(Config(ALEMBIC_INI)).get_current_head()
+    with get_db() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT version_num FROM alembic_version")
+            current = [row[0] for row in cursor.fetchall()]
+        except Exception as e:
+            pytest.fail(f"لا يوجد جدول alembic_version - شغّل alembic upgrade head أولاً ({e})")
+        finally:
+            cursor.close()
+    if current != [head]:
+        pytest.fail(f"قاعدة البيانات على الترحيل {current} وليست على {head} - شغّل alembic upgrade head")
+
+
+@pytest.fixture
+def captured(monkeypatch):
+    """الاستعلامات المنفَّذة فعلاً [(query, params)] عبر كل مسارات التنفيذ"""
+    queries = []
+    for module in (session, mysql_conn, unit_of_work):
+        original = module.record_query
+
+        def record(query, started, rows=None, params=None, error=None, _original=original):
+            queries.append((query, params))
+            return _original(query, started, rows, params, error=error)
+
+        monkeypatch.setattr(module, "record_query", record)
+    return queries
+
+
+def plan_problems(query: str, params) -> list:
+    """مشاكل خطة استعلام واحد: مسح كامل للجدول أو فرز مؤقت"""
+    problems = []
+    with get_db(readonly=True) as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("EXPLAIN " + query, params)
+            for step in cursor.fetchall():
+                extra = step.get("Extra") or ""
+                if step.get("type") == "ALL" or "Using filesort" in extra:
+                    problems.append(
+                        f"{step.get('table')} type={step.get('type')} key={step.get('key')} {extra}"
+                    )
+        finally:
+            cursor.close()
+    return problems
+
+
+@pytest.mark.parametrize("name,path", HOT_PATHS, ids=[name for name, _ in HOT_PATHS])
+def test_hot_query_uses_index(name, path, captured):
+    path()
+    selects = [(q, p) for q, p in captured if q.lstrip().upper().startswith("SELECT")]
+    assert selects, f"{name}: لم يُنفَّذ أي استعلام"
+    for query, params in selects:
+        assert plan_problems(query, params or ()) == [], f"{name}: {' '.join(query.split())}"
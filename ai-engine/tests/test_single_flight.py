@@ -0,0 +1,78 @@
+# tests/test_single_flight.py
+"""
+SingleFlight - قائد واحد لكل مفتاح، والمتابعون يتشاركون النتيجة أو الاستثناء
+"""
+import time
+import threading
+import pytest
+from app.utils.single_flight import SingleFlight
+
+
+def run_concurrently(flight, key, fn, count: int) -> list:
+    """count طلبات بنفس المفتاح في خيوط -> (الخيوط، [(النتيجة أو الاستثناء، مشتركة؟)])"""
+    results = [None] * count
+
+    def call(idx):
+        try:
+            results[idx] = flight.do(key, fn)
+        except Exception as e:
+            results[idx] = (e, True)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+    for t in threads:
+        t.start()
+    return threads, results
+
+
+def test_followers_share_leader_result():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return "نتيجة"
+
+    threads, results = run_concurrently(flight, "k", compute, 5)
+    while flight.status()["coalesced"] < 4:
+        time.sleep(0.001)
+    release.set()
+    for t in threads:
+        t.join(5)
+
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert all(value == "نتيجة" for value, _ in results)
+    assert flight.status() == {"in_flight": 0, "leaders": 1, "coalesced": 4}
+
+
+def test_followers_share_leader_exception():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def compute():
+        release.wait(5)
+        raise ValueError("فشل")
+
+    threads, results = run_concurrently(flight, "k", compute, 3)
+    while flight.status()["coalesced"] < 2:
+        time.sleep(0.001)
+    release.set()
+    for t in threads:
+        t.join(5)
+
+    errors = [value for value, _ in results]
+    assert all(isinstance(e, ValueError) for e in errors)
+    assert errors[0] is errors[1] is errors[2]
+
+
+def test_no_caching_after_completion():
+    flight = SingleFlight()
+    counter = iter(range(10))
+
+    assert flight.do("k", lambda: next(counter)) == (0, False)
+    assert flight.do("k", lambda: next(counter)) == (1, False)
+    with pytest.raises(StopIteration):
+        flight.do("k", lambda: next(iter(())))
+    assert flight.status()["in_flight"] == 0
@@ -0,0 +1,29 @@
+# tests/test_sqlite_backend.py
+"""
+واجهة SQLite - نفس نتائج mysql-connector التي يعتمد عليها execute_query
+"""
+from app.db.session import execute_query
+from app.db.ids import new_id
+from app.db.sqlite_backend import translate
+
+
+def test_update_returns_rowcount_not_previous_insert_rowid():
+    execute_query("INSERT INTO ai_knowledge_bases (id, name) VALUES (%s, %s)",
+                  (new_id(), "sqlite-rowcount"), fetch=False)
+
+    assert execute_query("UPDATE ai_knowledge_bases SET description = %s WHERE name = %s",
+                         ("x", "no-such-kb"), fetch=False) == 0
+    assert execute_query("UPDATE ai_knowledge_bases SET description = %s WHERE name = %s",
+                         ("x", "sqlite-rowcount"), fetch=False) == 1
+
+
+def test_translate_mysql_syntax():
+    sql, locking = translate(
+        "INSERT INTO t (a) VALUES (%s) ON DUPLICATE KEY UPDATE a = a + VALUES(a)"
+    )
+    assert sql == "INSERT INTO t (a) VALUES (?) ON CONFLICT DO UPDATE SET a = a + excluded.a"
+    assert locking is False
+    assert translate("SELECT id FROM t WHERE a = %s FOR UPDATE SKIP LOCKED") == (
+        "SELECT id FROM t WHERE a = ?", True
+    )
+    assert translate("INSERT IGNORE INTO t VALUES (%s)")[0] == "INSERT OR IGNORE INTO t VALUES (?)"
@@ -0,0 +1,75 @@
+# tests/test_unit_of_work.py
+"""
+UnitOfWork - commit واحد، تراجع كامل عند الخطأ، ودمج INSERT المتتالي
+"""
+import pytest
+from app.db.unit_of_work import UnitOfWork
+from app.db.session import execute_query
+from app.db.ids import new_id
+
+INSERT_KB = "INSERT INTO ai_knowledge_bases (id, name) VALUES (%s, %s)"
+
+
+def kb_exists(kb_id: str) -> bool:
+    return bool(execute_query("SELECT id FROM ai_knowledge_bases WHERE id = %s", (kb_id,)))
+
+
+def test_commit_writes_everything():
+    ids = [new_id(), new_id()]
+    with UnitOfWork() as uow:
+        for kb_id in ids:
+            uow.add(INSERT_KB, (kb_id, "uow-commit"))
+
+    assert all(kb_exists(kb_id) for kb_id in ids)
+
+
+def test_exception_rolls_back_flushed_writes():
+    kb_id = new_id()
+    with pytest.raises(RuntimeError):
+        with UnitOfWork() as uow:
+            uow.add(INSERT_KB, (kb_id, "uow-rollback"))
+            uow.flush()
+            raise RuntimeError("فشل بعد flush")
+
+    assert not kb_exists(kb_id)
+
+
+def test_swallowed_error_still_rolls_back():
+    kb_id = new_id()
+    with UnitOfWork() as uow:
+        uow.add(INSERT_KB, (kb_id, "uow-failed"))
+        try:
+            uow.query("SELECT * FROM no_such_table")
+        except Exception:
+            pass
+        assert uow.failed
+        with pytest.raises(Exception):
+            uow.flush()
+
+    assert not kb_exists(kb_id)
+
+
+def test_consecutive_inserts_merge_into_one_statement():
+    ids = [new_id() for _ in range(5)]
+    with UnitOfWork() as uow:
+        for kb_id in ids:
+            uow.add(INSERT_KB, (kb_id, "uow-batch"))
+        assert len(uow._pending) == 1
+
+    # executemany واحد + commit
+    assert uow.round_trips == 2
+    assert all(kb_exists(kb_id) for kb_id in ids)
+
+
+def test_after_commit_runs_only_on_success():
+    calls = []
+    with UnitOfWork() as uow:
+        uow.add(INSERT_KB, (new_id(), "uow-callback"))
+        uow.after_commit(lambda: calls.append("ok"))
+
+    with pytest.raises(RuntimeError):
+        with UnitOfWork() as uow:
+            uow.after_commit(lambda: calls.append("rolled back"))
+            raise RuntimeError
+
+    assert calls == ["ok"]
@@ -0,0 +1,60 @@
+# tests/test_uploads.py
+"""
+حفظ الملفات المرفوعة - الحد الأقصى للحجم (413) وبصمة SHA-256 (400)
+"""
+import io
+import os
+import asyncio
+import hashlib
+import pytest
+from fastapi import HTTPException
+from starlette.datastructures import UploadFile
+from app.utils.uploads import save_upload, safe_upload_path
+
+CONTENT = "محتوى ملف للاختبار\n".encode("utf-8") * 100
+
+
+def upload() -> UploadFile:
+    return UploadFile(io.BytesIO(CONTENT), filename="test.txt")
+
+
+def test_save_upload_writes_file_and_hash(tmp_dir):
+    path = safe_upload_path(tmp_dir, "test.txt")
+    saved = asyncio.run(save_upload(upload(), path, chunk_size=64))
+
+    assert saved == {"path": path, "size": len(CONTENT), "sha256": hashlib.sha256(CONTENT).hexdigest()}
+    with open(path, "rb") as f:
+        assert f.read() == CONTENT
+
+
+def test_oversized_upload_is_rejected_and_removed(tmp_dir):
+    path = safe_upload_path(tmp_dir, "test.txt")
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(save_upload(upload(), path, max_size=len(CONTENT) - 1, chunk_size=64))
+
+    assert rejected.value.status_code == 413
+    assert not os.path.exists(path)
+
+
+def test_hash_mismatch_is_rejected_and_removed(tmp_dir):
+    path = safe_upload_path(tmp_dir, "test.txt")
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(save_upload(upload(), path, expected_sha256="0" * 64))
+
+    assert rejected.value.status_code == 400
+    assert not os.path.exists(path)
+
+
+def test_expected_hash_is_case_insensitive(tmp_dir):
+    path = safe_upload_path(tmp_dir, "test.txt")
+    expected = hashlib.sha256(CONTENT).hexdigest().upper()
+
+    assert asyncio.run(save_upload(upload(), path, expected_sha256=f" {expected} "))["size"] == len(CONTENT)
+
+
+def test_safe_upload_path_drops_directories(tmp_dir):
+    path = safe_upload_path(tmp_dir, "../../etc/passwd.TXT", keep_name=True)
+
+    assert os.path.dirname(path) == tmp_dir
+    assert path.endswith("_passwd.TXT")
+    assert safe_upload_path(tmp_dir, "../x.PDF").endswith(".pdf")
@@ -0,0 +1,100 @@
+# tests/test_write_behind.py
+"""
+الكتابة المؤجلة - الطابور الممتلئ يُكتب في السجل، والسجل يُعاد كتابته لاحقاً،
+والصف مع عداده عنصر واحد لا يتكرر عند الإعادة
+"""
+import os
+import json
+from app.db.write_behind import WriteBehindQueue, _dump, _load
+from app.db.session import execute_query
+from app.db.ids import new_id
+from app.repositories.counter_repo import CounterRepository
+from app.repositories.usage_repo import UsageRepository
+from app.repositories.thread_repo import ThreadRepository
+from app.repositories.message_repo import MessageRepository
+
+INSERT_KB = "INSERT INTO ai_knowledge_bases (id, name) VALUES (%s, %s)"
+
+
+def kb_count(name: str) -> int:
+    rows = execute_query("SELECT COUNT(*) AS n FROM ai_knowledge_bases WHERE name = %s", (name,))
+    return rows[0]["n"]
+
+
+def journal(directory: str) -> list:
+    return sorted(n for n in os.listdir(directory) if n.startswith("pending-"))
+
+
+def test_journal_round_trip():
+    item = ((("INSERT a", (b"\x00\x01", 1.5, "نص", None)), ("INSERT b", None)), 2)
+    assert _load(_dump(item)) == item
+
+
+def test_journal_reads_single_statement_lines():
+    line = json.dumps({"q": "INSERT", "p": [1, "x"], "a": 1})
+    assert _load(line) == ((("INSERT", (1, "x")),), 1)
+
+
+def test_full_queue_spills_and_replays(tmp_dir):
+    queue = WriteBehindQueue(max_items=2, batch_size=10, journal_dir=tmp_dir)
+    for _ in range(5):
+        queue.add(INSERT_KB, (new_id(), "wb-spill"))
+
+    status = queue.status()
+    assert status["depth"] == 2
+    assert status["spilled"] == 3
+    assert journal(tmp_dir)
+
+    queue.flush()
+    assert kb_count("wb-spill") == 2
+
+    queue._replay()
+    assert kb_count("wb-spill") == 5
+    assert queue.status()["replayed"] == 3
+    assert journal(tmp_dir) == []
+
+
+def test_replayed_duplicates_are_skipped(tmp_dir):
+    queue = WriteBehindQueue(max_items=10, batch_size=10, journal_dir=tmp_dir)
+    kb_id = new_id()
+    queue.add(INSERT_KB, (kb_id, "wb-duplicate"))
+    queue.flush()
+
+    # نفس العنصر في السجل (كُتب قبل أن يُحذف من السجل مثلاً)
+    queue._spill([(((INSERT_KB, (kb_id, "wb-duplicate")),), 0)])
+    queue._replay()
+
+    assert kb_count("wb-duplicate") == 1
+    assert queue.status()["duplicates"] == 1
+
+
+def test_replayed_usage_keeps_counters(tmp_dir):
+    queue = WriteBehindQueue(max_items=10, batch_size=10, journal_dir=tmp_dir)
+    thread_id = ThreadRepository.create("wb-usage")
+    UsageRepository.log(thread_id, "m", tokens_input=7, tokens_output=3, uow=queue)
+    assert queue.status()["depth"] == 1  # الصف وعداده عنصر واحد
+
+    item = queue._items[0]
+    queue.flush()
+    before = CounterRepository.get(CounterRepository.USAGE_INPUT)
+    assert before[CounterRepository.USAGE_INPUT]["total"] >= 7
+
+    # العنصر نفسه من السجل (فشل flush بعد commit مثلاً): دفعة ثم عنصراً عنصراً
+    queue._spill([item, item])
+    queue._replay()
+
+    assert len(UsageRepository.get_thread_usage(thread_id)) == 1
+    assert CounterRepository.get(CounterRepository.USAGE_INPUT) == before
+    assert queue.status()["duplicates"] == 2
+
+
+def test_deferred_message_keeps_turn_time(tmp_dir):
+    queue = WriteBehindQueue(max_items=10, batch_size=10, journal_dir=tmp_dir)
+    thread_id = ThreadRepository.create("wb-order")
+    MessageRepository.create(thread_id, "assistant", "رد مؤجل", uow=queue)
+    # رسالة الدورة التالية تصل القاعدة قبل أن يُكتب الرد المؤجل
+    MessageRepository.create(thread_id, "user", "سؤال تالٍ")
+    queue.flush()
+
+    contents = [m["content"] for m in MessageRepository.get_thread_messages(thread_id)]
+    assert contents == ["رد مؤجل", "سؤال تالٍ"]